@@ -1,16 +1,23 @@
-from typing import Optional
+from datetime import datetime
+from typing import Annotated, Optional
 
-from fastapi import FastAPI, status, Depends
+from fastapi import FastAPI, HTTPException, Query, status, Depends
 
 from api.dependencies import verify_user
 from configs.config import redis_settings
+from constants.message import MediaType
 from schemas.message import (
+    DeliveryRecord,
     Message,
     MessageType,
+    ProfileMessage,
+    ReplayMessage,
     ServiceMessage,
     TaskMessage,
     ReplyMarkup,
 )
+from services.status_index import status_index
+from utils.keys import broadcast_stream, primary_stream
 from workers.producers import send_to_queueu
 
 
@@ -22,12 +29,22 @@ app = FastAPI()
     status_code=status.HTTP_201_CREATED,
     dependencies=[Depends(verify_user)],
 )
-async def add_bot(bot_id: int, token: str, is_sent_logs: bool = False):
+async def add_bot(
+    bot_id: int,
+    token: str,
+    is_sent_logs: bool = False,
+    rps: Optional[float] = None,
+    callback_url: Optional[str] = None,
+):
     await send_to_queueu(
         msg=Message(
             type=MessageType.add_bot,
             data=ServiceMessage(
-                bot_id=bot_id, token=token, is_sent_logs=is_sent_logs
+                bot_id=bot_id,
+                token=token,
+                is_sent_logs=is_sent_logs,
+                rps=rps,
+                callback_url=callback_url,
             ),
         ),
         stream_name=redis_settings.CONTROL_STREAM_NAME,
@@ -49,33 +66,94 @@ async def remove_bot(bot_id: int, token: str):
     )
 
 
+@app.post(
+    "/profile",
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(verify_user)],
+)
+async def start_profiler(duration_seconds: float, interval_ms: float = 5.0):
+    await send_to_queueu(
+        msg=Message(
+            type=MessageType.profile,
+            data=ProfileMessage(
+                duration_seconds=duration_seconds, interval_ms=interval_ms
+            ),
+        ),
+        stream_name=redis_settings.CONTROL_STREAM_NAME,
+    )
+
+
+@app.post(
+    "/dlq/replay",
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(verify_user)],
+)
+async def replay_dlq(bot_id: int, count: Optional[int] = None):
+    await send_to_queueu(
+        msg=Message(
+            type=MessageType.replay_dlq,
+            data=ReplayMessage(bot_id=bot_id, count=count),
+        ),
+        stream_name=redis_settings.CONTROL_STREAM_NAME,
+    )
+
+
 @app.post(
     "/send_msg",
     status_code=status.HTTP_201_CREATED,
     dependencies=[Depends(verify_user)],
 )
-async def send_msg(
+async def send_msg(  # noqa: PLR0913, PLR0917
     bot_id: int,
     chat_id: int,
-    text: str,
+    text: Optional[str] = None,
     reply_markup: ReplyMarkup | None = None,
     reply_to_message_id: int | str | None = None,
+    media_type: MediaType | None = None,
+    media_url: str | None = None,
+    media_hash: str | None = None,
+    send_at: datetime | None = None,
+    delay_ms: int | None = None,
+    jitter_ms: int | None = None,
+    external_id: int | None = None,
 ):
     await send_to_queueu(
         msg=Message(
             type=MessageType.send_msg,
             data=TaskMessage(
+                external_id=external_id,
                 bot_id=bot_id,
                 chat_id=chat_id,
                 text=text,
                 reply_markup=reply_markup,
                 reply_to_message_id=reply_to_message_id,
+                media_type=media_type,
+                media_url=media_url,
+                media_hash=media_hash,
+                send_at=send_at,
+                delay_ms=delay_ms,
+                jitter_ms=jitter_ms,
             ),
         ),
-        stream_name=f"{redis_settings.TG_STREAM_PREFIX}{bot_id}",
+        stream_name=primary_stream(bot_id),
     )
 
 
+@app.get(
+    "/status",
+    dependencies=[Depends(verify_user)],
+)
+async def get_status(
+    bot_id: int,
+    external_id: Annotated[list[int], Query()],
+) -> dict[int, Optional[DeliveryRecord]]:
+    """
+    Outcome of messages sent with these external ids, null when unknown
+    or older than STATUS_TTL_SECONDS.
+    """
+    return await status_index.get_many(bot_id, external_id)
+
+
 @app.post(
     "/send_multi_msg",
     status_code=status.HTTP_201_CREATED,
@@ -100,7 +178,7 @@ async def send_mass_msg(
                     reply_to_message_id=reply_to_message_id,
                 ),
             ),
-            stream_name=f"{redis_settings.TG_STREAM_PREFIX}{bot_id}",
+            stream_name=primary_stream(bot_id),
         )
 
 
@@ -127,7 +205,7 @@ async def send_broadcast(
                 reply_to_message_id=reply_to_message_id,
             ),
         ),
-        stream_name=f"{redis_settings.TG_BROADCAST_STREAM_PREFIX}{bot_id}",
+        stream_name=broadcast_stream(bot_id),
     )
 
 
@@ -139,16 +217,25 @@ async def send_broadcast(
 async def remove_msg(
     bot_id: int,
     chat_id: int,
-    msg_id: int,
+    msg_id: int | None = None,
+    external_id: int | None = None,
 ):
+    if msg_id is None and external_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="msg_id or external_id is required",
+        )
     await send_to_queueu(
         msg=Message(
             type=MessageType.del_msg,
             data=TaskMessage(
-                bot_id=bot_id, chat_id=chat_id, message_id=msg_id
+                bot_id=bot_id,
+                chat_id=chat_id,
+                message_id=msg_id,
+                external_id=external_id,
             ),
         ),
-        stream_name=f"{redis_settings.TG_BROADCAST_STREAM_PREFIX}{bot_id}",
+        stream_name=broadcast_stream(bot_id),
     )
 
 
@@ -160,11 +247,18 @@ async def remove_msg(
 async def update_msg(
     bot_id: int,
     chat_id: int,
-    msg_id: int,
+    msg_id: int | None = None,
+    external_id: int | None = None,
+    part: int = 0,
     text: Optional[str] = None,
     reply_markup: ReplyMarkup | None = None,
     reply_to_message_id: int | str | None = None,
 ):
+    if msg_id is None and external_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="msg_id or external_id is required",
+        )
     await send_to_queueu(
         msg=Message(
             type=MessageType.edit_msg,
@@ -172,10 +266,12 @@ async def update_msg(
                 bot_id=bot_id,
                 chat_id=chat_id,
                 message_id=msg_id,
+                external_id=external_id,
+                part=part,
                 text=text,
                 reply_markup=reply_markup,
                 reply_to_message_id=reply_to_message_id,
             ),
         ),
-        stream_name=f"{redis_settings.TG_BROADCAST_STREAM_PREFIX}{bot_id}",
+        stream_name=broadcast_stream(bot_id),
     )
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Optional
 
 from .base import BaseSetting
 
@@ -13,6 +14,20 @@ class AppSettings(BaseSetting):
 class RedisSetting(BaseSetting):
     REDIS_HOST: str
     REDIS_PORT: int
+    # Cluster mode: RedisCluster client, per-bot keys share a hash tag
+    REDIS_CLUSTER: bool = False
+    REDIS_COMMAND_POOL_SIZE: int = 100
+    REDIS_BLOCKING_POOL_SIZE: int = 1000  # One per consumer blocked on read
+    REDIS_LOGS_POOL_SIZE: int = 20
+    REDIS_POOL_TIMEOUT_SECONDS: float = 5  # Waiting for a free connection
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = 5
+    # Must exceed the longest BLOCK of stream reads
+    REDIS_BLOCKING_SOCKET_TIMEOUT_SECONDS: float = 30
+    REDIS_CONNECT_TIMEOUT_SECONDS: float = 2
+    REDIS_HEALTH_CHECK_SECONDS: int = 30  # PING idle connections on reuse
+    REDIS_RETRIES: int = 3
+    REDIS_RETRY_BACKOFF_BASE_SECONDS: float = 0.05
+    REDIS_RETRY_BACKOFF_CAP_SECONDS: float = 1
     CONTROL_STREAM_NAME: str = "stream:tg_bot:control"
     TG_KEY_PREFIX: str = "telegram_bot:"
     TG_STREAM_PREFIX: str = "stream:tg_bot:"
@@ -25,16 +40,102 @@ class RedisSetting(BaseSetting):
     CHAT_SEND_PREFIX: str = "limiter:send:chat_id:"
     CHAT_EDIT_PREFIX: str = "limiter:edit:chat_id:"
     GROUP_SEND_PREFIX: str = "limiter:group:chat_id:"
+    EDIT_HASH_PREFIX: str = "edit_hash:"
+    TG_FILE_ID_PREFIX: str = "tg_bot_files:"
+    TG_CHAT_META_PREFIX: str = "tg_bot_chats:"
+    TG_SCHEDULE_PREFIX: str = "schedule:tg_bot:"
+    TG_SCHEDULE_INDEX_KEY: str = "schedule:tg_bot:index"
+    TG_DLQ_STREAM_PREFIX: str = "stream:tg_bot:dlq:"
+    TG_IDENTITY_PREFIX: str = "tg_bot_identity:"
+    TG_BOT_META_PREFIX: str = "tg_bot_meta:"
+    TG_STATUS_PREFIX: str = "tg_bot_status:"
+    TG_BOT_INDEX_KEY: str = "tg_bot_index"
+    TG_BOT_REGISTRY_STREAM: str = "stream:tg_bot:registry"
+    TG_BOT_REGISTRY_STREAM_MAXLEN: int = 10000
+    TG_BOT_REGISTRY_MIGRATED_KEY: str = "tg_bot_registry_migrated"
 
 
 class TelegramSetting(BaseSetting):
     GLOBAL_RPS: int = 28
+    GLOBAL_BURST: int = 3  # Sends allowed at once after a quiet period
     PER_CHAT_DELAY: float = 1.0
     PER_CHAT_EDIT_DELAY: float = 3.05
-    PER_GROUP_MSG_DELAY: float = 3.05
+    PER_GROUP_MSG_LIMIT: int = 20  # Messages per window in a group chat
+    PER_GROUP_MSG_WINDOW: float = 60.0
+    PER_GROUP_MSG_BURST: int = 3  # Sent back to back, counted in the limit
     TELEGRAM_MSG_LIMIT: int = 4096
+    TELEGRAM_CAPTION_LIMIT: int = 1024
+    TELEGRAM_API_URL: Optional[str] = None  # e.g. http://127.0.0.1:8081
+
+
+class WorkerSetting(BaseSetting):
+    LAZY_BOT_ACTIVATION: bool = True
+    BOT_IDLE_TIMEOUT_SECONDS: int = 600  # Tear down consumer after idling
+    ACTIVATION_SWEEP_INTERVAL_SECONDS: int = 30
+    ACTIVATION_SWEEP_BATCH: int = 500
+    KEYSPACE_NOTIFICATIONS: bool = True
+    RESTORE_BATCH_SIZE: int = 500  # Keys per MGET during restore
+    RESTORE_CONCURRENCY: int = 50  # Bots validated in parallel
+    RESTORE_PROGRESS_EVERY: int = 100
+    SKIP_GET_ME_IF_CACHED: bool = True
+    IDENTITY_TTL_SECONDS: int = 604800  # get_me is repeated after it
+    MIGRATE_LEGACY_BOT_KEYS: bool = True  # One-time SCAN of TG_KEY_PREFIX
+    REGISTRY_SYNC_BLOCK_MS: int = 5000
+    METRICS_ENABLED: bool = True
+    METRICS_PORT: int = 9100
+    METRICS_STREAM_INTERVAL_SECONDS: int = 15
+    METRICS_POOL_INTERVAL_SECONDS: float = 1
+    LOOP_LAG_INTERVAL_SECONDS: float = 0.5
+    LOOP_LAG_WARN_SECONDS: float = 0.2
+    FAIR_SCHEDULING: bool = True  # Share the loop between bots while it lags
+    FAIR_LAG_SECONDS: float = 0.05
+    FAIR_TICK_SECONDS: float = 0.05
+    FAIR_QUANTUM_MS: float = 5  # CPU per bot and tick
+    PROFILE_DIR: str = "/tmp/tg_sender_profiles"  # noqa: S108
+    PROFILE_MAX_SECONDS: float = 300
+    EDIT_CACHE_SIZE: int = 10000  # Messages whose last edit hash is kept
+    EDIT_CACHE_TTL_SECONDS: int = 86400
+    EDIT_CACHE_REDIS: bool = True
+    CHAT_CACHE_SIZE: int = 100000  # Group and channel chats kept in memory
+    STATUS_INDEX_ENABLED: bool = True  # Outcome per external_id
+    STATUS_TTL_SECONDS: int = 86400  # Kept between one and two of these
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULE_TICK_SECONDS: float = 1.0
+    SCHEDULE_RELEASE_BATCH: int = 200  # Per bot and tick
+    MAX_DELIVERY_COUNT: int = 5  # Stuck entries are dead-lettered after it
+    DLQ_FAILED_DELIVERIES: bool = True  # Also dead-letter failed sends
+    DLQ_MAXLEN: int = 100000
+    DLQ_REPLAY_BATCH: int = 500
+    BREAKER_WINDOW: int = 20  # Last calls considered per bot
+    BREAKER_MIN_CALLS: int = 10
+    BREAKER_FAILURE_RATIO: float = 0.5
+    BREAKER_BACKOFF_INITIAL_SECONDS: float = 5
+    BREAKER_BACKOFF_MAX_SECONDS: float = 300
+    CALLBACK_BATCH_SIZE: int = 500  # Outcomes per POST
+    CALLBACK_FLUSH_SECONDS: float = 1
+    CALLBACK_MAX_PENDING: int = 10000  # Per bot, sends wait beyond it
+    CALLBACK_TIMEOUT_SECONDS: float = 10
+    CALLBACK_RETRIES: int = 5
+    CALLBACK_BACKOFF_BASE_SECONDS: float = 0.5
+    CALLBACK_BACKOFF_CAP_SECONDS: float = 30
+    DRAIN_TIMEOUT_SECONDS: float = 20  # In-flight sends on shutdown
+    PREFETCH_SECONDS: float = 2  # Work read ahead per bot
+    PREFETCH_MIN_ENTRIES: int = 10
+    PREFETCH_MAX_ENTRIES: int = 500
+    CONTROL_READ_COUNT: int = 10
+
+
+class LogSetting(BaseSetting):
+    LOG_LEVEL: str = "INFO"  # Service logger
+    LOG_LEVEL_ROOT: str = "WARNING"  # Third party libraries
+    LOG_FORMAT: str = "plain"  # "plain" or "json"
+    LOG_ASYNC: bool = True  # Write records from a background thread
+    LOG_SAMPLE_MAX_PER_INTERVAL: int = 50  # Per event, 0 disables sampling
+    LOG_SAMPLE_INTERVAL_SECONDS: float = 1.0
 
 
 app_settings = AppSettings()
 telegram_settings = TelegramSetting()
 redis_settings = RedisSetting()
+worker_settings = WorkerSetting()
+log_settings = LogSetting()
@@ -1,11 +1,139 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
 import sys
+import time
+from collections import OrderedDict
+from typing import Optional, TextIO
 
+from configs.config import log_settings
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    stream=sys.stdout,
-    format="[%(levelname)s][%(name)s]: %(message)s",
-)
-logging.getLogger("TG_SENDER").setLevel(logging.INFO)
-logger = logging.getLogger("TG_SENDER")
+PLAIN_FORMAT = "[%(levelname)s][%(name)s]: %(message)s"
+
+# Events whose sampling windows are remembered
+MAX_SAMPLED_EVENTS = 1000
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.msg if isinstance(record.msg, str) else None,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """
+    Passes records to the listener untouched. The queue is in-process, so
+    nothing has to be pickled and the listener's formatter still gets the
+    template, args and exc_info.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Rate limits records below WARNING per event, where an event is the
+    unformatted message template. Suppressed records are counted and
+    reported with the next record that passes. The least recently seen
+    events are forgotten beyond MAX_SAMPLED_EVENTS.
+    """
+
+    def __init__(
+        self,
+        max_per_interval: int,
+        interval: float,
+        max_events: int = MAX_SAMPLED_EVENTS,
+    ) -> None:
+        super().__init__()
+        self.max_per_interval = max_per_interval
+        self.interval = interval
+        self.max_events = max_events
+        # event -> [window start, records passed, records suppressed]
+        self.events: OrderedDict[tuple[str, str], list] = OrderedDict()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.max_per_interval <= 0:
+            return True
+        # Objects logged directly are grouped by their type
+        event = (
+            record.msg
+            if isinstance(record.msg, str)
+            else type(record.msg).__name__
+        )
+        key = (record.name, event)
+        now = time.monotonic()
+        state = self.events.get(key)
+        if state is None or now - state[0] >= self.interval:
+            suppressed = state[2] if state else 0
+            self.events[key] = [now, 1, 0]
+            self.events.move_to_end(key)
+            while len(self.events) > self.max_events:
+                self.events.popitem(last=False)
+            if suppressed:
+                record.msg = f"{record.msg} (suppressed {suppressed} similar)"
+            return True
+        if state[1] < self.max_per_interval:
+            state[1] += 1
+            return True
+        state[2] += 1
+        return False
+
+
+def create_handler(
+    stream: TextIO,
+) -> tuple[logging.Handler, Optional[logging.handlers.QueueListener]]:
+    """
+    Returns the handler to attach and, in async mode, the started
+    listener writing its records.
+    """
+    formatter = (
+        JsonFormatter()
+        if log_settings.LOG_FORMAT == "json"
+        else logging.Formatter(PLAIN_FORMAT)
+    )
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(formatter)
+    handler = stream_handler
+    listener = None
+    if log_settings.LOG_ASYNC:
+        # Records are written by a listener thread, the event loop only
+        # pushes them to an in-memory queue
+        handler = LocalQueueHandler(queue.SimpleQueue())
+        listener = logging.handlers.QueueListener(
+            handler.queue, stream_handler, respect_handler_level=False
+        )
+        listener.start()
+    handler.addFilter(
+        SamplingFilter(
+            max_per_interval=log_settings.LOG_SAMPLE_MAX_PER_INTERVAL,
+            interval=log_settings.LOG_SAMPLE_INTERVAL_SECONDS,
+        )
+    )
+    return handler, listener
+
+
+def setup_logging() -> logging.Logger:
+    handler, listener = create_handler(sys.stdout)
+    if listener is not None:
+        atexit.register(listener.stop)
+    logging.basicConfig(
+        level=log_settings.LOG_LEVEL_ROOT.upper(),
+        handlers=[handler],
+    )
+    app_logger = logging.getLogger("TG_SENDER")
+    app_logger.setLevel(log_settings.LOG_LEVEL.upper())
+    return app_logger
+
+
+logger = setup_logging()
@@ -8,3 +8,20 @@ class MessageType(StrEnum):
     send_msg = "send_msg"
     del_msg = "del_msg"
     edit_msg = "edit_msg"
+    profile = "profile"
+    replay_dlq = "replay_dlq"
+    handoff = "handoff"
+
+
+class DeliveryStatus(StrEnum):
+    scheduled = "scheduled"
+    sent = "sent"
+    partial = "partial"  # Some parts of a split text failed
+    failed = "failed"
+    deleted = "deleted"
+
+
+class MediaType(StrEnum):
+    photo = "photo"
+    document = "document"
+    video = "video"
@@ -0,0 +1,22 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class BotRecord(BaseModel):
+    """
+    Lightweight bot metadata kept in memory while the bot is not active.
+    """
+
+    bot_id: int
+    token: str
+    is_sent_logs: Optional[bool] = False
+    rps: Optional[float] = None  # Overrides GLOBAL_RPS for this bot
+    callback_url: Optional[str] = None  # Outcomes are posted here
+    revision: int = 0
+
+
+class RegistryChange(BaseModel):
+    op: str  # "upsert" or "remove"
+    bot_id: int
+    revision: int = 0
@@ -1,15 +1,38 @@
 import json
+from datetime import datetime
 from typing import Any, Optional, Union
 
-from pydantic import BaseModel, model_validator
+from pydantic import BaseModel, ConfigDict, model_validator
 
-from constants.message import MessageType
+from constants.message import DeliveryStatus, MediaType, MessageType
 
 
 class ServiceMessage(BaseModel):
     bot_id: int
     token: str
     is_sent_logs: Optional[bool] = False
+    rps: Optional[float] = None
+    # Outcomes are posted to it in batches instead of the logs stream
+    callback_url: Optional[str] = None
+
+
+class ProfileMessage(BaseModel):
+    duration_seconds: float
+    interval_ms: float = 5.0
+
+
+class ReplayMessage(BaseModel):
+    # Forbidding extra fields keeps task payloads from matching it
+    model_config = ConfigDict(extra="forbid")
+
+    bot_id: int
+    count: Optional[int] = None  # All entries if not set
+
+
+class HandoffMessage(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    bot_ids: list[int]
 
 
 class InlineButton(BaseModel):
@@ -26,14 +49,30 @@ class TaskMessage(BaseModel):
     bot_id: int
     chat_id: int | str
     text: str | None = None
+    # Edits and deletes address message_id, or what external_id sent
     message_id: Optional[int | str] = None
+    part: int = 0  # Part of a split message to edit, -1 for the last
     reply_markup: Optional[ReplyMarkup] = None
     reply_to_message_id: int | str | None = None
+    media_type: Optional[MediaType] = None
+    media_url: Optional[str] = None
+    # Content hash of the media, the url is used when it is not set
+    media_hash: Optional[str] = None
+    # Scheduling, naive send_at is UTC
+    send_at: Optional[datetime] = None
+    delay_ms: Optional[int] = None
+    jitter_ms: Optional[int] = None  # Random extra delay up to this value
 
 
 class Message(BaseModel):
     type: MessageType
-    data: Union[ServiceMessage, TaskMessage]
+    data: Union[
+        ServiceMessage,
+        TaskMessage,
+        ProfileMessage,
+        ReplayMessage,
+        HandoffMessage,
+    ]
 
     @model_validator(mode="before")
     @classmethod
@@ -59,3 +98,11 @@ class LogMessage(BaseModel):
     sent_msg_id: Optional[int] = None
     details: Optional[str] = None
     external_id: Optional[int] = None
+
+
+class DeliveryRecord(BaseModel):
+    status: DeliveryStatus
+    chat_id: int | str  # Where it was sent, after group migrations
+    message_ids: list[Optional[int]] = []  # Per part, None if it failed
+    send_at: Optional[float] = None  # Due time of scheduled messages
+    updated_at: float
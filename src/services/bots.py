@@ -1,33 +1,76 @@
+import time
 from typing import Optional
 from aiogram import Bot
-from schemas.message import Message, MessageType, LogMessage
+from configs.config import telegram_settings
+from configs.logger import logger
+from constants.message import DeliveryStatus
+from schemas.message import DeliveryRecord, Message, MessageType, LogMessage
+from services.callbacks import callback_sinks
+from services.chat_cache import chat_cache
+from services.edit_cache import content_hash, edit_cache
+from services.media import send_cached_media
+from services.metrics import limiter_timer
+from services.profiling import stage
 from services.rate_limiter import rate_limiter
+from services.status_index import status_index
 from services.telegram import (
     send_message,
     split_message,
     delete_message,
     edit_message,
 )
+from utils.keys import edit_hash_key
+from utils.redis import logs_redis_conn
+from utils.text import visible_len
 from workers.producers import send_to_queueu
 
+CAPTION_LIMIT = telegram_settings.TELEGRAM_CAPTION_LIMIT
+
 
 async def send_msg(
     msg: Message,
     bot: Bot,
     logs_stream: Optional[str] = None,
-) -> None:
-    messages = split_message(msg.data.text)
-    for text_msg in messages:
-        await rate_limiter.acquire_lock(msg.data.chat_id, bot.id)
-        _, sent_msg_id = await send_message(
+) -> Optional[str]:
+    """
+    Returns None if every part was delivered, otherwise the failure.
+    """
+    text = msg.data.text
+    error = None
+    chat = await chat_cache.get(msg.data.bot_id, msg.data.chat_id)
+    # Groups upgraded to supergroups are addressed by their new id
+    chat_id = chat.migrated_to or msg.data.chat_id
+    sent_ids = []
+    if msg.data.media_type:
+        caption = text if text and visible_len(text) <= CAPTION_LIMIT else None
+        sent_msg_id = await _send_media_msg(
+            msg=msg,
+            bot=bot,
+            caption=caption,
+            chat_id=chat_id,
+            chat_type=chat.type,
+            logs_stream=logs_stream,
+        )
+        sent_ids.append(sent_msg_id)
+        if sent_msg_id == 0:
+            error = "Failed send media"
+        if caption is not None:
+            text = None
+    # A text too long for a caption follows the media as regular messages
+    for text_msg in split_message(text):
+        with limiter_timer(msg.data.bot_id, "send"):
+            await rate_limiter.acquire_lock(
+                chat_id, msg.data.bot_id, chat.type
+            )
+        chat_id, sent_msg_id = await send_message(
             bot=bot,
-            chat_id=msg.data.chat_id,
+            chat_id=chat_id,
             text=text_msg,
             reply_markup=msg.data.reply_markup,
             reply_to_message_id=msg.data.reply_to_message_id,
         )
-        if logs_stream:
-            await send_to_queueu(
+        if _reports_outcome(msg, logs_stream):
+            await _publish_log(
                 msg=LogMessage(
                     type=MessageType.send_msg,
                     status=1 if sent_msg_id != 0 else 0,
@@ -42,66 +85,213 @@ async def send_msg(
                     if sent_msg_id != 0
                     else "Failed send message",
                 ),
-                stream_name=logs_stream,
-                w_raise=True,
+                logs_stream=logs_stream,
             )
+        sent_ids.append(sent_msg_id)
+        if sent_msg_id == 0:
+            error = "Failed send message"
+    if msg.data.external_id is not None:
+        await _record_status(msg, chat_id, sent_ids)
+    return error
 
 
-async def edit_msg(
+async def _record_status(
+    msg: Message, chat_id: int | str, sent_ids: list[int]
+) -> None:
+    if all(sent_ids):
+        status = DeliveryStatus.sent
+    elif any(sent_ids):
+        status = DeliveryStatus.partial
+    else:
+        status = DeliveryStatus.failed
+    await status_index.record(
+        bot_id=msg.data.bot_id,
+        external_id=msg.data.external_id,
+        record=DeliveryRecord(
+            status=status,
+            chat_id=chat_id,
+            message_ids=[sent_id or None for sent_id in sent_ids],
+            updated_at=time.time(),
+        ),
+    )
+
+
+async def _send_media_msg(
     msg: Message,
     bot: Bot,
+    caption: Optional[str],
+    chat_id: int | str,
+    chat_type: Optional[str] = None,
     logs_stream: Optional[str] = None,
-) -> None:
-    await rate_limiter.acquire_edit_lock(msg.data.chat_id, bot.id)
-    res = await edit_message(
+) -> int:
+    """
+    Returns the id of the sent message, 0 if it failed.
+    """
+    with limiter_timer(msg.data.bot_id, "send"):
+        await rate_limiter.acquire_lock(chat_id, msg.data.bot_id, chat_type)
+    sent_msg_id = await send_cached_media(
         bot=bot,
-        chat_id=msg.data.chat_id,
-        message_id=msg.data.message_id,
-        text=msg.data.text,
-        reply_markup=msg.data.reply_markup,
+        data=msg.data.model_copy(update={"chat_id": chat_id}),
+        caption=caption,
     )
-    if logs_stream:
-        await send_to_queueu(
+    if _reports_outcome(msg, logs_stream):
+        await _publish_log(
+            msg=LogMessage(
+                type=MessageType.send_msg,
+                status=1 if sent_msg_id != 0 else 0,
+                bot_id=msg.data.bot_id,
+                chat_id=msg.data.chat_id,
+                text=caption,
+                reply_markup=msg.data.reply_markup,
+                reply_to_message_id=msg.data.reply_to_message_id,
+                sent_msg_id=sent_msg_id,
+                external_id=msg.data.external_id,
+                details=None if sent_msg_id != 0 else "Failed send media",
+            ),
+            logs_stream=logs_stream,
+        )
+    return sent_msg_id
+
+
+async def edit_msg(
+    msg: Message,
+    bot: Bot,
+    logs_stream: Optional[str] = None,
+) -> Optional[str]:
+    chat_id, message_ids = await _resolve_targets(msg)
+    part = msg.data.part
+    message_id = None
+    if -len(message_ids) <= part < len(message_ids):
+        message_id = message_ids[part]
+    if message_id is None:
+        logger.warning(
+            "No message to edit for external_id %s", msg.data.external_id
+        )
+        res = False
+    else:
+        res = await _edit_part(
+            msg=msg, bot=bot, chat_id=chat_id, message_id=message_id
+        )
+    if _reports_outcome(msg, logs_stream):
+        await _publish_log(
             msg=LogMessage(
                 type=MessageType.edit_msg,
                 status=1 if res is True else 0,
                 bot_id=msg.data.bot_id,
                 chat_id=msg.data.chat_id,
                 text=msg.data.text,
-                message_id=msg.data.message_id,
+                message_id=message_id,
                 external_id=msg.data.external_id,
                 reply_markup=msg.data.reply_markup,
                 reply_to_message_id=msg.data.reply_to_message_id,
                 details="" if res is True else "Failed to change msg",
             ),
-            stream_name=logs_stream,
-            w_raise=True,
+            logs_stream=logs_stream,
         )
+    return None if res is True else "Failed to change msg"
+
+
+async def _edit_part(
+    msg: Message, bot: Bot, chat_id: int | str, message_id: int | str
+) -> bool:
+    cache_key = edit_hash_key(msg.data.bot_id, chat_id, message_id)
+    digest = content_hash(msg.data.text, msg.data.reply_markup)
+    if await edit_cache.is_unchanged(cache_key, digest):
+        return True
+    with limiter_timer(msg.data.bot_id, "edit"):
+        await rate_limiter.acquire_edit_lock(chat_id, msg.data.bot_id)
+    res = await edit_message(
+        bot=bot,
+        chat_id=chat_id,
+        message_id=message_id,
+        text=msg.data.text,
+        reply_markup=msg.data.reply_markup,
+    )
+    if res is True:
+        await edit_cache.store(cache_key, digest)
+    return res is True
 
 
 async def del_msg(
     msg: Message,
     bot: Bot,
     logs_stream: Optional[str] = None,
-) -> None:
-    await rate_limiter.acquire_lock(msg.data.chat_id, bot.id)
-    if await delete_message(
-        bot=bot, chat_id=msg.data.chat_id, message_id=msg.data.message_id
-    ):
-        detail = ""
-    else:
-        detail = "Cannot delete message"
-    if logs_stream:
-        await send_to_queueu(
-            msg=LogMessage(
-                type=MessageType.del_msg,
-                status=1 if detail == "" else 0,
-                bot_id=msg.data.bot_id,
-                chat_id=msg.data.chat_id,
-                message_id=msg.data.message_id,
-                external_id=msg.data.external_id,
-                details=detail,
+) -> Optional[str]:
+    """
+    Deletes every sent part of a message addressed by external_id.
+    """
+    chat_id, message_ids = await _resolve_targets(msg)
+    chat = await chat_cache.get(msg.data.bot_id, chat_id)
+    detail = "" if any(message_ids) else "No message to delete"
+    for message_id in filter(None, message_ids):
+        with limiter_timer(msg.data.bot_id, "send"):
+            await rate_limiter.acquire_lock(
+                chat_id, msg.data.bot_id, chat.type
+            )
+        if await delete_message(
+            bot=bot, chat_id=chat_id, message_id=message_id
+        ):
+            part_detail = ""
+        else:
+            part_detail = detail = "Cannot delete message"
+        if _reports_outcome(msg, logs_stream):
+            await _publish_log(
+                msg=LogMessage(
+                    type=MessageType.del_msg,
+                    status=1 if part_detail == "" else 0,
+                    bot_id=msg.data.bot_id,
+                    chat_id=msg.data.chat_id,
+                    message_id=message_id,
+                    external_id=msg.data.external_id,
+                    details=part_detail,
+                ),
+                logs_stream=logs_stream,
+            )
+    if msg.data.message_id is None and detail == "":
+        await status_index.record(
+            bot_id=msg.data.bot_id,
+            external_id=msg.data.external_id,
+            record=DeliveryRecord(
+                status=DeliveryStatus.deleted,
+                chat_id=chat_id,
+                message_ids=message_ids,
+                updated_at=time.time(),
             ),
+        )
+    return detail or None
+
+
+async def _resolve_targets(
+    msg: Message,
+) -> tuple[int | str, list[Optional[int | str]]]:
+    """
+    Chat and message ids an edit or delete applies to: its message_id,
+    or the parts sent with its external_id (none if unknown).
+    """
+    if msg.data.message_id is not None:
+        return msg.data.chat_id, [msg.data.message_id]
+    record = await status_index.get(msg.data.bot_id, msg.data.external_id)
+    if record is None:
+        return msg.data.chat_id, []
+    return record.chat_id, record.message_ids
+
+
+def _reports_outcome(msg: Message, logs_stream: Optional[str]) -> bool:
+    return bool(logs_stream) or msg.data.bot_id in callback_sinks
+
+
+async def _publish_log(msg: LogMessage, logs_stream: Optional[str]) -> None:
+    """
+    Outcomes go to the bot's callback url if it has one, otherwise to
+    its logs stream.
+    """
+    if (sink := callback_sinks.get(msg.bot_id)) is not None:
+        await sink.add(msg)
+        return
+    with stage("log_publish", msg.bot_id):
+        await send_to_queueu(
+            msg=msg,
             stream_name=logs_stream,
             w_raise=True,
+            redis_conn=logs_redis_conn,
         )
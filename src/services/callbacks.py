@@ -0,0 +1,171 @@
+import asyncio
+import json
+import random
+import uuid
+from contextlib import suppress
+from http import HTTPStatus
+from typing import Optional
+
+from aiohttp import ClientError, ClientSession, ClientTimeout
+
+from configs.config import worker_settings
+from configs.logger import logger
+from schemas.message import LogMessage
+from services.metrics import CALLBACK_OUTCOMES
+
+# Client errors other than these will not pass on a retry
+RETRY_STATUSES = {
+    HTTPStatus.REQUEST_TIMEOUT,
+    HTTPStatus.TOO_EARLY,
+    HTTPStatus.TOO_MANY_REQUESTS,
+}
+
+_session: Optional[ClientSession] = None
+
+
+def get_session() -> ClientSession:
+    global _session  # noqa: PLW0603
+    if _session is None or _session.closed:
+        _session = ClientSession(
+            timeout=ClientTimeout(
+                total=worker_settings.CALLBACK_TIMEOUT_SECONDS
+            )
+        )
+    return _session
+
+
+async def close_session() -> None:
+    if _session is not None and not _session.closed:
+        await _session.close()
+
+
+class CallbackSink:
+    """
+    Collects the outcomes of one bot and POSTs them to its callback url
+    in batches of up to CALLBACK_BATCH_SIZE, at least every
+    CALLBACK_FLUSH_SECONDS. Failed posts are retried with backoff; a
+    batch still failing after CALLBACK_RETRIES is dropped. Sends wait
+    while CALLBACK_MAX_PENDING outcomes are queued, so a dead endpoint
+    slows the bot down instead of growing memory.
+    """
+
+    def __init__(self, bot_id: int, url: str) -> None:
+        self.bot_id = bot_id
+        self.url = url
+        self.pending: list[dict] = []
+        self.batch_ready = asyncio.Event()
+        self.has_room = asyncio.Event()
+        self.has_room.set()
+        self.stopping = False
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Posts what is still queued.
+        """
+        self.stopping = True
+        self.batch_ready.set()
+        if self.task is not None:
+            await self.task
+
+    async def add(self, outcome: LogMessage) -> None:
+        await self.has_room.wait()
+        self.pending.append(outcome.model_dump(mode="json"))
+        if len(self.pending) >= worker_settings.CALLBACK_BATCH_SIZE:
+            self.batch_ready.set()
+        if len(self.pending) >= worker_settings.CALLBACK_MAX_PENDING:
+            self.has_room.clear()
+
+    async def _run(self) -> None:
+        while not self.stopping or self.pending:
+            if not self.stopping:
+                with suppress(TimeoutError):
+                    await asyncio.wait_for(
+                        self.batch_ready.wait(),
+                        worker_settings.CALLBACK_FLUSH_SECONDS,
+                    )
+                self.batch_ready.clear()
+            batch = self.pending[: worker_settings.CALLBACK_BATCH_SIZE]
+            del self.pending[: len(batch)]
+            if len(self.pending) >= worker_settings.CALLBACK_BATCH_SIZE:
+                self.batch_ready.set()
+            if len(self.pending) < worker_settings.CALLBACK_MAX_PENDING:
+                self.has_room.set()
+            if not batch:
+                continue
+            try:
+                delivered = await self._post(batch)
+            except Exception as ex:
+                logger.exception(
+                    "Callback of bot %s failed: %s", self.bot_id, ex
+                )
+                delivered = False
+            CALLBACK_OUTCOMES.labels(
+                str(self.bot_id), "delivered" if delivered else "dropped"
+            ).inc(len(batch))
+
+    async def _post(self, batch: list[dict]) -> bool:
+        # Receivers can drop a batch they already got from the same id
+        body = json.dumps(
+            {
+                "batch_id": uuid.uuid4().hex,
+                "bot_id": self.bot_id,
+                "outcomes": batch,
+            }
+        )
+        backoff = worker_settings.CALLBACK_BACKOFF_BASE_SECONDS
+        for attempt in range(1, worker_settings.CALLBACK_RETRIES + 2):
+            error = None
+            try:
+                async with get_session().post(
+                    self.url,
+                    data=body,
+                    headers={"Content-Type": "application/json"},
+                ) as response:
+                    if response.ok:
+                        return True
+                    error = f"HTTP {response.status}"
+                    if (
+                        response.status < HTTPStatus.INTERNAL_SERVER_ERROR
+                        and response.status not in RETRY_STATUSES
+                    ):
+                        break
+            except (ClientError, TimeoutError) as ex:
+                error = f"{ex.__class__.__name__}: {ex}"
+            if attempt > worker_settings.CALLBACK_RETRIES:
+                break
+            logger.warning(
+                "Callback of bot %s failed (%s), attempt %s",
+                self.bot_id,
+                error,
+                attempt,
+            )
+            await asyncio.sleep(
+                backoff / 2 + random.uniform(0, backoff / 2)  # noqa: S311
+            )
+            backoff = min(
+                backoff * 2, worker_settings.CALLBACK_BACKOFF_CAP_SECONDS
+            )
+        logger.error(
+            "Dropped %s outcomes of bot %s: %s", len(batch), self.bot_id, error
+        )
+        return False
+
+
+callback_sinks: dict[int, CallbackSink] = {}
+
+
+def open_sink(bot_id: int, url: str) -> None:
+    if bot_id in callback_sinks:
+        return
+    sink = CallbackSink(bot_id=bot_id, url=url)
+    sink.start()
+    callback_sinks[bot_id] = sink
+
+
+async def close_sink(bot_id: int) -> None:
+    if (sink := callback_sinks.pop(bot_id, None)) is not None:
+        await sink.stop()
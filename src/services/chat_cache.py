@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from typing import Optional
+
+from aiogram.enums import ChatType
+from aiogram.types import Chat
+from pydantic import BaseModel
+from redis import RedisError
+from redis import asyncio as aioredis
+
+from configs.config import worker_settings
+from configs.logger import logger
+from utils.keys import chat_meta_key
+from utils.redis import redis_conn
+
+
+class ChatInfo(BaseModel):
+    type: Optional[str] = None  # Unknown until Telegram returns the chat
+    migrated_to: Optional[int] = None
+
+
+PRIVATE_CHAT = ChatInfo(type=ChatType.PRIVATE)
+
+
+def is_user_id(chat_id: int | str) -> bool:
+    # Positive ids belong to users, their chats are private and never move
+    return str(chat_id).isdigit()
+
+
+def is_group_chat(chat_id: int | str, chat_type: Optional[str]) -> bool:
+    """
+    Groups, supergroups and channels share the group limits. Unknown
+    chats are guessed from the id: negative ids and @usernames.
+    """
+    if chat_type is not None:
+        return chat_type != ChatType.PRIVATE
+    return str(chat_id).startswith(("-", "@"))
+
+
+class ChatCache:
+    """
+    Type of group and channel chats and the supergroup ids groups were
+    migrated to, per bot. Learned from API responses and stored in a
+    Redis hash per bot, with the recently used chats kept in memory.
+    """
+
+    def __init__(
+        self,
+        redis_conn: aioredis.Redis = redis_conn,
+        max_size: int = worker_settings.CHAT_CACHE_SIZE,
+    ) -> None:
+        self.redis_conn = redis_conn
+        self.max_size = max_size
+        self.chats: OrderedDict[tuple[str, str], ChatInfo] = OrderedDict()
+
+    async def get(self, bot_id: int | str, chat_id: int | str) -> ChatInfo:
+        if is_user_id(chat_id):
+            return PRIVATE_CHAT
+        cache_key = (str(bot_id), str(chat_id))
+        if (info := self.chats.get(cache_key)) is not None:
+            self.chats.move_to_end(cache_key)
+            return info
+        try:
+            stored = await self.redis_conn.hget(chat_meta_key(bot_id), chat_id)
+        except RedisError as ex:
+            logger.warning("Failed to read chat cache: %s", ex)
+            return ChatInfo()
+        # Misses are remembered too, so unknown chats cost one lookup
+        info = ChatInfo.model_validate_json(stored) if stored else ChatInfo()
+        self._remember(cache_key, info)
+        return info
+
+    async def observe(
+        self, bot_id: int | str, chat_id: int | str, chat: Optional[Chat]
+    ) -> None:
+        """
+        Records the type of a chat returned by Telegram.
+        """
+        if chat is None or is_user_id(chat_id):
+            return
+        info = await self.get(bot_id, chat_id)
+        if info.type == chat.type:
+            return
+        await self._store(
+            bot_id, chat_id, info.model_copy(update={"type": chat.type})
+        )
+
+    async def migrate(
+        self, bot_id: int | str, chat_id: int | str, migrated_to: int
+    ) -> None:
+        logger.info("Chat %s migrated to %s", chat_id, migrated_to)
+        await self._store(
+            bot_id,
+            chat_id,
+            ChatInfo(type=ChatType.GROUP, migrated_to=migrated_to),
+        )
+        await self._store(
+            bot_id, migrated_to, ChatInfo(type=ChatType.SUPERGROUP)
+        )
+
+    async def _store(
+        self, bot_id: int | str, chat_id: int | str, info: ChatInfo
+    ) -> None:
+        self._remember((str(bot_id), str(chat_id)), info)
+        try:
+            await self.redis_conn.hset(
+                chat_meta_key(bot_id), chat_id, info.model_dump_json()
+            )
+        except RedisError as ex:
+            logger.warning("Failed to store chat %s: %s", chat_id, ex)
+
+    def _remember(self, cache_key: tuple[str, str], info: ChatInfo) -> None:
+        self.chats[cache_key] = info
+        self.chats.move_to_end(cache_key)
+        while len(self.chats) > self.max_size:
+            self.chats.popitem(last=False)
+
+
+chat_cache = ChatCache()
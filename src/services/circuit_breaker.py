@@ -0,0 +1,129 @@
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramNetworkError,
+    TelegramServerError,
+    TelegramUnauthorizedError,
+)
+
+from configs.config import worker_settings
+from configs.logger import logger
+from services.metrics import BREAKER_OPEN, api_timer, bot_label
+
+GLOBAL = "global"
+
+
+class CircuitBreaker:
+    """
+    Opens when the share of failed calls among the last BREAKER_WINDOW
+    crosses BREAKER_FAILURE_RATIO. While open, consumers stop reading
+    and a probe is allowed after an exponentially growing backoff.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.outcomes: deque[bool] = deque(
+            maxlen=worker_settings.BREAKER_WINDOW
+        )
+        self.is_open = False
+        self.backoff = worker_settings.BREAKER_BACKOFF_INITIAL_SECONDS
+        self.probe_at = 0.0
+
+    def record(self, failed: bool) -> None:
+        if self.is_open:
+            return
+        self.outcomes.append(failed)
+        if (
+            len(self.outcomes) >= worker_settings.BREAKER_MIN_CALLS
+            and sum(self.outcomes) / len(self.outcomes)
+            >= worker_settings.BREAKER_FAILURE_RATIO
+        ):
+            self.trip()
+
+    def trip(self) -> None:
+        if not self.is_open:
+            logger.warning("Circuit breaker %s opened", self.name)
+        self.is_open = True
+        self.probe_at = time.monotonic() + self.backoff
+        BREAKER_OPEN.labels(self.name).set(1)
+
+    def probe_failed(self) -> None:
+        self.backoff = min(
+            self.backoff * 2, worker_settings.BREAKER_BACKOFF_MAX_SECONDS
+        )
+        self.trip()
+
+    def reset(self) -> None:
+        if self.is_open:
+            logger.warning("Circuit breaker %s closed", self.name)
+        self.is_open = False
+        self.outcomes.clear()
+        self.backoff = worker_settings.BREAKER_BACKOFF_INITIAL_SECONDS
+        BREAKER_OPEN.labels(self.name).set(0)
+
+
+global_breaker = CircuitBreaker(GLOBAL)
+bot_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(bot_id: int | str) -> CircuitBreaker:
+    bot_id = str(bot_id)
+    if bot_id not in bot_breakers:
+        bot_breakers[bot_id] = CircuitBreaker(bot_id)
+    return bot_breakers[bot_id]
+
+
+def record_outcome(bot: Bot, error: Optional[Exception]) -> None:
+    """
+    Only errors that say nothing about the recipient count as failures:
+    revoked tokens open the bot breaker at once, network errors and
+    Telegram 5xx feed both the bot and the global breaker.
+    """
+    breaker = get_breaker(bot_label(bot))
+    if isinstance(error, TelegramUnauthorizedError):
+        breaker.trip()
+        return
+    failed = isinstance(error, (TelegramNetworkError, TelegramServerError))
+    breaker.record(failed)
+    global_breaker.record(failed)
+
+
+def is_open(bot: Bot) -> bool:
+    return global_breaker.is_open or get_breaker(bot_label(bot)).is_open
+
+
+async def wait_until_closed(bot: Bot) -> None:
+    """
+    Blocks the bot's consumer until `get_me` succeeds again.
+    """
+    while is_open(bot):
+        breakers = [
+            breaker
+            for breaker in (global_breaker, get_breaker(bot_label(bot)))
+            if breaker.is_open
+        ]
+        probe_at = min(breaker.probe_at for breaker in breakers)
+        if probe_at > time.monotonic():
+            await asyncio.sleep(probe_at - time.monotonic())
+            # Another consumer may have probed the global breaker meanwhile
+            continue
+        for breaker in breakers:
+            # Holds other consumers off while this probe is in flight
+            breaker.probe_at = time.monotonic() + breaker.backoff
+        try:
+            with api_timer(bot, "get_me"):
+                await bot.get_me()
+        except (TelegramNetworkError, TelegramServerError) as ex:
+            logger.warning("Probe of bot %s failed: %s", bot_label(bot), ex)
+            for breaker in breakers:
+                breaker.probe_failed()
+        except Exception as ex:
+            logger.warning("Probe of bot %s failed: %s", bot_label(bot), ex)
+            get_breaker(bot_label(bot)).probe_failed()
+        else:
+            for breaker in breakers:
+                breaker.reset()
@@ -0,0 +1,84 @@
+import json
+import time
+from typing import Optional
+
+from redis import RedisError
+from redis import asyncio as aioredis
+
+from configs.config import worker_settings
+from configs.logger import logger
+from utils.keys import dlq_stream
+from utils.redis import redis_conn
+
+
+async def dead_letter(
+    bot_id: int | str,
+    payload: dict,
+    stream_name: Optional[str],
+    entry_id: Optional[str],
+    error: str,
+    attempts: int = 1,
+    redis_conn: aioredis.Redis = redis_conn,
+) -> None:
+    """
+    Moves a stream entry that cannot be delivered to the bot's
+    dead-letter stream, keeping the original payload for replay.
+    """
+    enqueued_ms = int(entry_id.split("-", 1)[0]) if entry_id else None
+    fields = {
+        "payload": json.dumps(payload, default=str),
+        "stream": stream_name or "",
+        "entry_id": entry_id or "",
+        "error": error,
+        "attempts": attempts,
+        "enqueued_at": enqueued_ms / 1000 if enqueued_ms else "",
+        "failed_at": time.time(),
+    }
+    try:
+        await redis_conn.xadd(
+            dlq_stream(bot_id),
+            fields,
+            maxlen=worker_settings.DLQ_MAXLEN,
+            approximate=True,
+        )
+    except RedisError as ex:
+        logger.error("Failed to dead-letter %s: %s", entry_id, ex)
+        raise
+    logger.warning(
+        "Dead-lettered %s from %s: %s (attempts: %s)",
+        entry_id,
+        stream_name,
+        error,
+        attempts,
+    )
+
+
+async def replay_dead_letters(
+    bot_id: int | str,
+    count: Optional[int] = None,
+    redis_conn: aioredis.Redis = redis_conn,
+) -> int:
+    """
+    Requeues up to `count` (all if None) dead-lettered entries, oldest
+    first, into the streams they came from. Returns the number requeued.
+    """
+    stream = dlq_stream(bot_id)
+    replayed = 0
+    last_id = "-"
+    while count is None or replayed < count:
+        batch = worker_settings.DLQ_REPLAY_BATCH
+        if count is not None:
+            batch = min(batch, count - replayed)
+        entries = await redis_conn.xrange(stream, min=last_id, count=batch)
+        if not entries:
+            break
+        async with redis_conn.pipeline(transaction=True) as pipe:
+            for entry_id, fields in entries:
+                if fields.get("stream"):
+                    pipe.xadd(fields["stream"], json.loads(fields["payload"]))
+                pipe.xdel(stream, entry_id)
+            await pipe.execute()
+        replayed += len(entries)
+        last_id = f"({entries[-1][0]}"
+    logger.info("Replayed %s dead letters of bot %s", replayed, bot_id)
+    return replayed
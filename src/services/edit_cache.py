@@ -0,0 +1,86 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from redis import RedisError
+from redis import asyncio as aioredis
+
+from configs.config import worker_settings
+from configs.logger import logger
+from schemas.message import ReplyMarkup
+from utils.redis import add_to_redis, get_from_redis, redis_conn
+
+
+def content_hash(
+    text: Optional[str], reply_markup: Optional[ReplyMarkup]
+) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update((text or "").encode())
+    digest.update(b"\0")
+    if reply_markup:
+        digest.update(reply_markup.model_dump_json().encode())
+    return digest.hexdigest()
+
+
+class EditCache:
+    """
+    Hash of the last content applied to a message, so repeated edits
+    with the same text and markup are skipped without taking an edit
+    slot. Kept in a bounded LRU, optionally backed by Redis to survive
+    restarts and to be shared between workers. With Redis, it is the
+    authority on a skip: the LRU only answers that content changed.
+    """
+
+    def __init__(
+        self,
+        redis_conn: Optional[aioredis.Redis] = redis_conn,
+        max_size: int = worker_settings.EDIT_CACHE_SIZE,
+        ttl: int = worker_settings.EDIT_CACHE_TTL_SECONDS,
+    ) -> None:
+        self.redis_conn = redis_conn
+        self.max_size = max_size
+        self.ttl = ttl
+        # key -> (hash, expires at)
+        self.entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+    async def is_unchanged(self, key: str, digest: str) -> bool:
+        if (entry := self.entries.get(key)) and entry[1] > time.monotonic():
+            self.entries.move_to_end(key)
+            # Another worker may have applied newer content since, so only
+            # a mismatch is final when Redis is shared; a match is checked
+            if entry[0] != digest or self.redis_conn is None:
+                return entry[0] == digest
+        elif self.redis_conn is None:
+            return False
+        try:
+            stored = await get_from_redis(redis_conn=self.redis_conn, key=key)
+        except RedisError:
+            # The cache is an optimisation, edit as usual
+            return False
+        if stored is None:
+            return False
+        self._remember(key, stored)
+        return stored == digest
+
+    async def store(self, key: str, digest: str) -> None:
+        self._remember(key, digest)
+        if self.redis_conn is None:
+            return
+        try:
+            await add_to_redis(
+                redis_conn=self.redis_conn, key=key, value=digest, ttl=self.ttl
+            )
+        except RedisError as ex:
+            logger.warning("Failed to store edit hash %s: %s", key, ex)
+
+    def _remember(self, key: str, digest: str) -> None:
+        self.entries[key] = (digest, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+edit_cache = EditCache(
+    redis_conn=redis_conn if worker_settings.EDIT_CACHE_REDIS else None
+)
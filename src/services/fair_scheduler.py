@@ -0,0 +1,118 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Any, Callable, Coroutine, Generator
+
+from configs.config import worker_settings
+from services.metrics import BOT_CPU_SECONDS
+
+
+class Metered:
+    """
+    Awaits a coroutine and reports the CPU time of each of its steps,
+    i.e. of every stretch it runs on the loop between two suspensions.
+    """
+
+    def __init__(
+        self, coro: Coroutine, on_step: Callable[[float], None]
+    ) -> None:
+        self.coro = coro
+        self.on_step = on_step
+
+    def __await__(self) -> Generator[Any, Any, Any]:
+        value, error = None, None
+        while True:
+            started = time.thread_time()
+            try:
+                if error is None:
+                    yielded = self.coro.send(value)
+                else:
+                    yielded = self.coro.throw(error)
+            except StopIteration as stop:
+                self.on_step(time.thread_time() - started)
+                return stop.value
+            except BaseException:
+                self.on_step(time.thread_time() - started)
+                raise
+            self.on_step(time.thread_time() - started)
+            try:
+                value, error = (yield yielded), None
+            except BaseException as ex:  # Cancellation goes to the coroutine
+                value, error = None, ex
+
+
+class FairScheduler:
+    """
+    Deficit round robin in CPU time over the bots of this process. Every
+    FAIR_TICK_SECONDS each bot is granted FAIR_QUANTUM_MS; a bot that
+    has used its grant waits for the next tick before taking another
+    message. Only enforced while the event loop lags FAIR_LAG_SECONDS or
+    more, so a busy bot on an idle worker runs at full speed, and debt is
+    only kept while enforced.
+    """
+
+    def __init__(self) -> None:
+        self.quantum = worker_settings.FAIR_QUANTUM_MS / 1000
+        self.deficits: dict[str, float] = {}
+        self.used: dict[str, float] = defaultdict(float)
+        self.congested = False
+        self.next_round = asyncio.Event()
+
+    def meter(self, coro: Coroutine, bot_id: int | str) -> Coroutine:
+        """
+        Charges the CPU time of `coro` to the bot.
+        """
+        bot_id = str(bot_id)
+
+        def charge(seconds: float) -> None:
+            self.used[bot_id] += seconds
+            self.deficits[bot_id] = (
+                self.deficits.get(bot_id, self.quantum) - seconds
+            )
+
+        async def run() -> Any:
+            return await Metered(coro, charge)
+
+        return run()
+
+    async def wait_turn(self, bot_id: int | str) -> None:
+        bot_id = str(bot_id)
+        while self.congested and self.deficits.get(bot_id, self.quantum) <= 0:
+            await self.next_round.wait()
+
+    def forget(self, bot_id: int | str) -> None:
+        self.deficits.pop(str(bot_id), None)
+
+    def on_lag(self, seconds: float) -> None:
+        self.congested = (
+            worker_settings.FAIR_SCHEDULING
+            and seconds >= worker_settings.FAIR_LAG_SECONDS
+        )
+
+    async def run(self) -> None:
+        try:
+            while True:
+                await asyncio.sleep(worker_settings.FAIR_TICK_SECONDS)
+                self._tick()
+        finally:
+            # Nobody may stay parked once rounds stop, e.g. while draining
+            self.congested = False
+            self.next_round.set()
+
+    def _tick(self) -> None:
+        for bot_id, seconds in self.used.items():
+            BOT_CPU_SECONDS.labels(bot_id).inc(seconds)
+        self.used.clear()
+        if self.congested:
+            # Credit is capped at one quantum, debt is paid off over ticks
+            for bot_id, deficit in self.deficits.items():
+                self.deficits[bot_id] = min(
+                    deficit + self.quantum, self.quantum
+                )
+        else:
+            self.deficits.clear()
+        next_round, self.next_round = self.next_round, asyncio.Event()
+        next_round.set()
+
+
+fair_scheduler = FairScheduler()
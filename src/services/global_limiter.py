@@ -1,39 +1,95 @@
 import asyncio
-import time
+from collections import deque
+from typing import Optional
 
 from configs.config import telegram_settings as tg_settings
+from utils.clock import now as clock_now
+
+
+class TokenBucket:
+    """
+    Per bot token bucket. Callers that find it empty are queued and woken
+    in FIFO order by a single timer, nobody sleeps under a lock.
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.updated = clock_now()
+        self.waiters: deque[asyncio.Future] = deque()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def refill(self) -> None:
+        now = clock_now()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def try_take(self) -> bool:
+        self.refill()
+        if not self.waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    async def wait(self) -> None:
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self._schedule()
+        # A cancelled waiter stays in the queue and is skipped on release
+        await waiter
+
+    def _schedule(self) -> None:
+        if self.timer is not None or not self.waiters:
+            return
+        loop = asyncio.get_running_loop()
+        delay = max((1 - self.tokens) / self.rate, 0.0)
+        self.timer = loop.call_at(loop.time() + delay, self._release)
+
+    def _release(self) -> None:
+        self.timer = None
+        self.refill()
+        while self.waiters and self.tokens >= 1:
+            waiter = self.waiters.popleft()
+            if waiter.done():
+                continue
+            self.tokens -= 1
+            waiter.set_result(None)
+        while self.waiters and self.waiters[0].done():
+            self.waiters.popleft()
+        self._schedule()
 
 
 class GlobalRateLimiter:
     def __init__(self) -> None:
-        self.delay_interval = 1.0 / tg_settings.GLOBAL_RPS
-        self.bots: list[int, tuple[asyncio.Lock, float]] = {}
-        self.lock = asyncio.Lock()
+        self.rate = float(tg_settings.GLOBAL_RPS)
+        self.burst = tg_settings.GLOBAL_BURST
+        self.buckets: dict[int | str, TokenBucket] = {}
+        self.rates: dict[int | str, float] = {}
 
-    async def acquire_lock(self, bot_id: int | str) -> bool:
-        lock, last_send = await self.get_bot_info(bot_id)
-        async with lock:
-            now = time.monotonic()
-            next_time = last_send + self.delay_interval
-            if now < next_time:
-                await asyncio.sleep(next_time - now)
-            await self.change_last_send(bot_id, time.monotonic())
-            return True
+    def set_rate(self, bot_id: int | str, rps: float | None = None) -> None:
+        """
+        Overrides GLOBAL_RPS for a single bot, None restores the default.
+        """
+        if rps:
+            self.rates[bot_id] = rps
+        else:
+            self.rates.pop(bot_id, None)
+        if bucket := self.buckets.get(bot_id):
+            bucket.refill()
+            bucket.rate = self.rates.get(bot_id, self.rate)
 
-    async def get_bot_info(
-        self, bot_id: int | str
-    ) -> tuple[asyncio.Lock, float]:
-        async with self.lock:
-            if bot_id not in self.bots:
-                self.bots[bot_id] = [asyncio.Lock(), time.monotonic()]
-            return self.bots[bot_id]
-
-    async def change_last_send(
-        self, bot_id: int | str, last_send: float
-    ) -> None:
-        async with self.lock:
-            if bot_id in self.bots:
-                self.bots[bot_id][-1] = last_send
+    async def acquire_lock(self, bot_id: int | str) -> bool:
+        bucket = self.buckets.get(bot_id)
+        if bucket is None:
+            bucket = self.buckets[bot_id] = TokenBucket(
+                rate=self.rates.get(bot_id, self.rate), capacity=self.burst
+            )
+        if not bucket.try_take():
+            await bucket.wait()
+        return True
 
 
 global_limiter = GlobalRateLimiter()
@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import URLInputFile
+from aiohttp import ClientError
+from redis import RedisError
+from redis import asyncio as aioredis
+
+from configs.logger import logger
+from schemas.message import TaskMessage
+from services.telegram import send_media
+from utils.keys import file_id_key
+from utils.redis import redis_conn
+
+
+def media_digest(data: TaskMessage) -> str:
+    if data.media_hash:
+        return data.media_hash
+    return hashlib.sha256(data.media_url.encode()).hexdigest()
+
+
+class FileIdCache:
+    """
+    file_id returned by Telegram for uploaded media, per bot (file ids
+    cannot be shared between bots) and content hash. Stored in a Redis
+    hash per bot and mirrored in memory.
+    """
+
+    def __init__(self, redis_conn: aioredis.Redis = redis_conn) -> None:
+        self.redis_conn = redis_conn
+        self.file_ids: dict[tuple[int, str], str] = {}
+        # Upload lock and the number of senders holding or awaiting it
+        self.uploads: dict[tuple[int, str], tuple[asyncio.Lock, int]] = {}
+
+    async def get(self, bot_id: int, digest: str) -> Optional[str]:
+        if file_id := self.file_ids.get((bot_id, digest)):
+            return file_id
+        try:
+            file_id = await self.redis_conn.hget(file_id_key(bot_id), digest)
+        except RedisError as ex:
+            logger.warning("Failed to read file_id cache: %s", ex)
+            return None
+        if file_id:
+            self.file_ids[(bot_id, digest)] = file_id
+        return file_id
+
+    async def set(self, bot_id: int, digest: str, file_id: str) -> None:
+        self.file_ids[(bot_id, digest)] = file_id
+        try:
+            await self.redis_conn.hset(file_id_key(bot_id), digest, file_id)
+        except RedisError as ex:
+            logger.warning("Failed to store file_id: %s", ex)
+
+    async def forget(self, bot_id: int, digest: str) -> None:
+        self.file_ids.pop((bot_id, digest), None)
+        try:
+            await self.redis_conn.hdel(file_id_key(bot_id), digest)
+        except RedisError as ex:
+            logger.warning("Failed to remove file_id: %s", ex)
+
+    @asynccontextmanager
+    async def upload_lock(
+        self, bot_id: int, digest: str
+    ) -> AsyncIterator[None]:
+        """
+        Serialises uploads of the same content. The lock is dropped once
+        its last sender leaves, so late senders never get a second one.
+        """
+        key = (bot_id, digest)
+        lock, users = self.uploads.get(key, (asyncio.Lock(), 0))
+        self.uploads[key] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self.uploads[key]
+            if users > 1:
+                self.uploads[key] = (lock, users - 1)
+            else:
+                del self.uploads[key]
+
+
+file_id_cache = FileIdCache()
+
+
+async def send_cached_media(
+    bot: Bot, data: TaskMessage, caption: Optional[str] = None
+) -> int:
+    """
+    Sends the media of a task, uploading it only if this bot has no
+    file_id for the content yet. Returns the sent message id, 0 on failure.
+    """
+    digest = media_digest(data)
+    if file_id := await file_id_cache.get(data.bot_id, digest):
+        msg_id = await _send_file_id(bot, data, digest, file_id, caption)
+        if msg_id is not None:
+            return msg_id
+    # Concurrent sends of the same content wait for the first upload
+    async with file_id_cache.upload_lock(data.bot_id, digest):
+        if file_id := await file_id_cache.get(data.bot_id, digest):
+            msg_id = await _send_file_id(bot, data, digest, file_id, caption)
+            if msg_id is not None:
+                return msg_id
+        return await _upload(bot, data, digest, caption)
+
+
+async def _send_file_id(
+    bot: Bot,
+    data: TaskMessage,
+    digest: str,
+    file_id: str,
+    caption: Optional[str],
+) -> Optional[int]:
+    """
+    Sends a cached file_id. Returns None if Telegram rejected it, the
+    file_id is forgotten then and the media has to be uploaded again.
+    """
+    try:
+        _, msg_id, _ = await _send(bot, data, file_id, caption)
+    except TelegramBadRequest:
+        logger.warning(
+            "file_id for %s rejected, uploading again", data.media_url
+        )
+        await file_id_cache.forget(data.bot_id, digest)
+        return None
+    return msg_id
+
+
+async def _upload(
+    bot: Bot, data: TaskMessage, digest: str, caption: Optional[str]
+) -> int:
+    try:
+        _, msg_id, file_id = await _send(
+            bot, data, URLInputFile(data.media_url), caption
+        )
+    except (ClientError, TimeoutError) as ex:
+        logger.error("Failed to download %s: %s", data.media_url, ex)
+        return 0
+    if file_id:
+        await file_id_cache.set(data.bot_id, digest, file_id)
+    return msg_id
+
+
+async def _send(
+    bot: Bot,
+    data: TaskMessage,
+    media: str | URLInputFile,
+    caption: Optional[str],
+) -> tuple[int, int, Optional[str]]:
+    return await send_media(
+        bot=bot,
+        chat_id=data.chat_id,
+        media_type=data.media_type,
+        media=media,
+        caption=caption,
+        reply_markup=data.reply_markup,
+        reply_to_message_id=data.reply_to_message_id,
+    )
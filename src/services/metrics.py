@@ -0,0 +1,219 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from aiogram import Bot
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from redis import asyncio as aioredis
+
+from configs.config import redis_settings, worker_settings
+from configs.logger import logger
+from services.profiling import run_stage_hooks
+from utils.keys import broadcast_stream, primary_stream
+
+LATENCY_BUCKETS = (
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    300,
+    900,
+)
+
+ENQUEUE_TO_SEND = Histogram(
+    "tg_sender_enqueue_to_send_seconds",
+    "Time from stream entry creation until the message is processed",
+    ["bot_id", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+LIMITER_WAIT = Histogram(
+    "tg_sender_limiter_wait_seconds",
+    "Time spent waiting for rate limiters",
+    ["bot_id", "limiter"],
+    buckets=LATENCY_BUCKETS,
+)
+TELEGRAM_API_LATENCY = Histogram(
+    "tg_sender_telegram_api_seconds",
+    "Telegram Bot API call latency",
+    ["bot_id", "method"],
+)
+RESULTS = Counter(
+    "tg_sender_results_total",
+    "Processed operations by result (`ok` or error class)",
+    ["bot_id", "operation", "result"],
+)
+RETRIES = Counter(
+    "tg_sender_retries_total",
+    "Telegram API calls retried after RetryAfter",
+    ["bot_id", "operation"],
+)
+STREAM_LAG = Gauge(
+    "tg_sender_stream_lag",
+    "Entries not yet delivered to the consumer group",
+    ["bot_id", "lane"],
+)
+STREAM_PENDING = Gauge(
+    "tg_sender_stream_pending",
+    "Entries delivered but not acknowledged",
+    ["bot_id", "lane"],
+)
+STAGE_SECONDS = Histogram(
+    "tg_sender_stage_seconds",
+    "Time spent in each stage of the consumer pipeline",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+CALLBACK_OUTCOMES = Counter(
+    "tg_sender_callback_outcomes_total",
+    "Outcomes posted to callback urls (`delivered` or `dropped`)",
+    ["bot_id", "result"],
+)
+BOT_CPU_SECONDS = Counter(
+    "tg_sender_bot_cpu_seconds_total",
+    "CPU time spent on the event loop by the consumer of each bot",
+    ["bot_id"],
+)
+LOOP_LAG = Histogram(
+    "tg_sender_event_loop_lag_seconds",
+    "Delay of event loop wake ups",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+REDIS_POOL_CONNECTIONS = Gauge(
+    "tg_sender_redis_pool_connections",
+    "Connections of a Redis pool by state (in_use, idle, max)",
+    ["pool", "state"],
+)
+BREAKER_OPEN = Gauge(
+    "tg_sender_circuit_breaker_open",
+    "1 while the circuit breaker of a bot (or `global`) is open",
+    ["breaker"],
+)
+
+# Telegram bot id (parsed from token) -> bot id in the main app
+_bot_labels: dict[int, str] = {}
+
+
+def start_metrics_server() -> None:
+    start_http_server(worker_settings.METRICS_PORT)
+    logger.info("Metrics exposed on :%s", worker_settings.METRICS_PORT)
+
+
+def register_bot(bot: Bot, bot_id: int | str) -> None:
+    _bot_labels[bot.id] = str(bot_id)
+
+
+def bot_label(bot: Bot) -> str:
+    return _bot_labels.get(bot.id, str(bot.id))
+
+
+@contextmanager
+def api_timer(bot: Bot, method: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        TELEGRAM_API_LATENCY.labels(bot_label(bot), method).observe(elapsed)
+        run_stage_hooks("telegram_api", bot_label(bot), elapsed)
+
+
+@contextmanager
+def limiter_timer(bot_id: int | str, limiter: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        LIMITER_WAIT.labels(str(bot_id), limiter).observe(elapsed)
+        run_stage_hooks("limiter", bot_id, elapsed)
+
+
+def observe_stage(stage_name: str, bot_id: str, seconds: float) -> None:
+    STAGE_SECONDS.labels(stage_name).observe(seconds)
+
+
+def observe_loop_lag(seconds: float) -> None:
+    LOOP_LAG.observe(seconds)
+
+
+def observe_result(bot: Bot, operation: str, error: Exception | None) -> None:
+    result = "ok" if error is None else error.__class__.__name__
+    RESULTS.labels(bot_label(bot), operation, result).inc()
+
+
+def observe_enqueue_latency(
+    bot_id: int | str, operation: str, entry_id: str
+) -> None:
+    """
+    Stream entry ids start with the creation time in milliseconds.
+    """
+    created_ms = int(entry_id.split("-", 1)[0])
+    ENQUEUE_TO_SEND.labels(str(bot_id), operation).observe(
+        max(time.time() - created_ms / 1000, 0)
+    )
+
+
+async def collect_stream_metrics(
+    redis_conn: aioredis.Redis, bot_ids: dict
+) -> None:
+    """
+    Periodically exports lag and pending counts of active bot streams.
+    """
+    lanes = {"primary": primary_stream, "broadcast": broadcast_stream}
+    while True:
+        try:
+            active = list(bot_ids)
+            async with redis_conn.pipeline(transaction=False) as pipe:
+                for bot_id in active:
+                    for stream_key in lanes.values():
+                        pipe.xinfo_groups(stream_key(bot_id))
+                results = iter(await pipe.execute(raise_on_error=False))
+            for bot_id in active:
+                for lane in lanes:
+                    _set_group_gauges(str(bot_id), lane, next(results))
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            logger.exception("Stream metrics collection error: %s", ex)
+        await asyncio.sleep(worker_settings.METRICS_STREAM_INTERVAL_SECONDS)
+
+
+def _set_group_gauges(
+    bot_id: str, lane: str, groups: list[dict] | Exception
+) -> None:
+    if isinstance(groups, Exception):
+        return
+    for group in groups:
+        if group["name"] == redis_settings.GROUP_NAME:
+            STREAM_PENDING.labels(bot_id, lane).set(group["pending"])
+            if group.get("lag") is not None:
+                STREAM_LAG.labels(bot_id, lane).set(group["lag"])
+
+
+async def collect_pool_metrics(pools: dict[str, aioredis.Redis]) -> None:
+    """
+    Samples connection usage of the Redis pools. Cluster clients keep a
+    pool per node and are skipped.
+    """
+    while True:
+        for name, conn in pools.items():
+            pool = getattr(conn, "connection_pool", None)
+            if pool is None:
+                continue
+            in_use = len(getattr(pool, "_in_use_connections", ()))
+            idle = len(getattr(pool, "_available_connections", ()))
+            REDIS_POOL_CONNECTIONS.labels(name, "in_use").set(in_use)
+            REDIS_POOL_CONNECTIONS.labels(name, "idle").set(idle)
+            REDIS_POOL_CONNECTIONS.labels(name, "max").set(
+                pool.max_connections
+            )
+        await asyncio.sleep(worker_settings.METRICS_POOL_INTERVAL_SECONDS)
@@ -0,0 +1,139 @@
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from types import FrameType
+from typing import Callable, Iterator, Optional
+
+from configs.config import worker_settings
+from configs.logger import logger
+
+# Called with the stage name, bot id and seconds spent
+StageHook = Callable[[str, str, float], None]
+
+_stage_hooks: list[StageHook] = []
+_profiler_lock = threading.Lock()
+
+
+def add_stage_hook(hook: StageHook) -> None:
+    _stage_hooks.append(hook)
+
+
+def remove_stage_hook(hook: StageHook) -> None:
+    if hook in _stage_hooks:
+        _stage_hooks.remove(hook)
+
+
+def run_stage_hooks(
+    stage_name: str, bot_id: int | str, seconds: float
+) -> None:
+    for hook in _stage_hooks:
+        try:
+            hook(stage_name, str(bot_id), seconds)
+        except Exception as ex:
+            logger.exception("Stage hook %s failed: %s", hook, ex)
+
+
+@contextmanager
+def stage(stage_name: str, bot_id: int | str) -> Iterator[None]:
+    """
+    Times a pipeline stage and reports it to the registered hooks.
+    """
+    if not _stage_hooks:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        run_stage_hooks(stage_name, bot_id, time.perf_counter() - started)
+
+
+async def monitor_loop_lag(on_lag: Callable[[float], None]) -> None:
+    """
+    Measures how late the event loop wakes up a sleeping task.
+    """
+    interval = worker_settings.LOOP_LAG_INTERVAL_SECONDS
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - started - interval, 0.0)
+        on_lag(lag)
+        if lag >= worker_settings.LOOP_LAG_WARN_SECONDS:
+            logger.warning("Event loop lag: %.3fs", lag)
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread at a fixed interval and aggregates
+    the samples in the collapsed format used by flamegraph tools.
+    """
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+
+    def run(self, duration: float) -> None:
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)  # noqa: SLF001
+            if frame is not None:
+                self.samples[self._collapse(frame)] += 1
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _collapse(frame: Optional[FrameType]) -> str:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(
+                f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                f":{frame.f_lineno})"
+            )
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def dump(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as f:
+            for collapsed, count in self.samples.most_common():
+                f.write(f"{collapsed} {count}\n")
+
+
+async def run_sampling_profiler(
+    duration: float, interval_ms: float
+) -> Optional[Path]:
+    """
+    Profiles the event loop thread for `duration` seconds from a helper
+    thread and writes the collapsed stacks to PROFILE_DIR.
+    """
+    if not _profiler_lock.acquire(blocking=False):
+        logger.warning("Profiler is already running, request ignored")
+        return None
+    try:
+        duration = min(duration, worker_settings.PROFILE_MAX_SECONDS)
+        profiler = SamplingProfiler(
+            thread_id=threading.get_ident(), interval=interval_ms / 1000
+        )
+        logger.info("Sampling profiler started for %.1fs", duration)
+        await asyncio.to_thread(profiler.run, duration)
+        path = Path(worker_settings.PROFILE_DIR) / (
+            f"profile-{socket.gethostname()}-{os.getpid()}"
+            f"-{int(time.time())}.folded"
+        )
+        await asyncio.to_thread(profiler.dump, path)
+        logger.info(
+            "Sampling profiler wrote %d samples to %s",
+            sum(profiler.samples.values()),
+            path,
+        )
+        return path
+    finally:
+        _profiler_lock.release()
@@ -1,22 +1,90 @@
 import asyncio
-import time
+from typing import Optional
 
 from redis import RedisError
+from redis import asyncio as aioredis
 
 from configs.logger import logger
-from configs.config import redis_settings, telegram_settings as tg_settings
-from services.global_limiter import global_limiter
+from configs.config import telegram_settings as tg_settings
+from services.chat_cache import is_group_chat
+from services.global_limiter import GlobalRateLimiter, global_limiter
+from utils.clock import now as clock_now
+from utils.keys import chat_edit_key, chat_send_key, group_send_key
 from utils.redis import add_to_redis, get_from_redis, redis_conn
 
+# GCRA reservation, see `gcra_reserve` for the reference implementation.
+# KEYS[1] - theoretical arrival time (TAT) of the next message
+# ARGV - emission interval, burst tolerance (seconds), optional now
+# Returns seconds the caller must wait before sending
+# The TAT is shared by every worker, so it is compared against the Redis
+# server clock; `now` is only passed by the simulator's virtual clock.
+GCRA_RESERVE_SCRIPT = """
+redis.replicate_commands()
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+if now == nil then
+    local time = redis.call("TIME")
+    now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+end
+local tat = tonumber(redis.call("GET", KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local wait = tat - tolerance - now
+if wait < 0 then
+    wait = 0
+end
+local new_tat = tat + interval
+redis.call(
+    "SET", KEYS[1], tostring(new_tat),
+    "PX", math.ceil((new_tat - now) * 1000)
+)
+return tostring(wait)
+"""
+
+
+def gcra_reserve(
+    tat: float | None, now: float, interval: float, tolerance: float
+) -> tuple[float, float]:
+    """
+    Reserves the next slot of a GCRA limiter, returns (wait, new TAT).
+    """
+    tat = max(tat if tat is not None else now, now)
+    return max(tat - tolerance - now, 0.0), tat + interval
+
+
+def group_gcra_params() -> tuple[float, float]:
+    """
+    Emission interval and tolerance that allow PER_GROUP_MSG_BURST
+    messages at once and never more than PER_GROUP_MSG_LIMIT in any
+    PER_GROUP_MSG_WINDOW.
+    """
+    limit = tg_settings.PER_GROUP_MSG_LIMIT
+    burst = max(min(tg_settings.PER_GROUP_MSG_BURST, limit), 1)
+    interval = tg_settings.PER_GROUP_MSG_WINDOW / (limit - burst + 1)
+    return interval, interval * (burst - 1)
+
 
 class TelegramRateLimiter:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        redis_conn: aioredis.Redis = redis_conn,
+        global_limiter: GlobalRateLimiter = global_limiter,
+    ) -> None:
+        self.redis_conn = redis_conn
+        self.global_limiter = global_limiter
         self.lock = asyncio.Lock()
+        self.gcra_reserve = redis_conn.register_script(GCRA_RESERVE_SCRIPT)
+        self.group_interval, self.group_tolerance = group_gcra_params()
 
     async def acquire_lock(
-        self, chat_id: int | str, bot_id: int | str
+        self,
+        chat_id: int | str,
+        bot_id: int | str,
+        chat_type: Optional[str] = None,
     ) -> bool:
-        if str(chat_id).startswith("-"):
+        if is_group_chat(chat_id, chat_type):
             return await self._acquire_group_lock(
                 chat_id=chat_id, bot_id=bot_id
             )
@@ -25,13 +93,13 @@ class TelegramRateLimiter:
     async def _acquire_lock(
         self, chat_id: int | str, bot_id: int | str
     ) -> bool:
-        await global_limiter.acquire_lock(bot_id)
+        await self.global_limiter.acquire_lock(bot_id)
         async with self.lock:
-            now = time.monotonic()
-            redis_key = f"{redis_settings.CHAT_SEND_PREFIX}{chat_id}:{bot_id}"
+            now = clock_now()
+            redis_key = chat_send_key(chat_id, bot_id)
             try:
                 if last_chat_send := await get_from_redis(
-                    redis_conn=redis_conn, key=redis_key
+                    redis_conn=self.redis_conn, key=redis_key
                 ):
                     time_since_last_send = now - float(last_chat_send)
                     required_to_wait = (
@@ -40,26 +108,26 @@ class TelegramRateLimiter:
                     if required_to_wait > 0:
                         await asyncio.sleep(required_to_wait)
                 await add_to_redis(
-                    redis_conn=redis_conn,
+                    redis_conn=self.redis_conn,
                     key=redis_key,
-                    value=time.monotonic(),
+                    value=clock_now(),
                     ttl=int(tg_settings.PER_CHAT_DELAY),
                 )
             except RedisError as ex:
-                logger.exception(f"Redis connection error: {ex.args}")
+                logger.exception("Redis connection error: %s", ex.args)
                 raise
         return True
 
     async def acquire_edit_lock(
         self, chat_id: int | str, bot_id: int | str
     ) -> bool:
-        await global_limiter.acquire_lock(bot_id)
+        await self.global_limiter.acquire_lock(bot_id)
         async with self.lock:
-            now = time.monotonic()
-            redis_key = f"{redis_settings.CHAT_EDIT_PREFIX}{chat_id}:{bot_id}"
+            now = clock_now()
+            redis_key = chat_edit_key(chat_id, bot_id)
             try:
                 if last_chat_send := await get_from_redis(
-                    redis_conn=redis_conn, key=redis_key
+                    redis_conn=self.redis_conn, key=redis_key
                 ):
                     time_since_last_send = now - float(last_chat_send)
                     required_to_wait = (
@@ -68,42 +136,35 @@ class TelegramRateLimiter:
                     if required_to_wait > 0:
                         await asyncio.sleep(required_to_wait)
                 await add_to_redis(
-                    redis_conn=redis_conn,
+                    redis_conn=self.redis_conn,
                     key=redis_key,
-                    value=time.monotonic(),
+                    value=clock_now(),
                     ttl=int(tg_settings.PER_CHAT_EDIT_DELAY),
                 )
             except RedisError as ex:
-                logger.exception(f"Redis connection error: {ex.args}")
+                logger.exception("Redis connection error: %s", ex.args)
                 raise
         return True
 
     async def _acquire_group_lock(
         self, chat_id: int | str, bot_id: int | str
     ) -> bool:
-        await global_limiter.acquire_lock(bot_id)
-        async with self.lock:
-            now = time.monotonic()
-            redis_key = f"{redis_settings.GROUP_SEND_PREFIX}{chat_id}:{bot_id}"
-            try:
-                if last_chat_send := await get_from_redis(
-                    redis_conn=redis_conn, key=redis_key
-                ):
-                    time_since_last_send = now - float(last_chat_send)
-                    required_to_wait = (
-                        tg_settings.PER_GROUP_MSG_DELAY - time_since_last_send
-                    )
-                    if required_to_wait > 0:
-                        await asyncio.sleep(required_to_wait)
-                await add_to_redis(
-                    redis_conn=redis_conn,
-                    key=redis_key,
-                    value=time.monotonic(),
-                    ttl=int(tg_settings.PER_GROUP_MSG_DELAY),
+        redis_key = group_send_key(chat_id, bot_id)
+        try:
+            # The slot is reserved atomically, so waiting for it does not
+            # need the shared lock and other chats are not held up
+            wait = float(
+                await self.gcra_reserve(
+                    keys=[redis_key],
+                    args=[self.group_interval, self.group_tolerance],
                 )
-            except RedisError as ex:
-                logger.exception(f"Redis connection error: {ex.args}")
-                raise
+            )
+        except RedisError as ex:
+            logger.exception("Redis connection error: %s", ex.args)
+            raise
+        if wait > 0:
+            await asyncio.sleep(wait)
+        await self.global_limiter.acquire_lock(bot_id)
         return True
 
 
@@ -0,0 +1,187 @@
+from typing import Optional
+
+from redis import asyncio as aioredis
+
+from configs.config import redis_settings, worker_settings
+from configs.logger import logger
+from schemas.bot import BotRecord, RegistryChange
+from utils.keys import bot_meta_key
+from utils.redis import (
+    CROSS_SLOT_TRANSACTIONS,
+    blocking_redis_conn,
+    get_keys_by_prefix,
+    get_many_from_redis,
+    redis_conn,
+)
+
+UPSERT = "upsert"
+REMOVE = "remove"
+
+
+class BotRegistry:
+    """
+    Bot registry stored as a hash per bot plus an index set.
+    Every change bumps the bot revision and is appended to the changes
+    stream, so workers can sync incrementally instead of scanning keys.
+    """
+
+    def __init__(
+        self,
+        redis_conn: aioredis.Redis,
+        blocking_conn: aioredis.Redis = blocking_redis_conn,
+    ) -> None:
+        self.redis_conn = redis_conn
+        # Change reads block, they get connections of their own
+        self.blocking_conn = blocking_conn
+
+    @staticmethod
+    def meta_key(bot_id: int | str) -> str:
+        return bot_meta_key(bot_id)
+
+    async def exists(self, bot_id: int) -> bool:
+        return bool(
+            await self.redis_conn.sismember(
+                redis_settings.TG_BOT_INDEX_KEY, str(bot_id)
+            )
+        )
+
+    async def get(self, bot_id: int) -> Optional[BotRecord]:
+        raw = await self.redis_conn.hgetall(self.meta_key(bot_id))
+        return self._parse(raw)
+
+    async def add(self, record: BotRecord) -> BotRecord:
+        key = self.meta_key(record.bot_id)
+        async with self.redis_conn.pipeline(
+            transaction=CROSS_SLOT_TRANSACTIONS
+        ) as pipe:
+            pipe.hset(
+                key,
+                mapping={
+                    "bot_id": record.bot_id,
+                    "token": record.token,
+                    "is_sent_logs": int(bool(record.is_sent_logs)),
+                    "rps": "" if record.rps is None else record.rps,
+                    "callback_url": record.callback_url or "",
+                },
+            )
+            pipe.hincrby(key, "revision", 1)
+            pipe.sadd(redis_settings.TG_BOT_INDEX_KEY, str(record.bot_id))
+            _, revision, _ = await pipe.execute()
+        record = record.model_copy(update={"revision": revision})
+        await self._notify(UPSERT, record.bot_id, revision)
+        return record
+
+    async def remove(self, bot_id: int) -> None:
+        async with self.redis_conn.pipeline(
+            transaction=CROSS_SLOT_TRANSACTIONS
+        ) as pipe:
+            pipe.delete(self.meta_key(bot_id))
+            pipe.srem(redis_settings.TG_BOT_INDEX_KEY, str(bot_id))
+            await pipe.execute()
+        await self._notify(REMOVE, bot_id)
+
+    async def load_all(self) -> list[BotRecord]:
+        bot_ids = sorted(
+            await self.redis_conn.smembers(redis_settings.TG_BOT_INDEX_KEY)
+        )
+        records = []
+        batch_size = worker_settings.RESTORE_BATCH_SIZE
+        for i in range(0, len(bot_ids), batch_size):
+            async with self.redis_conn.pipeline(transaction=False) as pipe:
+                for bot_id in bot_ids[i : i + batch_size]:
+                    pipe.hgetall(self.meta_key(bot_id))
+                records.extend(
+                    record
+                    for raw in await pipe.execute()
+                    if (record := self._parse(raw))
+                )
+        return records
+
+    async def last_change_id(self) -> str:
+        entries = await self.redis_conn.xrevrange(
+            redis_settings.TG_BOT_REGISTRY_STREAM, count=1
+        )
+        return entries[0][0] if entries else "0-0"
+
+    async def read_changes(
+        self, last_id: str, block: int
+    ) -> list[tuple[str, RegistryChange]]:
+        messages = await self.blocking_conn.xread(
+            streams={redis_settings.TG_BOT_REGISTRY_STREAM: last_id},
+            block=block,
+        )
+        return [
+            (entry_id, RegistryChange.model_validate(data))
+            for _, entries in messages
+            for entry_id, data in entries
+        ]
+
+    async def migrate_legacy(self) -> int:
+        """
+        Moves bots stored as `telegram_bot:{id}` string keys into the
+        registry. Requires a keyspace SCAN, so it runs only once, and
+        never in cluster mode where SCAN sees a single node.
+        """
+        if redis_settings.REDIS_CLUSTER:
+            return 0
+        if await self.redis_conn.exists(
+            redis_settings.TG_BOT_REGISTRY_MIGRATED_KEY
+        ):
+            return 0
+        keys = await get_keys_by_prefix(
+            redis_conn=self.redis_conn, prefix=redis_settings.TG_KEY_PREFIX
+        )
+        migrated = 0
+        batch_size = worker_settings.RESTORE_BATCH_SIZE
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i : i + batch_size]
+            values = await get_many_from_redis(
+                redis_conn=self.redis_conn, keys=batch
+            )
+            for key, raw_token in zip(batch, values, strict=True):
+                if not raw_token or ":LOGS:" not in raw_token:
+                    logger.error("Cannot migrate legacy bot key: %s", key)
+                    continue
+                token, is_sent_logs = raw_token.split(":LOGS:")
+                await self.add(
+                    BotRecord(
+                        bot_id=int(key.split(redis_settings.TG_KEY_PREFIX)[1]),
+                        token=token,
+                        is_sent_logs=is_sent_logs == "True",
+                    )
+                )
+                await self.redis_conn.delete(key)
+                migrated += 1
+        await self.redis_conn.set(
+            redis_settings.TG_BOT_REGISTRY_MIGRATED_KEY, migrated
+        )
+        logger.info("Migrated %s legacy bot keys to registry", migrated)
+        return migrated
+
+    async def _notify(
+        self, op: str, bot_id: int, revision: int | None = 0
+    ) -> None:
+        await self.redis_conn.xadd(
+            name=redis_settings.TG_BOT_REGISTRY_STREAM,
+            fields=RegistryChange(
+                op=op, bot_id=bot_id, revision=revision
+            ).model_dump(),
+            maxlen=redis_settings.TG_BOT_REGISTRY_STREAM_MAXLEN,
+            approximate=True,
+        )
+
+    @staticmethod
+    def _parse(raw: dict) -> Optional[BotRecord]:
+        if not raw or "token" not in raw:
+            return None
+        return BotRecord(
+            bot_id=int(raw["bot_id"]),
+            token=raw["token"],
+            is_sent_logs=raw.get("is_sent_logs") == "1",
+            rps=float(raw["rps"]) if raw.get("rps") else None,
+            callback_url=raw.get("callback_url") or None,
+            revision=int(raw.get("revision", 0)),
+        )
+
+
+bot_registry = BotRegistry(redis_conn)
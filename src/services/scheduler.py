@@ -0,0 +1,182 @@
+import asyncio
+import json
+import random
+import time
+from datetime import UTC
+from typing import Optional
+
+from redis import RedisError
+from redis import asyncio as aioredis
+from redis.asyncio.cluster import RedisCluster
+from redis.commands.core import AsyncScript
+
+from configs.config import redis_settings, worker_settings
+from configs.logger import logger
+from schemas.message import Message, TaskMessage
+from utils.keys import broadcast_stream, primary_stream, schedule_key
+from utils.redis import redis_conn
+
+BROADCAST_LANE = "broadcast"
+PRIMARY_LANE = "primary"
+
+# Moves due entries of one bot into its lane streams. The keys share the
+# bot hash tag, so the script also runs on a cluster.
+# KEYS[1] - schedule sorted set, KEYS[2] - primary, KEYS[3] - broadcast
+# ARGV - now (ms), max entries to release
+# Returns released and remaining counts
+RELEASE_SCRIPT = """
+local due = redis.call(
+    "ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1],
+    "LIMIT", 0, tonumber(ARGV[2])
+)
+for _, member in ipairs(due) do
+    local entry = cjson.decode(member)
+    local stream = KEYS[2]
+    if entry.lane == "broadcast" then
+        stream = KEYS[3]
+    end
+    redis.call("XADD", stream, "*", "type", entry.type, "data", entry.data)
+    redis.call("ZREM", KEYS[1], member)
+end
+return {#due, redis.call("ZCARD", KEYS[1])}
+"""
+
+
+def lane_of(stream_name: str) -> str:
+    if stream_name.startswith(redis_settings.TG_BROADCAST_STREAM_PREFIX):
+        return BROADCAST_LANE
+    return PRIMARY_LANE
+
+
+def due_time(
+    data: TaskMessage, entry_id: Optional[str] = None
+) -> Optional[float]:
+    """
+    Unix time the message should be sent at, None if it is due already.
+    `delay_ms` counts from the moment the entry was added to the stream.
+    """
+    if data.send_at is None and not data.delay_ms:
+        return None
+    if data.send_at is not None:
+        send_at = data.send_at
+        if send_at.tzinfo is None:
+            send_at = send_at.replace(tzinfo=UTC)
+        due = send_at.timestamp()
+    else:
+        enqueued = time.time()
+        if entry_id:
+            enqueued = int(entry_id.split("-", 1)[0]) / 1000
+        due = enqueued + data.delay_ms / 1000
+    if data.jitter_ms:
+        due += random.uniform(0, data.jitter_ms / 1000)  # noqa: S311
+    if due <= time.time() + worker_settings.SCHEDULE_TICK_SECONDS / 2:
+        return None
+    return due
+
+
+async def schedule_message(
+    msg: Message,
+    stream_name: str,
+    due: float,
+    entry_id: Optional[str] = None,
+    redis_conn: aioredis.Redis = redis_conn,
+) -> None:
+    data = msg.data.model_copy(
+        update={"send_at": None, "delay_ms": None, "jitter_ms": None}
+    )
+    member = json.dumps(
+        {
+            # Keeps identical payloads apart in the sorted set
+            "id": entry_id or f"{time.time_ns()}",
+            "lane": lane_of(stream_name),
+            "type": msg.type.value,
+            "data": data.model_dump_json(exclude_none=True),
+        }
+    )
+    try:
+        async with redis_conn.pipeline(transaction=False) as pipe:
+            # Index is added after the entry, see `_drop_empty`
+            pipe.zadd(schedule_key(data.bot_id), {member: int(due * 1000)})
+            pipe.sadd(redis_settings.TG_SCHEDULE_INDEX_KEY, data.bot_id)
+            await pipe.execute()
+    except RedisError as ex:
+        logger.error("Failed to schedule message: %s", ex)
+        raise
+    logger.debug("Scheduled %s for %s", entry_id, due)
+
+
+async def run_scheduler(redis_conn: aioredis.Redis = redis_conn) -> None:
+    """
+    Releases due messages of every bot with a schedule, at most
+    SCHEDULE_RELEASE_BATCH per bot and tick, so a campaign planned for
+    one moment enters the streams as a steady flow.
+    """
+    release = redis_conn.register_script(RELEASE_SCRIPT)
+    while True:
+        try:
+            await _release_due(redis_conn, release)
+        except asyncio.CancelledError:
+            logger.info("Scheduler shutting down...")
+            break
+        except Exception as ex:
+            logger.exception("Scheduler error: %s", ex)
+        await asyncio.sleep(worker_settings.SCHEDULE_TICK_SECONDS)
+
+
+async def _release_due(
+    redis_conn: aioredis.Redis, release: AsyncScript
+) -> None:
+    bot_ids = list(
+        await redis_conn.smembers(redis_settings.TG_SCHEDULE_INDEX_KEY)
+    )
+    if not bot_ids:
+        return
+    args = [int(time.time() * 1000), worker_settings.SCHEDULE_RELEASE_BATCH]
+    if isinstance(redis_conn, RedisCluster):
+        # Bots live on different nodes, each call goes to its own
+        results = await asyncio.gather(
+            *(
+                release(keys=_release_keys(bot_id), args=args)
+                for bot_id in bot_ids
+            )
+        )
+    else:
+        async with redis_conn.pipeline(transaction=False) as pipe:
+            for bot_id in bot_ids:
+                await release(
+                    keys=_release_keys(bot_id), args=args, client=pipe
+                )
+            results = await pipe.execute()
+    empty = []
+    for bot_id, (released, remaining) in zip(bot_ids, results, strict=True):
+        if released:
+            logger.info(
+                "Released %s scheduled messages for bot %s", released, bot_id
+            )
+        if not remaining:
+            empty.append(bot_id)
+    if empty:
+        await _drop_empty(redis_conn, empty)
+
+
+def _release_keys(bot_id: int | str) -> list[str]:
+    return [
+        schedule_key(bot_id),
+        primary_stream(bot_id),
+        broadcast_stream(bot_id),
+    ]
+
+
+async def _drop_empty(redis_conn: aioredis.Redis, bot_ids: list) -> None:
+    """
+    Removes bots without scheduled entries from the index. A producer
+    adds the entry before the index, so a bot scheduled meanwhile is
+    seen by the ZCARD check and put back.
+    """
+    await redis_conn.srem(redis_settings.TG_SCHEDULE_INDEX_KEY, *bot_ids)
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        for bot_id in bot_ids:
+            pipe.zcard(schedule_key(bot_id))
+        counts = await pipe.execute()
+    if readd := [b for b, count in zip(bot_ids, counts, strict=True) if count]:
+        await redis_conn.sadd(redis_settings.TG_SCHEDULE_INDEX_KEY, *readd)
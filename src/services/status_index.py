@@ -0,0 +1,80 @@
+import time
+from typing import Optional
+
+from redis import RedisError
+from redis import asyncio as aioredis
+
+from configs.config import worker_settings
+from configs.logger import logger
+from schemas.message import DeliveryRecord
+from utils.keys import status_key
+from utils.redis import redis_conn
+
+
+class StatusIndex:
+    """
+    Outcome of every message sent with an external_id, in a Redis hash
+    per bot. Hashes are rotated every `ttl` seconds and expire after the
+    next rotation, so records live between one and two `ttl` without
+    per-field expiry. Lookups read the current and previous hash in one
+    round trip, the newest record wins.
+    """
+
+    def __init__(
+        self,
+        redis_conn: aioredis.Redis = redis_conn,
+        ttl: int = worker_settings.STATUS_TTL_SECONDS,
+        enabled: bool = worker_settings.STATUS_INDEX_ENABLED,
+    ) -> None:
+        self.redis_conn = redis_conn
+        self.ttl = ttl
+        self.enabled = enabled
+
+    def bucket(self) -> int:
+        return int(time.time() // self.ttl)
+
+    async def record(
+        self, bot_id: int | str, external_id: int, record: DeliveryRecord
+    ) -> None:
+        if not self.enabled:
+            return
+        key = status_key(bot_id, self.bucket())
+        try:
+            async with self.redis_conn.pipeline(transaction=False) as pipe:
+                pipe.hset(key, external_id, record.model_dump_json())
+                pipe.expire(key, self.ttl * 2)
+                await pipe.execute()
+        except RedisError as ex:
+            # The message is out already, failing it would send it again
+            logger.error("Failed to record status of %s: %s", external_id, ex)
+
+    async def get_many(
+        self, bot_id: int | str, external_ids: list[int]
+    ) -> dict[int, Optional[DeliveryRecord]]:
+        if not external_ids:
+            return {}
+        bucket = self.bucket()
+        try:
+            async with self.redis_conn.pipeline(transaction=False) as pipe:
+                pipe.hmget(status_key(bot_id, bucket), external_ids)
+                pipe.hmget(status_key(bot_id, bucket - 1), external_ids)
+                current, previous = await pipe.execute()
+        except RedisError as ex:
+            logger.error("Failed to read statuses of bot %s: %s", bot_id, ex)
+            raise
+        return {
+            external_id: DeliveryRecord.model_validate_json(stored)
+            if (stored := new or old)
+            else None
+            for external_id, new, old in zip(
+                external_ids, current, previous, strict=True
+            )
+        }
+
+    async def get(
+        self, bot_id: int | str, external_id: int
+    ) -> Optional[DeliveryRecord]:
+        return (await self.get_many(bot_id, [external_id]))[external_id]
+
+
+status_index = StatusIndex()
@@ -1,17 +1,53 @@
 import asyncio
-from typing import Optional
+from typing import Iterator, Optional
 
 from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramMigrateToChat,
     TelegramRetryAfter,
     TelegramForbiddenError,
     TelegramAPIError,
 )
 from aiogram.enums import ParseMode
+from aiogram.types import InputFile
 
 from configs.logger import logger
 from configs.config import telegram_settings
+from constants.message import MediaType
 from schemas.message import ReplyMarkup
+from services.chat_cache import chat_cache
+from services.circuit_breaker import record_outcome
+from services.metrics import RETRIES, api_timer, bot_label, observe_result
+from utils.text import split_html
+
+MESSAGE_NOT_MODIFIED = "message is not modified"
+FILE_ID_REJECTED = "file identifier"
+
+
+def record_result(bot: Bot, operation: str, error: Exception | None) -> None:
+    observe_result(bot, operation, error)
+    record_outcome(bot, error)
+
+
+def create_bot(token: str) -> Bot:
+    """
+    Creates a Bot, pointed at TELEGRAM_API_URL when it is configured
+    (local Bot API server or the fake server from `tools`).
+    """
+    session = None
+    if telegram_settings.TELEGRAM_API_URL:
+        session = AiohttpSession(
+            api=TelegramAPIServer.from_base(telegram_settings.TELEGRAM_API_URL)
+        )
+    return Bot(
+        token=token,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
 
 
 async def send_message(
@@ -31,10 +67,11 @@ async def send_message(
             reply_markup=reply_markup,
             reply_to_message_id=reply_to_message_id,
         )
-        msg = f"Sent message id: {msg_id} to user_id:{chat_id} text: {text}"
-        logger.info(msg)
+        logger.info("Sent message id: %s to user_id:%s", msg_id, chat_id)
+        logger.debug("Sent message id: %s text: %s", msg_id, text)
     except TelegramRetryAfter as ex:
         logger.debug(ex)
+        RETRIES.labels(bot_label(bot), "send_msg").inc()
         await asyncio.sleep(ex.retry_after)
         try:
             chat_id, msg_id = await _send_message(
@@ -45,21 +82,34 @@ async def send_message(
                 reply_markup=reply_markup,
                 reply_to_message_id=reply_to_message_id,
             )
-            msg = f"Sent message id: {msg_id} to user_id:{chat_id}"
-            logger.info(msg)
+            logger.info("Sent message id: %s to user_id:%s", msg_id, chat_id)
         except TelegramRetryAfter as ex:
             logger.exception(ex)
+            record_result(bot, "send_msg", ex)
             await asyncio.sleep(ex.retry_after)
+            return chat_id, 0
+    except TelegramMigrateToChat as ex:
+        # Later sends go to the supergroup directly, see `chat_cache`
+        await chat_cache.migrate(
+            bot_label(bot), chat_id, ex.migrate_to_chat_id
+        )
+        return await send_message(
+            bot=bot,
+            chat_id=ex.migrate_to_chat_id,
+            text=text,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup,
+            reply_to_message_id=reply_to_message_id,
+        )
     except TelegramForbiddenError as ex:
-        logger.exception(ex)
-        msg = f"Failed to sent message to user_id:{chat_id} text: {text}"
-        logger.exception(msg)
+        record_result(bot, "send_msg", ex)
+        logger.exception("Failed to sent message to user_id:%s", chat_id)
         return chat_id, 0
     except TelegramAPIError as ex:
-        logger.exception(ex)
-        msg = f"Failed to sent message to user_id:{chat_id} text: {text}"
-        logger.exception(msg)
+        record_result(bot, "send_msg", ex)
+        logger.exception("Failed to sent message to user_id:%s", chat_id)
         return chat_id, 0
+    record_result(bot, "send_msg", None)
     return chat_id, msg_id
 
 
@@ -71,74 +121,179 @@ async def _send_message(
     reply_markup: Optional[ReplyMarkup] = None,
     reply_to_message_id: Optional[str | int] = None,
 ) -> tuple[int, int]:
-    msg = await bot.send_message(
-        chat_id=chat_id,
-        text=text,
-        parse_mode=parse_mode,
-        reply_markup=reply_markup.model_dump() if reply_markup else None,
-        reply_to_message_id=reply_to_message_id,
-    )
+    with api_timer(bot, "send_message"):
+        msg = await bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup.model_dump() if reply_markup else None,
+            reply_to_message_id=reply_to_message_id,
+        )
+    await chat_cache.observe(bot_label(bot), chat_id, msg.chat)
     return chat_id, msg.message_id
 
 
-def split_message(msg: str) -> list[str]:
+async def send_media(
+    bot: Bot,
+    chat_id: int,
+    media_type: MediaType,
+    media: str | InputFile,
+    caption: Optional[str] = None,
+    parse_mode: Optional[ParseMode] = ParseMode.HTML,
+    reply_markup: Optional[ReplyMarkup] = None,
+    reply_to_message_id: Optional[str | int] = None,
+) -> tuple[int, int, Optional[str]]:
     """
-    Splits the text into parts considering Telegram limits.
+    Sends a photo, document or video given as a file_id or an InputFile.
+    Returns the chat id, message id (0 on failure) and file_id.
+    Raises TelegramBadRequest if a file_id is rejected, so the caller
+    can upload the file again.
     """
-    parts = []
-    while msg:
-        if len(msg) <= telegram_settings.TELEGRAM_MSG_LIMIT:
-            parts.append(msg)
-            break
-
-        part = msg[: telegram_settings.TELEGRAM_MSG_LIMIT]
-        first_ln = part.rfind("\n")
-
-        if first_ln != -1:
-            new_part = part[:first_ln]
-            parts.append(new_part)
-            msg = msg[first_ln + 1 :]
-        else:
-            first_space = part.rfind(" ")
+    try:
+        return await _send_media(
+            bot=bot,
+            chat_id=chat_id,
+            media_type=media_type,
+            media=media,
+            caption=caption,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup,
+            reply_to_message_id=reply_to_message_id,
+        )
+    except TelegramRetryAfter as ex:
+        logger.debug(ex)
+        RETRIES.labels(bot_label(bot), "send_media").inc()
+        await asyncio.sleep(ex.retry_after)
+        try:
+            return await _send_media(
+                bot=bot,
+                chat_id=chat_id,
+                media_type=media_type,
+                media=media,
+                caption=caption,
+                parse_mode=parse_mode,
+                reply_markup=reply_markup,
+                reply_to_message_id=reply_to_message_id,
+            )
+        except TelegramRetryAfter as ex:
+            logger.exception(ex)
+            record_result(bot, "send_media", ex)
+            await asyncio.sleep(ex.retry_after)
+            return chat_id, 0, None
+    except TelegramMigrateToChat as ex:
+        await chat_cache.migrate(
+            bot_label(bot), chat_id, ex.migrate_to_chat_id
+        )
+        return await send_media(
+            bot=bot,
+            chat_id=ex.migrate_to_chat_id,
+            media_type=media_type,
+            media=media,
+            caption=caption,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup,
+            reply_to_message_id=reply_to_message_id,
+        )
+    except TelegramBadRequest as ex:
+        record_result(bot, "send_media", ex)
+        if isinstance(media, str) and FILE_ID_REJECTED in ex.message:
+            raise
+        logger.exception("Failed to sent media to user_id:%s", chat_id)
+        return chat_id, 0, None
+    except TelegramAPIError as ex:
+        record_result(bot, "send_media", ex)
+        logger.exception("Failed to sent media to user_id:%s", chat_id)
+        return chat_id, 0, None
 
-            if first_space != -1:
-                new_part = part[:first_space]
-                parts.append(new_part)
-                msg = msg[first_space + 1 :]
-            else:
-                parts.append(part)
-                msg = msg[telegram_settings.TELEGRAM_MSG_LIMIT :]
 
-    return parts
+async def _send_media(
+    bot: Bot,
+    chat_id: int,
+    media_type: MediaType,
+    media: str | InputFile,
+    caption: Optional[str] = None,
+    parse_mode: Optional[ParseMode] = ParseMode.HTML,
+    reply_markup: Optional[ReplyMarkup] = None,
+    reply_to_message_id: Optional[str | int] = None,
+) -> tuple[int, int, Optional[str]]:
+    method = {
+        MediaType.photo: bot.send_photo,
+        MediaType.document: bot.send_document,
+        MediaType.video: bot.send_video,
+    }[media_type]
+    with api_timer(bot, f"send_{media_type}"):
+        msg = await method(
+            chat_id,
+            media,
+            caption=caption,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup.model_dump() if reply_markup else None,
+            reply_to_message_id=reply_to_message_id,
+        )
+    if media_type == MediaType.photo:
+        # Largest size goes last
+        file_id = msg.photo[-1].file_id if msg.photo else None
+    else:
+        attachment = getattr(msg, media_type.value)
+        file_id = attachment.file_id if attachment else None
+    await chat_cache.observe(bot_label(bot), chat_id, msg.chat)
+    logger.info(
+        "Sent %s message id: %s to user_id:%s",
+        media_type,
+        msg.message_id,
+        chat_id,
+    )
+    record_result(bot, "send_media", None)
+    return chat_id, msg.message_id, file_id
+
+
+def split_message(msg: str) -> Iterator[str]:
+    """
+    Lazily splits the text into parts considering Telegram limits.
+    """
+    return split_html(msg, telegram_settings.TELEGRAM_MSG_LIMIT)
 
 
 async def delete_message(
     bot: Bot, chat_id: int, message_id: int | str
 ) -> bool:
     try:
-        await bot.delete_message(chat_id=chat_id, message_id=message_id)
-        msg = f"Deleted message id: {message_id} from chat_id:{chat_id}"
-        logger.info(msg)
+        with api_timer(bot, "delete_message"):
+            await bot.delete_message(chat_id=chat_id, message_id=message_id)
+        logger.info(
+            "Deleted message id: %s from chat_id:%s", message_id, chat_id
+        )
+        record_result(bot, "del_msg", None)
         return True
     except TelegramRetryAfter as ex:
         logger.debug(ex)
+        RETRIES.labels(bot_label(bot), "del_msg").inc()
         await asyncio.sleep(ex.retry_after)
         try:
-            await bot.delete_message(chat_id=chat_id, message_id=message_id)
-            msg = f"Deleted message id: {message_id} from chat_id:{chat_id}"
-            logger.info(msg)
+            with api_timer(bot, "delete_message"):
+                await bot.delete_message(
+                    chat_id=chat_id, message_id=message_id
+                )
+            logger.info(
+                "Deleted message id: %s from chat_id:%s", message_id, chat_id
+            )
+            record_result(bot, "del_msg", None)
+            return True
         except TelegramRetryAfter as ex:
             logger.exception(ex)
+            record_result(bot, "del_msg", ex)
             await asyncio.sleep(ex.retry_after)
     except TelegramForbiddenError as ex:
-        logger.exception(ex)
-        msg = f"Failed to delete message:{message_id} from chat_id:{chat_id}"
-        logger.exception(msg)
+        record_result(bot, "del_msg", ex)
+        logger.exception(
+            "Failed to delete message:%s from chat_id:%s", message_id, chat_id
+        )
         return False
     except TelegramAPIError as ex:
-        logger.exception(ex)
-        msg = f"Failed to delete message:{message_id} from chat_id:{chat_id}"
-        logger.exception(msg)
+        record_result(bot, "del_msg", ex)
+        logger.exception(
+            "Failed to delete message:%s from chat_id:%s", message_id, chat_id
+        )
         return False
     return False
 
@@ -161,53 +316,81 @@ async def edit_message(
         ):
             markup = reply_markup.model_dump()
         if text:
-            if len(text) > telegram_settings.TELEGRAM_MSG_LIMIT:
-                text = text[:telegram_settings.TELEGRAM_MSG_LIMIT]
-            res = await bot.edit_message_text(
-                text=text,
-                chat_id=chat_id,
-                message_id=message_id,
-                reply_markup=markup,
-                parse_mode=parse_mode,
-            )
-        else:
-            res = await bot.edit_message_reply_markup(
-                chat_id=chat_id,
-                message_id=message_id,
-                reply_markup=markup,
-            )
-
-        msg = f"Edited message id: {message_id} from chat_id:{chat_id}"
-        logger.info(msg)
-    except TelegramRetryAfter as ex:
-        logger.debug(ex)
-        await asyncio.sleep(ex.retry_after)
-        try:
-            if text:
+            # A message cannot be edited into several, keep the first part
+            text = next(split_message(text), text)
+            with api_timer(bot, "edit_message_text"):
                 res = await bot.edit_message_text(
                     text=text,
                     chat_id=chat_id,
                     message_id=message_id,
                     reply_markup=markup,
+                    parse_mode=parse_mode,
                 )
-            else:
+        else:
+            with api_timer(bot, "edit_message_reply_markup"):
                 res = await bot.edit_message_reply_markup(
-                    chat_id=chat_id, message_id=message_id, reply_markup=markup
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    reply_markup=markup,
                 )
 
-            msg = f"Edited message id: {message_id} from chat_id:{chat_id}"
-            logger.info(msg)
+        logger.info(
+            "Edited message id: %s from chat_id:%s", message_id, chat_id
+        )
+    except TelegramRetryAfter as ex:
+        logger.debug(ex)
+        RETRIES.labels(bot_label(bot), "edit_msg").inc()
+        await asyncio.sleep(ex.retry_after)
+        try:
+            if text:
+                with api_timer(bot, "edit_message_text"):
+                    res = await bot.edit_message_text(
+                        text=text,
+                        chat_id=chat_id,
+                        message_id=message_id,
+                        reply_markup=markup,
+                    )
+            else:
+                with api_timer(bot, "edit_message_reply_markup"):
+                    res = await bot.edit_message_reply_markup(
+                        chat_id=chat_id,
+                        message_id=message_id,
+                        reply_markup=markup,
+                    )
+
+            logger.info(
+                "Edited message id: %s from chat_id:%s", message_id, chat_id
+            )
         except TelegramRetryAfter as ex:
             logger.exception(ex)
+            record_result(bot, "edit_msg", ex)
             return False
     except TelegramForbiddenError as ex:
-        logger.exception(ex)
-        msg = f"Failed to edit message: {message_id} from chat_id:{chat_id}"
-        logger.exception(msg)
+        record_result(bot, "edit_msg", ex)
+        logger.exception(
+            "Failed to edit message: %s from chat_id:%s", message_id, chat_id
+        )
+        return False
+    except TelegramBadRequest as ex:
+        if MESSAGE_NOT_MODIFIED in ex.message:
+            # Content is already what was requested
+            logger.info(
+                "Message id: %s from chat_id:%s is not modified",
+                message_id,
+                chat_id,
+            )
+            record_result(bot, "edit_msg", None)
+            return True
+        record_result(bot, "edit_msg", ex)
+        logger.exception(
+            "Failed to edit message: %s from chat_id:%s", message_id, chat_id
+        )
         return False
     except TelegramAPIError as ex:
-        logger.exception(ex)
-        msg = f"Failed to edit message: {message_id} from chat_id:{chat_id}"
-        logger.exception(msg)
+        record_result(bot, "edit_msg", ex)
+        logger.exception(
+            "Failed to edit message: %s from chat_id:%s", message_id, chat_id
+        )
         return False
+    record_result(bot, "edit_msg", None)
     return bool(res)
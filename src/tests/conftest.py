@@ -0,0 +1,6 @@
+import os
+
+# Settings are read from the environment on first import
+os.environ.setdefault("REDIS_HOST", "localhost")
+os.environ.setdefault("REDIS_PORT", "6379")
+os.environ.setdefault("LOG_ASYNC", "false")
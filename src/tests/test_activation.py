@@ -0,0 +1,18 @@
+import pytest
+
+from workers.activation import missing_keyspace_events
+
+
+@pytest.mark.parametrize(
+    ("current", "missing"),
+    [
+        ("", "Kt"),
+        ("Ex", "Kt"),
+        ("AE", "K"),
+        ("KA", ""),
+        ("Kt", ""),
+        ("tK", ""),
+    ],
+)
+def test_missing_keyspace_events(current: str, missing: str):
+    assert missing_keyspace_events(current) == missing
@@ -0,0 +1,17 @@
+import asyncio
+
+import pytest
+
+from workers.consumers import handle_incoming_service_message
+
+
+@pytest.mark.parametrize(
+    "entry",
+    [
+        # Parsed as a replay payload and a profile payload respectively
+        {"type": "profile", "data": '{"bot_id": 1}'},
+        {"type": "replay_dlq", "data": '{"duration_seconds": 1}'},
+    ],
+)
+def test_control_entry_of_wrong_shape_is_dropped(entry: dict):
+    asyncio.run(handle_incoming_service_message(entry))
@@ -0,0 +1,55 @@
+import io
+import json
+import logging
+
+import pytest
+
+from configs.config import log_settings
+from configs.logger import SamplingFilter, create_handler
+
+
+def log_once(stream: io.StringIO, *args: object) -> None:
+    handler, listener = create_handler(stream)
+    log = logging.getLogger("TG_SENDER.test")
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    log.addHandler(handler)
+    try:
+        log.info(*args)
+    finally:
+        log.removeHandler(handler)
+        if listener is not None:
+            listener.stop()
+
+
+@pytest.mark.parametrize("is_async", [True, False])
+def test_plain_line_is_formatted_once(
+    monkeypatch: pytest.MonkeyPatch, is_async: bool
+):
+    monkeypatch.setattr(log_settings, "LOG_ASYNC", is_async)
+    monkeypatch.setattr(log_settings, "LOG_FORMAT", "plain")
+    stream = io.StringIO()
+    log_once(stream, "Sent message %s", 5)
+    assert stream.getvalue() == "[INFO][TG_SENDER.test]: Sent message 5\n"
+
+
+def test_json_event_keeps_template_in_async_mode(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(log_settings, "LOG_ASYNC", True)
+    monkeypatch.setattr(log_settings, "LOG_FORMAT", "json")
+    stream = io.StringIO()
+    log_once(stream, "Sent message %s", 5)
+    payload = json.loads(stream.getvalue())
+    assert payload["event"] == "Sent message %s"
+    assert payload["message"] == "Sent message 5"
+
+
+def test_sampling_filter_is_bounded():
+    sampler = SamplingFilter(max_per_interval=5, interval=60, max_events=10)
+    for idx in range(100):
+        record = logging.LogRecord(
+            "TG_SENDER", logging.INFO, __file__, 0, f"event {idx}", (), None
+        )
+        assert sampler.filter(record)
+    assert len(sampler.events) == 10
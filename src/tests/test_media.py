@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from aiohttp import ClientError
+
+from schemas.message import TaskMessage
+from services import media
+
+
+class RedisStub:
+    async def hget(self, key: str, field: str) -> None:
+        return None
+
+    async def hset(self, key: str, field: str, value: str) -> None:
+        pass
+
+    async def hdel(self, key: str, field: str) -> None:
+        pass
+
+
+def test_late_sender_waits_for_the_retried_upload(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    cache = media.FileIdCache(redis_conn=RedisStub())
+    monkeypatch.setattr(media, "file_id_cache", cache)
+    uploads = []
+    active = 0
+    max_active = 0
+    second_upload = asyncio.Event()
+
+    async def send(
+        bot: None, data: TaskMessage, media: object, caption: None
+    ) -> tuple[int, int, str | None]:
+        nonlocal active, max_active
+        if isinstance(media, str):
+            return data.chat_id, 1, None
+        uploads.append(media)
+        if len(uploads) == 2:
+            second_upload.set()
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        if len(uploads) == 1:
+            msg = "download failed"
+            raise ClientError(msg)
+        return data.chat_id, 2, "file-id"
+
+    monkeypatch.setattr(media, "_send", send)
+    data = TaskMessage(
+        bot_id=1, chat_id=2, media_type="photo", media_url="https://x/y.png"
+    )
+
+    async def run() -> list[int]:
+        first = asyncio.create_task(media.send_cached_media(None, data))
+        second = asyncio.create_task(media.send_cached_media(None, data))
+        # The third sender arrives after the first upload has failed
+        await second_upload.wait()
+        third = asyncio.create_task(media.send_cached_media(None, data))
+        return await asyncio.gather(first, second, third)
+
+    assert asyncio.run(run()) == [0, 2, 1]
+    assert len(uploads) == 2
+    assert max_active == 1
+    assert not cache.uploads
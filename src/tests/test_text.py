@@ -0,0 +1,18 @@
+from utils.text import split_html, visible_len
+
+
+def test_entity_after_break_at_part_start():
+    text = "\n" + "a" * 4095 + "&#128512;" + " tail"
+    parts = list(split_html(text, 4096))
+    assert parts == ["a" * 4095, "&#128512; tail"]
+
+
+def test_entities_and_surrogates_with_small_limit():
+    parts = list(split_html("\n &#128512; 😀😀", 2))
+    assert parts == ["&#128512;", "😀", "😀"]
+
+
+def test_parts_stay_within_limit():
+    text = ("<b>word 😀 &amp; " * 300) + "</b>"
+    for part in split_html(text, 100):
+        assert visible_len(part) <= 100
@@ -0,0 +1,77 @@
+import asyncio
+from datetime import UTC, datetime
+
+import pytest
+
+from constants.message import MessageType
+from schemas.message import Message, TaskMessage
+from workers.producers import send_to_queueu
+from workers.service import validate_task_message
+
+
+def is_valid(data: dict) -> bool:
+    msg = Message.model_validate(
+        {"type": "send_msg", "data": {"bot_id": 1, "chat_id": 2, **data}}
+    )
+    return asyncio.run(validate_task_message(msg))
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"text": "hi"},
+        {"media_type": "photo", "media_url": "https://x/y.png"},
+        {
+            "text": "caption",
+            "media_type": "photo",
+            "media_url": "https://x/y.png",
+        },
+    ],
+)
+def test_send_with_content_is_valid(data: dict):
+    assert is_valid(data)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {},
+        {"text": ""},
+        {"media_url": "https://x/y.png"},
+        {"text": "hi", "media_type": "photo"},
+    ],
+)
+def test_send_without_content_is_rejected(data: dict):
+    assert not is_valid(data)
+
+
+class StreamStub:
+    def __init__(self) -> None:
+        self.entries: list[dict] = []
+
+    async def xadd(self, name: str, fields: dict) -> None:
+        self.entries.append(fields)
+
+
+def test_scheduled_send_round_trips_through_the_stream():
+    send_at = datetime(2030, 1, 2, 3, 4, 5, tzinfo=UTC)
+    stream = StreamStub()
+    asyncio.run(
+        send_to_queueu(
+            msg=Message(
+                type=MessageType.send_msg,
+                data=TaskMessage(
+                    bot_id=1, chat_id=2, text="hi", send_at=send_at
+                ),
+            ),
+            stream_name="stream",
+            w_raise=True,
+            redis_conn=stream,
+        )
+    )
+    (fields,) = stream.entries
+    msg = Message.model_validate(
+        {"type": fields["type"], "data": fields["data"]}
+    )
+    assert msg.data.send_at == send_at
+    assert asyncio.run(validate_task_message(msg))
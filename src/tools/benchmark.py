@@ -0,0 +1,290 @@
+"""
+End-to-end throughput benchmark.
+
+Starts Redis (unless --redis-url is given), the fake Telegram server and
+a worker process, registers N synthetic bots, enqueues messages and
+reports msgs/s, enqueue-to-send latency and Redis ops per message.
+
+Usage (from the repository root):
+    PYTHONPATH=src python -m tools.benchmark --bots 20 --messages 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from redis import asyncio as aioredis
+
+from tools.fake_telegram import (
+    FakeTelegram,
+    add_fake_arguments,
+    config_from_args,
+    start_fake_server,
+)
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+BENCH_PREFIX = "bench "
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(round(pct / 100 * (len(ordered) - 1)), len(ordered) - 1)
+    return ordered[idx]
+
+
+async def start_redis(port: int) -> subprocess.Popen:
+    if not shutil.which("redis-server"):
+        msg = "redis-server not found, pass --redis-url instead"
+        raise RuntimeError(msg)
+    process = subprocess.Popen(  # noqa: ASYNC220, S603
+        [  # noqa: S607
+            "redis-server",
+            "--port",
+            str(port),
+            "--save",
+            "",
+            "--appendonly",
+            "no",
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    conn = aioredis.Redis(port=port)
+    for _ in range(50):
+        try:
+            await conn.ping()
+            break
+        except Exception:
+            await asyncio.sleep(0.1)
+    await conn.aclose()
+    return process
+
+
+def start_worker(
+    redis_host: str, redis_port: int, api_url: str
+) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(SRC_DIR),
+        "REDIS_HOST": redis_host,
+        "REDIS_PORT": str(redis_port),
+        "TELEGRAM_API_URL": api_url,
+        "LAZY_BOT_ACTIVATION": "false",
+        "SKIP_GET_ME_IF_CACHED": "false",
+        "METRICS_ENABLED": "false",
+        "LOG_LEVEL": "WARNING",
+    }
+    return subprocess.Popen(  # noqa: S603
+        [sys.executable, str(SRC_DIR / "main.py")], env=env
+    )
+
+
+async def register_bots(redis_conn: aioredis.Redis, bots: int) -> list[int]:
+    from schemas.bot import BotRecord  # noqa: PLC0415
+    from services.registry import BotRegistry  # noqa: PLC0415
+
+    registry = BotRegistry(redis_conn)
+    bot_ids = list(range(1, bots + 1))
+    for bot_id in bot_ids:
+        await registry.add(
+            BotRecord(bot_id=bot_id, token=f"{1000000 + bot_id}:bench-token")
+        )
+    return bot_ids
+
+
+async def enqueue(
+    redis_conn: aioredis.Redis,
+    bot_ids: list[int],
+    messages: int,
+    chats: int,
+    group_ratio: float,
+) -> dict[int, float]:
+    """
+    Enqueues messages round robin across bots, returns enqueue times.
+    """
+    from utils.keys import primary_stream  # noqa: PLC0415
+
+    group_chats = int(chats * group_ratio)
+    enqueued_at = {}
+    seq = 0
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        for n in range(messages):
+            for bot_id in bot_ids:
+                chat_idx = n % chats
+                chat_id = (
+                    -(1000 + chat_idx)
+                    if chat_idx < group_chats
+                    else 1000 + chat_idx
+                )
+                data = {
+                    "bot_id": bot_id,
+                    "chat_id": chat_id,
+                    "text": f"{BENCH_PREFIX}{seq}",
+                }
+                pipe.xadd(
+                    primary_stream(bot_id),
+                    {"type": "send_msg", "data": json.dumps(data)},
+                )
+                enqueued_at[seq] = time.time()
+                seq += 1
+        await pipe.execute()
+    return enqueued_at
+
+
+async def wait_for_getme(
+    fake: FakeTelegram, bots: int, wait_seconds: float
+) -> None:
+    deadline = time.monotonic() + wait_seconds
+    while fake.counters["calls:getme"] < bots:
+        if time.monotonic() > deadline:
+            msg = f"Only {fake.counters['calls:getme']}/{bots} bots started"
+            raise TimeoutError(msg)
+        await asyncio.sleep(0.2)
+
+
+async def wait_for_processed(
+    fake: FakeTelegram, total: int, idle_timeout: float
+) -> None:
+    last_done, last_progress = -1, time.monotonic()
+    while True:
+        done = (
+            len(fake.sent)
+            + fake.counters["error:403"]
+            + fake.counters["error:400"]
+        )
+        if done >= total:
+            return
+        if done != last_done:
+            last_done, last_progress = done, time.monotonic()
+        elif time.monotonic() - last_progress > idle_timeout:
+            return
+        await asyncio.sleep(0.2)
+
+
+async def commands_processed(redis_conn: aioredis.Redis) -> int:
+    info = await redis_conn.info("stats")
+    return int(info["total_commands_processed"])
+
+
+def report(
+    fake: FakeTelegram,
+    enqueued_at: dict[int, float],
+    started: float,
+    redis_ops: int,
+) -> dict:
+    latencies = []
+    for record in fake.sent:
+        if record.text and record.text.startswith(BENCH_PREFIX):
+            seq = int(record.text[len(BENCH_PREFIX) :])
+            latencies.append(record.received_at - enqueued_at[seq])
+    finished = max((r.received_at for r in fake.sent), default=started)
+    total = len(enqueued_at)
+    return {
+        "enqueued": total,
+        "sent": len(fake.sent),
+        "duration_s": round(finished - started, 3),
+        "msgs_per_s": round(len(fake.sent) / max(finished - started, 1e-9), 2),
+        "latency_p50_s": round(percentile(latencies, 50), 4),
+        "latency_p99_s": round(percentile(latencies, 99), 4),
+        "redis_ops_per_msg": round(redis_ops / max(total, 1), 2),
+        "fake_counters": dict(fake.counters),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    redis_process: Optional[subprocess.Popen] = None
+    if args.redis_url:
+        redis_conn = aioredis.Redis.from_url(args.redis_url)
+    else:
+        redis_port = free_port()
+        redis_process = await start_redis(redis_port)
+        redis_conn = aioredis.Redis(port=redis_port)
+    kwargs = redis_conn.connection_pool.connection_kwargs
+    # Settings are read from the environment on first import
+    os.environ["REDIS_HOST"] = kwargs.get("host", "127.0.0.1")
+    os.environ["REDIS_PORT"] = str(kwargs.get("port", 6379))
+
+    api_port = free_port()
+    fake, runner = await start_fake_server(
+        config_from_args(args), port=api_port
+    )
+    worker = None
+    try:
+        if args.flushdb or redis_process:
+            await redis_conn.flushdb()
+        bot_ids = await register_bots(redis_conn, args.bots)
+        worker = start_worker(
+            redis_host=os.environ["REDIS_HOST"],
+            redis_port=int(os.environ["REDIS_PORT"]),
+            api_url=f"http://127.0.0.1:{api_port}",
+        )
+        await wait_for_getme(fake, args.bots, wait_seconds=args.start_timeout)
+
+        ops_before = await commands_processed(redis_conn)
+        started = time.time()
+        enqueued_at = await enqueue(
+            redis_conn,
+            bot_ids=bot_ids,
+            messages=args.messages,
+            chats=args.chats,
+            group_ratio=args.group_ratio,
+        )
+        await wait_for_processed(
+            fake, total=len(enqueued_at), idle_timeout=args.idle_timeout
+        )
+        # Exclude the benchmark's own XADDs and the INFO call
+        redis_ops = (
+            await commands_processed(redis_conn)
+            - ops_before
+            - len(enqueued_at)
+            - 1
+        )
+        return report(fake, enqueued_at, started, redis_ops)
+    finally:
+        if worker:
+            worker.terminate()
+            worker.wait(timeout=30)
+        await runner.cleanup()
+        await redis_conn.aclose()
+        if redis_process:
+            redis_process.terminate()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="TG Sender benchmark")
+    parser.add_argument("--bots", type=int, default=10)
+    parser.add_argument(
+        "--messages", type=int, default=100, help="Messages per bot"
+    )
+    parser.add_argument("--chats", type=int, default=100, help="Per bot")
+    parser.add_argument("--group-ratio", type=float, default=0.0)
+    parser.add_argument("--redis-url", default=None)
+    parser.add_argument(
+        "--flushdb",
+        action="store_true",
+        help="Flush the database given by --redis-url before the run",
+    )
+    parser.add_argument("--start-timeout", type=float, default=60.0)
+    parser.add_argument("--idle-timeout", type=float, default=30.0)
+    add_fake_arguments(parser)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    result = asyncio.run(run(parse_args()))
+    sys.stdout.write(json.dumps(result, indent=2) + "\n")
@@ -0,0 +1,109 @@
+"""
+Local receiver for outcome callbacks.
+
+Register a bot with `callback_url=http://127.0.0.1:8082/outcomes` and
+read what arrived from `GET /stats`. Failures can be injected to
+exercise the worker's retries.
+
+Usage:
+    python -m tools.callback_stub --port 8082 --latency-ms 20 \\
+        --error-rate 0.1
+"""
+
+import argparse
+import asyncio
+import random
+from collections import defaultdict
+from dataclasses import dataclass
+
+from aiohttp import web
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 0.0
+    error_rate: float = 0.0  # Share of requests answered with error_status
+    error_status: int = 503
+
+
+class CallbackStub:
+    def __init__(self, config: StubConfig) -> None:
+        self.config = config
+        self.counters: dict[str, int] = defaultdict(int)
+        self.batch_ids: set[str] = set()
+        self.outcomes: list[dict] = []
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=50 * 1024**2)
+        app.router.add_post("/outcomes", self.handle)
+        app.router.add_get("/stats", self.stats)
+        app.router.add_post("/reset", self.reset)
+        return app
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {"counters": self.counters, "outcomes": len(self.outcomes)}
+        )
+
+    async def reset(self, request: web.Request) -> web.Response:
+        self.counters.clear()
+        self.batch_ids.clear()
+        self.outcomes.clear()
+        return web.json_response({"ok": True})
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.counters["requests"] += 1
+        if self.config.latency_ms:
+            await asyncio.sleep(self.config.latency_ms / 1000)
+        if random.random() < self.config.error_rate:  # noqa: S311
+            self.counters[f"error:{self.config.error_status}"] += 1
+            return web.json_response(
+                {"ok": False}, status=self.config.error_status
+            )
+        payload = await request.json()
+        # Retried batches are counted once
+        if payload["batch_id"] in self.batch_ids:
+            self.counters["duplicates"] += 1
+            return web.json_response({"ok": True})
+        self.batch_ids.add(payload["batch_id"])
+        self.counters["batches"] += 1
+        for outcome in payload["outcomes"]:
+            self.counters[f"status:{outcome['status']}"] += 1
+        self.outcomes.extend(payload["outcomes"])
+        return web.json_response({"ok": True})
+
+
+async def start_callback_stub(
+    config: StubConfig, host: str = "127.0.0.1", port: int = 8082
+) -> tuple[CallbackStub, web.AppRunner]:
+    stub = CallbackStub(config)
+    runner = web.AppRunner(stub.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return stub, runner
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Outcome callback stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    web.run_app(
+        CallbackStub(
+            StubConfig(
+                latency_ms=args.latency_ms,
+                error_rate=args.error_rate,
+                error_status=args.error_status,
+            )
+        ).app(),
+        host=args.host,
+        port=args.port,
+        access_log=None,
+    )
@@ -0,0 +1,288 @@
+"""
+Local stand-in for the Telegram Bot API.
+
+Point the worker at it with `TELEGRAM_API_URL=http://127.0.0.1:8081`.
+Any token in `{bot_id}:{secret}` format is accepted.
+
+Usage:
+    python -m tools.fake_telegram --port 8081 --latency-ms 50 \\
+        --retry-after-rate 0.01 --forbidden-rate 0.001 --enforce-limits
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+from aiohttp import web
+
+PRIVATE_CHAT_INTERVAL = 1.0  # 1 message per second per private chat
+GROUP_CHAT_LIMIT = 20  # 20 messages per minute per group
+GROUP_CHAT_WINDOW = 60.0
+GLOBAL_LIMIT = 30  # 30 messages per second per bot
+GLOBAL_WINDOW = 1.0
+EDIT_INTERVAL = 3.0
+
+SEND_METHODS = {"sendmessage", "sendphoto", "senddocument", "sendvideo"}
+EDIT_METHODS = {"editmessagetext", "editmessagereplymarkup"}
+
+
+@dataclass
+class FakeConfig:
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    retry_after_rate: float = 0.0
+    retry_after_seconds: int = 1
+    forbidden_rate: float = 0.0
+    bad_request_rate: float = 0.0
+    enforce_limits: bool = False
+    revoked_tokens: set[str] = field(default_factory=set)
+
+
+@dataclass
+class SentRecord:
+    received_at: float
+    bot_id: int
+    method: str
+    chat_id: str
+    message_id: int
+    text: Optional[str]
+
+
+class FakeTelegram:
+    def __init__(self, config: FakeConfig) -> None:
+        self.config = config
+        self.sent: list[SentRecord] = []
+        self.counters: dict[str, int] = defaultdict(int)
+        self.message_ids: dict[str, int] = defaultdict(int)
+        self.history: dict[tuple, deque] = defaultdict(deque)
+        self.file_ids = 0
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=50 * 1024**2)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        app.router.add_get("/stats", self.stats)
+        app.router.add_post("/reset", self.reset)
+        return app
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {"counters": self.counters, "sent": len(self.sent)}
+        )
+
+    async def reset(self, request: web.Request) -> web.Response:
+        self.sent.clear()
+        self.counters.clear()
+        self.history.clear()
+        return web.json_response({"ok": True})
+
+    async def handle(  # noqa: PLR0911
+        self, request: web.Request
+    ) -> web.Response:
+        token = request.match_info["token"]
+        method = request.match_info["method"].lower()
+        params = dict(await request.post())
+        self.counters[f"calls:{method}"] += 1
+        await self._delay()
+
+        if token in self.config.revoked_tokens or ":" not in token:
+            return self._error(401, "Unauthorized")
+        bot_id = int(token.split(":", 1)[0])
+        if method == "getme":
+            return self._ok(
+                {
+                    "id": bot_id,
+                    "is_bot": True,
+                    "first_name": f"Fake bot {bot_id}",
+                    "username": f"fake_{bot_id}_bot",
+                }
+            )
+
+        chat_id = str(params.get("chat_id", ""))
+        if error := self._injected_error():
+            return error
+        if self.config.enforce_limits and (
+            retry_after := self._check_limits(bot_id, method, chat_id)
+        ):
+            return self._error(
+                429,
+                f"Too Many Requests: retry after {retry_after}",
+                parameters={"retry_after": retry_after},
+            )
+
+        if method in SEND_METHODS:
+            return self._ok(self._new_message(bot_id, method, params))
+        if method in EDIT_METHODS:
+            self.counters["edited"] += 1
+            return self._ok(self._message_payload(params))
+        if method == "deletemessage":
+            self.counters["deleted"] += 1
+            return self._ok(True)
+        return self._error(404, "Not Found: method not found")
+
+    def _new_message(self, bot_id: int, method: str, params: dict) -> dict:
+        chat_id = str(params["chat_id"])
+        self.message_ids[chat_id] += 1
+        message_id = self.message_ids[chat_id]
+        self.sent.append(
+            SentRecord(
+                received_at=time.time(),
+                bot_id=bot_id,
+                method=method,
+                chat_id=chat_id,
+                message_id=message_id,
+                text=params.get("text") or params.get("caption"),
+            )
+        )
+        self.counters["sent"] += 1
+        payload = self._message_payload({**params, "message_id": message_id})
+        if method != "sendmessage":
+            self.file_ids += 1
+            kind = method.removeprefix("send")
+            file_info = {
+                "file_id": f"fake-file-{self.file_ids}",
+                "file_unique_id": f"fake-unique-{self.file_ids}",
+            }
+            payload[kind] = [file_info] if kind == "photo" else file_info
+        return payload
+
+    @staticmethod
+    def _message_payload(params: dict) -> dict:
+        chat_id = str(params.get("chat_id", "0"))
+        is_group = chat_id.startswith("-")
+        payload = {
+            "message_id": int(params.get("message_id", 1)),
+            "date": int(time.time()),
+            "chat": {
+                "id": int(chat_id) if chat_id.lstrip("-").isdigit() else 0,
+                "type": "supergroup" if is_group else "private",
+            },
+        }
+        if params.get("text"):
+            payload["text"] = params["text"]
+        if params.get("reply_markup"):
+            payload["reply_markup"] = json.loads(params["reply_markup"])
+        return payload
+
+    async def _delay(self) -> None:
+        delay = self.config.latency_ms + random.uniform(  # noqa: S311
+            -self.config.latency_jitter_ms, self.config.latency_jitter_ms
+        )
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+    def _injected_error(self) -> Optional[web.Response]:
+        roll = random.random()  # noqa: S311
+        if roll < self.config.retry_after_rate:
+            return self._error(
+                429,
+                "Too Many Requests: retry after "
+                f"{self.config.retry_after_seconds}",
+                parameters={"retry_after": self.config.retry_after_seconds},
+            )
+        roll -= self.config.retry_after_rate
+        if roll < self.config.forbidden_rate:
+            return self._error(403, "Forbidden: bot was blocked by the user")
+        roll -= self.config.forbidden_rate
+        if roll < self.config.bad_request_rate:
+            return self._error(400, "Bad Request: chat not found")
+        return None
+
+    def _check_limits(
+        self, bot_id: int, method: str, chat_id: str
+    ) -> Optional[int]:
+        """
+        Sliding windows mirroring Telegram limits.
+        Returns seconds to wait if the call exceeds one of them.
+        """
+        now = time.monotonic()
+        if method in EDIT_METHODS:
+            limits = [((bot_id, "edit", chat_id), 1, EDIT_INTERVAL)]
+        elif chat_id.startswith("-"):
+            key = (bot_id, "group", chat_id)
+            limits = [(key, GROUP_CHAT_LIMIT, GROUP_CHAT_WINDOW)]
+        else:
+            limits = [((bot_id, "chat", chat_id), 1, PRIVATE_CHAT_INTERVAL)]
+        limits.append(((bot_id, "global"), GLOBAL_LIMIT, GLOBAL_WINDOW))
+        for key, limit, window in limits:
+            history = self.history[key]
+            while history and now - history[0] >= window:
+                history.popleft()
+            if len(history) >= limit:
+                self.counters[f"limited:{key[1]}"] += 1
+                return max(int(window - (now - history[0])) + 1, 1)
+        for key, _, _ in limits:
+            self.history[key].append(now)
+        return None
+
+    def _ok(self, result: object) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    def _error(
+        self, code: int, description: str, parameters: Optional[dict] = None
+    ) -> web.Response:
+        self.counters[f"error:{code}"] += 1
+        payload = {
+            "ok": False,
+            "error_code": code,
+            "description": description,
+        }
+        if parameters:
+            payload["parameters"] = parameters
+        return web.json_response(payload, status=code)
+
+
+async def start_fake_server(
+    config: FakeConfig, host: str = "127.0.0.1", port: int = 8081
+) -> tuple[FakeTelegram, web.AppRunner]:
+    fake = FakeTelegram(config)
+    runner = web.AppRunner(fake.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return fake, runner
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_fake_arguments(parser)
+    return parser.parse_args()
+
+
+def add_fake_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--retry-after-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after-seconds", type=int, default=1)
+    parser.add_argument("--forbidden-rate", type=float, default=0.0)
+    parser.add_argument("--bad-request-rate", type=float, default=0.0)
+    parser.add_argument("--enforce-limits", action="store_true")
+    parser.add_argument("--revoked-token", action="append", default=[])
+
+
+def config_from_args(args: argparse.Namespace) -> FakeConfig:
+    return FakeConfig(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        retry_after_rate=args.retry_after_rate,
+        retry_after_seconds=args.retry_after_seconds,
+        forbidden_rate=args.forbidden_rate,
+        bad_request_rate=args.bad_request_rate,
+        enforce_limits=args.enforce_limits,
+        revoked_tokens=set(args.revoked_token),
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    web.run_app(
+        FakeTelegram(config_from_args(args)).app(),
+        host=args.host,
+        port=args.port,
+        access_log=None,
+    )
@@ -0,0 +1,386 @@
+"""
+Offline rate-limit simulator.
+
+Replays a stream dump or a synthetic recipient distribution through the
+real limiters and splitter under a virtual clock and projects campaign
+drain time and per-lane latency. Nothing is sent and Redis is not used.
+
+Dump format: one JSON object per line, as read from a bot stream plus
+the lane name, e.g.
+    {"lane": "broadcast", "id": "1700000000000-0", "type": "send_msg",
+     "data": {"bot_id": 1, "chat_id": 42, "text": "Hi"}}
+`id` (or `at`, seconds) sets the arrival time, otherwise it is 0.
+
+Usage:
+    PYTHONPATH=src python -m tools.simulator --recipients 10000 \\
+        --group-ratio 0.1 --primary-rate 2 --duration 600
+    PYTHONPATH=src python -m tools.simulator --dump stream.jsonl \\
+        --global-rps 25
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import selectors
+import sys
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from tools.benchmark import percentile
+
+LANES = ("primary", "broadcast")
+
+
+class VirtualClockSelector(selectors.DefaultSelector):
+    """
+    Never blocks: instead of waiting for the next timer it advances the
+    virtual clock by the timeout the event loop asked for.
+    """
+
+    def __init__(self, advance: Callable[[float], None]) -> None:
+        super().__init__()
+        self.advance = advance
+
+    def select(self, timeout: Optional[float] = None) -> list:
+        if timeout is not None and timeout > 0:
+            self.advance(timeout)
+        return super().select(0)
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    def __init__(self) -> None:
+        self.virtual_time = 0.0
+        super().__init__(selector=VirtualClockSelector(self._advance))
+
+    def time(self) -> float:
+        return self.virtual_time
+
+    def _advance(self, seconds: float) -> None:
+        self.virtual_time += seconds
+
+
+@dataclass
+class SimMessage:
+    lane: str
+    arrival: float
+    bot_id: int
+    chat_id: int | str
+    text: str
+    completed: Optional[float] = None
+
+
+class MemoryStore:
+    """
+    In-memory replacement for the Redis commands used by the limiters
+    and the read-ahead buffer. Stream entries become readable at their
+    arrival time.
+    """
+
+    def __init__(self) -> None:
+        self.data: dict[str, tuple[object, Optional[float]]] = {}
+        self.streams: dict[str, deque[tuple[str, SimMessage]]] = defaultdict(
+            deque
+        )
+
+    def add_entry(self, stream: str, msg: SimMessage) -> None:
+        queue = self.streams[stream]
+        queue.append((f"{len(queue)}-0", msg))
+
+    def _now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    async def get(self, key: str) -> Optional[object]:
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= self._now():
+            self.data.pop(key, None)
+            return None
+        return value
+
+    async def set(
+        self, key: str, value: object, ex: Optional[int] = None
+    ) -> None:
+        self.data[key] = (value, self._now() + ex if ex else None)
+
+    async def xreadgroup(
+        self,
+        groupname: str,
+        consumername: str,
+        streams: dict[str, str],
+        count: int,
+        block: int,
+    ) -> list:
+        for attempt in range(2):
+            now = self._now()
+            result = []
+            for name in streams:
+                queue = self.streams[name]
+                entries = []
+                while (
+                    queue
+                    and queue[0][1].arrival <= now
+                    and len(entries) < count
+                ):
+                    entry_id, msg = queue.popleft()
+                    entries.append((entry_id, {"sim": msg}))
+                if entries:
+                    result.append([name, entries])
+            if result or attempt:
+                return result
+            # BLOCK returns on the next arrival or after `block` ms
+            wait = block / 1000
+            for name in streams:
+                if self.streams[name]:
+                    wait = min(wait, self.streams[name][0][1].arrival - now)
+            await asyncio.sleep(max(wait, 0))
+        return []
+
+    async def xclaim(self, message_ids: list[str], **kwargs) -> list[str]:
+        return message_ids
+
+    def register_script(self, script: str) -> Callable:
+        """
+        Lua scripts are replaced by their Python reference versions.
+        """
+        from services.rate_limiter import (  # noqa: PLC0415
+            GCRA_RESERVE_SCRIPT,
+            gcra_reserve,
+        )
+        from utils.clock import now as clock_now  # noqa: PLC0415
+
+        if script != GCRA_RESERVE_SCRIPT:
+            msg = "Script is not supported by the simulator"
+            raise NotImplementedError(msg)
+
+        async def run_gcra(keys: list[str], args: list[float]) -> str:
+            # Redis reads the server clock, here time is virtual
+            interval, tolerance = (float(arg) for arg in args)
+            now = clock_now()
+            tat = await self.get(keys[0])
+            wait, new_tat = gcra_reserve(
+                float(tat) if tat is not None else None,
+                now,
+                interval,
+                tolerance,
+            )
+            self.data[keys[0]] = (new_tat, new_tat)
+            return str(wait)
+
+        return run_gcra
+
+
+@dataclass
+class SimResult:
+    messages: list[SimMessage] = field(default_factory=list)
+    api_calls: int = 0
+
+
+def load_dump(path: str) -> list[SimMessage]:
+    from schemas.message import Message  # noqa: PLC0415
+
+    messages = []
+    first_ms = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            msg = Message.model_validate(
+                {"type": entry["type"], "data": entry["data"]}
+            )
+            if "at" in entry:
+                arrival = float(entry["at"])
+            elif "id" in entry:
+                ms = int(entry["id"].split("-", 1)[0])
+                first_ms = ms if first_ms is None else first_ms
+                arrival = (ms - first_ms) / 1000
+            else:
+                arrival = 0.0
+            messages.append(
+                SimMessage(
+                    lane=entry.get("lane", "primary"),
+                    arrival=max(arrival, 0.0),
+                    bot_id=msg.data.bot_id,
+                    chat_id=msg.data.chat_id,
+                    text=msg.data.text or "",
+                )
+            )
+    return messages
+
+
+def generate(args: argparse.Namespace) -> list[SimMessage]:
+    rnd = random.Random(args.seed)  # noqa: S311
+    text = "x" * args.text_length
+    messages = []
+    groups = int(args.recipients * args.group_ratio)
+    for bot_id in range(1, args.bots + 1):
+        for idx in range(args.recipients):
+            chat_id = -(10**6 + idx) if idx < groups else 10**6 + idx
+            messages.extend(
+                SimMessage("broadcast", 0.0, bot_id, chat_id, text)
+                for _ in range(args.messages_per_recipient)
+            )
+        if args.primary_rate > 0:
+            arrival = rnd.expovariate(args.primary_rate)
+            while arrival < args.duration:
+                chat_id = rnd.randrange(args.recipients) + 2 * 10**6
+                messages.append(
+                    SimMessage("primary", arrival, bot_id, chat_id, text)
+                )
+                arrival += rnd.expovariate(args.primary_rate)
+    return messages
+
+
+async def simulate(
+    messages: list[SimMessage], api_latency: float
+) -> SimResult:
+    from services.fair_scheduler import fair_scheduler  # noqa: PLC0415
+    from services.global_limiter import GlobalRateLimiter  # noqa: PLC0415
+    from services.rate_limiter import TelegramRateLimiter  # noqa: PLC0415
+    from services.telegram import split_message  # noqa: PLC0415
+    from workers.prefetch import Prefetcher  # noqa: PLC0415
+    from workers.service import BLOCK_TIME  # noqa: PLC0415
+
+    store = MemoryStore()
+    limiter = TelegramRateLimiter(
+        redis_conn=store, global_limiter=GlobalRateLimiter()
+    )
+    loop = asyncio.get_running_loop()
+    result = SimResult(messages=messages)
+
+    counts: dict[int, int] = defaultdict(int)
+    for msg in sorted(messages, key=lambda m: m.arrival):
+        store.add_entry(f"{msg.lane}:{msg.bot_id}", msg)
+        counts[msg.bot_id] += 1
+
+    async def process(msg: SimMessage) -> None:
+        for _ in split_message(msg.text):
+            await limiter.acquire_lock(msg.chat_id, msg.bot_id)
+            await asyncio.sleep(api_latency)
+            result.api_calls += 1
+        msg.completed = loop.time()
+
+    async def consume(bot_id: int, remaining: int) -> None:
+        # Mirrors `consume_bot`: the real read-ahead buffer (adaptive
+        # depth, one read over both lanes, primary served first) and the
+        # fair scheduler turn. The virtual loop never lags, so the
+        # scheduler does not throttle here.
+        held: dict[str, set[str]] = {}
+        prefetcher = Prefetcher(
+            read_conn=store,
+            streams=[f"{lane}:{bot_id}" for lane in LANES],
+            group_name="simulator",
+            consumer_name=str(bot_id),
+            held_entries=held,
+            label=str(bot_id),
+            block_ms=BLOCK_TIME,
+        )
+        prefetcher.start()
+        while remaining:
+            entry = await prefetcher.get(wait_seconds=BLOCK_TIME / 1000)
+            if entry is None:
+                continue
+            started = loop.time()
+            await fair_scheduler.wait_turn(bot_id)
+            stream, entry_id, data = entry
+            await process(data["sim"])
+            held[stream].discard(entry_id)
+            remaining -= 1
+            prefetcher.done(loop.time() - started)
+        await prefetcher.stop()
+
+    await asyncio.gather(
+        *(consume(bot_id, count) for bot_id, count in counts.items())
+    )
+    return result
+
+
+def summarize(result: SimResult) -> dict:
+    per_lane: dict[str, list[float]] = defaultdict(list)
+    for msg in result.messages:
+        if msg.completed is not None:
+            per_lane[msg.lane].append(msg.completed - msg.arrival)
+    completion = max(
+        (m.completed for m in result.messages if m.completed is not None),
+        default=0.0,
+    )
+    return {
+        "messages": len(result.messages),
+        "api_calls": result.api_calls,
+        "completion_time_s": round(completion, 3),
+        "msgs_per_s": round(
+            len(result.messages) / completion if completion else 0.0, 2
+        ),
+        "lanes": {
+            lane: {
+                "count": len(latencies),
+                "p50_s": round(percentile(latencies, 50), 3),
+                "p95_s": round(percentile(latencies, 95), 3),
+                "p99_s": round(percentile(latencies, 99), 3),
+                "max_s": round(max(latencies), 3),
+            }
+            for lane, latencies in per_lane.items()
+        },
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rate limit simulator")
+    parser.add_argument("--dump", help="JSON lines stream dump")
+    parser.add_argument("--bots", type=int, default=1)
+    parser.add_argument("--recipients", type=int, default=1000)
+    parser.add_argument("--group-ratio", type=float, default=0.0)
+    parser.add_argument("--messages-per-recipient", type=int, default=1)
+    parser.add_argument("--text-length", type=int, default=200)
+    parser.add_argument(
+        "--primary-rate",
+        type=float,
+        default=0.0,
+        help="Interactive messages per second per bot on the primary lane",
+    )
+    parser.add_argument("--duration", type=float, default=0.0)
+    parser.add_argument("--api-latency-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--global-rps", type=int)
+    parser.add_argument("--per-chat-delay", type=float)
+    parser.add_argument("--per-group-msg-limit", type=int)
+    parser.add_argument("--per-group-msg-window", type=float)
+    parser.add_argument("--per-group-msg-burst", type=int)
+    return parser.parse_args()
+
+
+def apply_overrides(args: argparse.Namespace) -> None:
+    """
+    Settings are read from the environment on first import.
+    """
+    os.environ.setdefault("REDIS_HOST", "localhost")
+    os.environ.setdefault("REDIS_PORT", "6379")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("LOG_ASYNC", "false")
+    overrides = {
+        "GLOBAL_RPS": args.global_rps,
+        "PER_CHAT_DELAY": args.per_chat_delay,
+        "PER_GROUP_MSG_LIMIT": args.per_group_msg_limit,
+        "PER_GROUP_MSG_WINDOW": args.per_group_msg_window,
+        "PER_GROUP_MSG_BURST": args.per_group_msg_burst,
+    }
+    for name, value in overrides.items():
+        if value is not None:
+            os.environ[name] = str(value)
+
+
+def main() -> None:
+    args = parse_args()
+    apply_overrides(args)
+    messages = load_dump(args.dump) if args.dump else generate(args)
+    with asyncio.Runner(loop_factory=VirtualClockLoop) as runner:
+        result = runner.run(
+            simulate(messages, api_latency=args.api_latency_ms / 1000)
+        )
+    sys.stdout.write(json.dumps(summarize(result), indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
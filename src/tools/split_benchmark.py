@@ -0,0 +1,70 @@
+"""
+Message splitter benchmark.
+
+Splits multi-megabyte generated texts (plain, long lines, HTML markup,
+non-BMP characters) and reports throughput and the number of parts.
+Every part is checked against the limit.
+
+Usage:
+    PYTHONPATH=src python -m tools.split_benchmark --size-mb 5
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Callable
+
+from utils.text import split_html, visible_len
+
+TELEGRAM_MSG_LIMIT = 4096
+
+SAMPLES: dict[str, Callable[[int], str]] = {
+    "plain_lines": lambda size: (
+        "Daily report line with some words\n" * (size // 34 + 1)
+    ),
+    "no_breaks": lambda size: "x" * size,
+    "html": lambda size: (
+        '<b>Order</b> <a href="https://example.com/o">#42</a> '
+        "<i>paid</i> &amp; <code>shipped</code>\n" * (size // 95 + 1)
+    ),
+    "emoji_cyrillic": lambda size: "Привет 😀 мир 👋 " * (size // 16 + 1),
+}
+
+
+def run(size: int, limit: int, repeat: int) -> dict:
+    results = {}
+    for name, make in SAMPLES.items():
+        text = make(size)[:size]
+        best = float("inf")
+        parts = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            parts = list(split_html(text, limit))
+            best = min(best, time.perf_counter() - started)
+        longest = max(map(visible_len, parts), default=0)
+        results[name] = {
+            "chars": len(text),
+            "parts": len(parts),
+            "longest_part": longest,
+            "within_limit": longest <= limit,
+            "seconds": round(best, 4),
+            "mb_per_s": round(len(text) / 1024**2 / best, 2),
+        }
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Splitter benchmark")
+    parser.add_argument("--size-mb", type=float, default=5.0)
+    parser.add_argument("--limit", type=int, default=TELEGRAM_MSG_LIMIT)
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = run(
+        size=int(args.size_mb * 1024**2), limit=args.limit, repeat=args.repeat
+    )
+    sys.stdout.write(json.dumps(result, indent=2) + "\n")
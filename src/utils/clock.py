@@ -0,0 +1,10 @@
+import asyncio
+
+
+def now() -> float:
+    """
+    Monotonic time of the running event loop.
+    Limiters use it instead of `time.monotonic` so they follow the virtual
+    clock when driven by the simulator.
+    """
+    return asyncio.get_running_loop().time()
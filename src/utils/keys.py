@@ -0,0 +1,82 @@
+from typing import Optional
+
+from configs.config import redis_settings
+
+
+def bot_tag(bot_id: int | str) -> str:
+    """
+    Bot id as it appears in keys. In cluster mode it is a hash tag, so
+    every key of a bot lands in the same slot and scripts or
+    transactions over them stay valid.
+    """
+    if redis_settings.REDIS_CLUSTER:
+        return f"{{{bot_id}}}"
+    return str(bot_id)
+
+
+def parse_bot_tag(raw: str) -> Optional[int]:
+    try:
+        return int(raw.strip("{}"))
+    except ValueError:
+        return None
+
+
+def primary_stream(bot_id: int | str) -> str:
+    return f"{redis_settings.TG_STREAM_PREFIX}{bot_tag(bot_id)}"
+
+
+def broadcast_stream(bot_id: int | str) -> str:
+    return f"{redis_settings.TG_BROADCAST_STREAM_PREFIX}{bot_tag(bot_id)}"
+
+
+def logs_stream(bot_id: int | str) -> str:
+    return f"{redis_settings.TG_BOT_LOG_STREAM_PREFIX}{bot_tag(bot_id)}"
+
+
+def dlq_stream(bot_id: int | str) -> str:
+    return f"{redis_settings.TG_DLQ_STREAM_PREFIX}{bot_tag(bot_id)}"
+
+
+def schedule_key(bot_id: int | str) -> str:
+    return f"{redis_settings.TG_SCHEDULE_PREFIX}{bot_tag(bot_id)}"
+
+
+def bot_meta_key(bot_id: int | str) -> str:
+    return f"{redis_settings.TG_BOT_META_PREFIX}{bot_tag(bot_id)}"
+
+
+def identity_key(bot_id: int | str) -> str:
+    return f"{redis_settings.TG_IDENTITY_PREFIX}{bot_tag(bot_id)}"
+
+
+def file_id_key(bot_id: int | str) -> str:
+    return f"{redis_settings.TG_FILE_ID_PREFIX}{bot_tag(bot_id)}"
+
+
+def chat_meta_key(bot_id: int | str) -> str:
+    return f"{redis_settings.TG_CHAT_META_PREFIX}{bot_tag(bot_id)}"
+
+
+def status_key(bot_id: int | str, bucket: int) -> str:
+    return f"{redis_settings.TG_STATUS_PREFIX}{bot_tag(bot_id)}:{bucket}"
+
+
+def edit_hash_key(
+    bot_id: int | str, chat_id: int | str, message_id: int | str
+) -> str:
+    return (
+        f"{redis_settings.EDIT_HASH_PREFIX}{bot_tag(bot_id)}"
+        f":{chat_id}:{message_id}"
+    )
+
+
+def chat_send_key(chat_id: int | str, bot_id: int | str) -> str:
+    return f"{redis_settings.CHAT_SEND_PREFIX}{chat_id}:{bot_tag(bot_id)}"
+
+
+def chat_edit_key(chat_id: int | str, bot_id: int | str) -> str:
+    return f"{redis_settings.CHAT_EDIT_PREFIX}{chat_id}:{bot_tag(bot_id)}"
+
+
+def group_send_key(chat_id: int | str, bot_id: int | str) -> str:
+    return f"{redis_settings.GROUP_SEND_PREFIX}{chat_id}:{bot_tag(bot_id)}"
@@ -2,6 +2,13 @@ from typing import Optional, Union
 
 from redis import asyncio as aioredis
 from redis.asyncio import RedisError
+from redis.asyncio.cluster import RedisCluster
+from redis.asyncio.retry import Retry
+from redis.backoff import EqualJitterBackoff
+from redis.exceptions import (
+    ConnectionError as RedisConnectionError,
+    TimeoutError as RedisTimeoutError,
+)
 
 from configs.config import redis_settings
 from configs.logger import logger
@@ -9,12 +16,71 @@ from configs.logger import logger
 background_tasks = {}
 
 
-redis_conn: aioredis.Redis = aioredis.Redis(
-    host=redis_settings.REDIS_HOST,
-    port=redis_settings.REDIS_PORT,
-    auto_close_connection_pool=False,
-    decode_responses=True,
+# Keys of different bots live in different cluster slots, so
+# transactions over them are only possible on a single node
+CROSS_SLOT_TRANSACTIONS = not redis_settings.REDIS_CLUSTER
+
+
+def create_redis(
+    max_connections: int, socket_timeout: float
+) -> aioredis.Redis | RedisCluster:
+    """
+    Client with its own bounded pool. Commands wait up to
+    REDIS_POOL_TIMEOUT_SECONDS for a free connection instead of opening
+    more, and are retried on connection errors with jittered backoff.
+    """
+    options = {
+        "socket_timeout": socket_timeout,
+        "socket_connect_timeout": redis_settings.REDIS_CONNECT_TIMEOUT_SECONDS,
+        "health_check_interval": redis_settings.REDIS_HEALTH_CHECK_SECONDS,
+        "retry": Retry(
+            EqualJitterBackoff(
+                cap=redis_settings.REDIS_RETRY_BACKOFF_CAP_SECONDS,
+                base=redis_settings.REDIS_RETRY_BACKOFF_BASE_SECONDS,
+            ),
+            redis_settings.REDIS_RETRIES,
+        ),
+        "retry_on_error": [RedisConnectionError, RedisTimeoutError],
+        "decode_responses": True,
+    }
+    if redis_settings.REDIS_CLUSTER:
+        # Pools are per node there
+        return RedisCluster(
+            host=redis_settings.REDIS_HOST,
+            port=redis_settings.REDIS_PORT,
+            max_connections=max_connections,
+            **options,
+        )
+    pool = aioredis.BlockingConnectionPool(
+        host=redis_settings.REDIS_HOST,
+        port=redis_settings.REDIS_PORT,
+        max_connections=max_connections,
+        timeout=redis_settings.REDIS_POOL_TIMEOUT_SECONDS,
+        **options,
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+
+# Hot path: limiters, acknowledgements, registry and cache reads
+redis_conn: aioredis.Redis = create_redis(
+    max_connections=redis_settings.REDIS_COMMAND_POOL_SIZE,
+    socket_timeout=redis_settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+)
+# XREAD(GROUP) BLOCK and pub/sub, each holds a connection while waiting
+blocking_redis_conn: aioredis.Redis = create_redis(
+    max_connections=redis_settings.REDIS_BLOCKING_POOL_SIZE,
+    socket_timeout=redis_settings.REDIS_BLOCKING_SOCKET_TIMEOUT_SECONDS,
 )
+# Message logs, so a slow log stream does not hold up sends
+logs_redis_conn: aioredis.Redis = create_redis(
+    max_connections=redis_settings.REDIS_LOGS_POOL_SIZE,
+    socket_timeout=redis_settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+)
+redis_pools = {
+    "command": redis_conn,
+    "blocking": blocking_redis_conn,
+    "logs": logs_redis_conn,
+}
 
 
 async def setup_stream(
@@ -30,10 +96,10 @@ async def setup_stream(
             id=consumer_id,
             mkstream=True,
         )
-        logger.info(f"BOT: Initialized Redis Stream: {stream_name}")
+        logger.info("BOT: Initialized Redis Stream: %s", stream_name)
     except aioredis.ResponseError as e:
         if "BUSYGROUP" in str(e):
-            logger.info(f"BOT GROUP: {group_name} already exists")
+            logger.info("BOT GROUP: %s already exists", group_name)
         else:
             logger.exception(e)
             raise
@@ -59,6 +125,21 @@ async def get_from_redis(
         raise
 
 
+async def get_many_from_redis(
+    redis_conn: aioredis.Redis, keys: list[str]
+) -> list[Union[str, None]]:
+    if not keys:
+        return []
+    try:
+        if isinstance(redis_conn, RedisCluster):
+            # Split by slot, MGET cannot span several
+            return await redis_conn.mget_nonatomic(keys)
+        return await redis_conn.mget(keys)
+    except RedisError as ex:
+        logger.error(ex)
+        raise
+
+
 async def remove_from_redis(
     redis_conn: aioredis.Redis, key: str
 ) -> Union[str, None]:
@@ -0,0 +1,159 @@
+import re
+from typing import Iterator, Optional
+
+# Telegram HTML tags and entities, anything else is visible text
+TAG_OR_ENTITY = re.compile(
+    r"<(/?)([a-zA-Z][\w-]*)[^<>]*>|&(#\d+|#x[\da-fA-F]+|[a-zA-Z]+);"
+)
+
+TAG = re.compile(r"<[^<>]*>")
+ENTITY = re.compile(r"&(#\d+|#x[\da-fA-F]+|[a-zA-Z]+);")
+
+# Characters above it take two UTF-16 code units (a surrogate pair)
+MAX_BMP_CODEPOINT = 0xFFFF
+
+# (tag name, opening tag as written)
+TagStack = tuple[tuple[str, str], ...]
+
+
+def utf16_len(text: str) -> int:
+    """
+    Length in UTF-16 code units, the way Telegram counts message limits.
+    """
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-16-le")) // 2
+
+
+def visible_len(text: str) -> int:
+    """
+    Length of HTML formatted text after Telegram parses the entities.
+    """
+    return utf16_len(ENTITY.sub("_", TAG.sub("", text)))
+
+
+def _fit_utf16(text: str, units: int) -> int:
+    """
+    Number of leading characters of `text` that fit into `units`.
+    """
+    excess = utf16_len(text) - units
+    end = len(text)
+    while excess > 0:
+        end -= 1
+        excess -= 2 if ord(text[end]) > MAX_BMP_CODEPOINT else 1
+    return end
+
+
+class HtmlSplitter:
+    """
+    Single pass over the text. The visible length (tags excluded, an
+    entity counted as one character) of every part stays within `limit`
+    UTF-16 units, parts are cut at the last newline, then the last space,
+    and tags open at the cut are closed and reopened in the next part.
+    """
+
+    def __init__(self, text: str, limit: int) -> None:
+        self.text = text
+        self.limit = limit
+        self.start = 0
+        self.prefix: TagStack = ()
+        self.stack: TagStack = ()
+        self.used = 0
+        # Break candidates: (position, tag stack, units used before the
+        # chunk holding the position, chunk start)
+        self.newline: Optional[tuple[int, TagStack, int, int]] = None
+        self.space: Optional[tuple[int, TagStack, int, int]] = None
+
+    def parts(self) -> Iterator[str]:
+        pos = 0
+        for match in TAG_OR_ENTITY.finditer(self.text):
+            yield from self._feed_text(pos, match.start())
+            if match.group(3) is not None:
+                yield from self._feed_entity(match)
+            else:
+                self._feed_tag(match)
+            pos = match.end()
+        yield from self._feed_text(pos, len(self.text))
+        yield from self._emit(len(self.text), self.stack)
+
+    def _feed_text(self, begin: int, end: int) -> Iterator[str]:
+        while begin < end:
+            room = self.limit - self.used
+            if room <= 0:
+                yield from self._cut(begin)
+                continue
+            chunk = self.text[begin : min(end, begin + room)]
+            units = utf16_len(chunk)
+            if units > room:
+                chunk = chunk[: _fit_utf16(chunk, room)]
+                units = utf16_len(chunk)
+            if not chunk:
+                yield from self._cut(begin)
+                continue
+            self._mark_breaks(begin, chunk)
+            self.used += units
+            begin += len(chunk)
+
+    def _feed_entity(self, match: re.Match) -> Iterator[str]:
+        # Numeric entities may encode a character outside the BMP
+        units = 2 if match.group(3).startswith("#") else 1
+        # A break may free less than the entity needs, the next cut is
+        # then made right before it
+        while self.used and self.used + units > self.limit:
+            yield from self._cut(match.start())
+        self.used += units
+
+    def _feed_tag(self, match: re.Match) -> None:
+        closing, name = match.group(1), match.group(2).lower()
+        if not closing:
+            self.stack = (*self.stack, (name, match.group(0)))
+            return
+        for idx in range(len(self.stack) - 1, -1, -1):
+            if self.stack[idx][0] == name:
+                self.stack = self.stack[:idx]
+                return
+
+    def _mark_breaks(self, begin: int, chunk: str) -> None:
+        if (idx := chunk.rfind("\n")) != -1:
+            self.newline = (begin + idx, self.stack, self.used, begin)
+        if (idx := chunk.rfind(" ")) != -1:
+            self.space = (begin + idx, self.stack, self.used, begin)
+
+    def _cut(self, pos: int) -> Iterator[str]:
+        """
+        Emits the current part, `pos` is where the text no longer fits.
+        """
+        if brk := self.newline or self.space:
+            cut, stack, used, chunk_start = brk
+            used += utf16_len(self.text[chunk_start : cut + 1])
+            next_start = cut + 1  # the separator itself is dropped
+        else:
+            cut, stack, used = pos, self.stack, self.used
+            next_start = pos
+        yield from self._emit(cut, stack)
+        self.start = next_start
+        self.prefix = stack
+        self.used -= used
+        self.newline = self.space = None
+
+    def _emit(self, end: int, stack: TagStack) -> Iterator[str]:
+        # Telegram rejects messages without visible text
+        if TAG.sub("", self.text[self.start : end]).strip():
+            yield (
+                "".join(tag for _, tag in self.prefix)
+                + self.text[self.start : end]
+                + "".join(f"</{name}>" for name, _ in reversed(stack))
+            )
+
+
+def split_html(text: str, limit: int) -> Iterator[str]:
+    """
+    Lazily splits HTML formatted text into parts of at most `limit`
+    visible UTF-16 units.
+    """
+    if not text:
+        return
+    if utf16_len(text) <= limit:
+        yield text
+        return
+    yield from HtmlSplitter(text, limit).parts()
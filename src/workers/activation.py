@@ -0,0 +1,158 @@
+import asyncio
+from typing import Optional
+
+from redis import asyncio as aioredis
+from redis import RedisError
+
+from configs.config import redis_settings, worker_settings
+from configs.logger import logger
+from workers.service import activate_bot, bot_records
+from utils.keys import broadcast_stream, parse_bot_tag, primary_stream
+from utils.redis import background_tasks, blocking_redis_conn
+
+KEYSPACE_EVENTS = "Kt"  # Keyspace events for stream commands
+# Event types "A" stands for in notify-keyspace-events, it has no K or E
+ALL_EVENT_TYPES = "g$lshzxetd"
+# Below the socket timeout, so an idle subscription is not a read error
+EVENT_POLL_SECONDS = 1.0
+
+
+def parse_bot_id(stream_name: str) -> Optional[int]:
+    """
+    Extracts bot_id from a primary or broadcast stream name.
+    Returns None for control, logs and unrelated streams.
+    """
+    for prefix in (
+        redis_settings.TG_BROADCAST_STREAM_PREFIX,
+        redis_settings.TG_STREAM_PREFIX,
+    ):
+        if stream_name.startswith(prefix):
+            return parse_bot_tag(stream_name[len(prefix) :])
+    return None
+
+
+async def run_activation(
+    redis_conn: aioredis.Redis,
+    blocking_conn: aioredis.Redis = blocking_redis_conn,
+) -> None:
+    """
+    Starts consumers for inactive bots once their streams get messages.
+    Keyspace notifications give instant activation, the periodic sweep
+    catches messages that arrived while notifications were unavailable.
+    """
+    tasks = [asyncio.create_task(sweep_inactive_bots(redis_conn=redis_conn))]
+    # Cluster nodes notify only about their own keys, the sweep covers it
+    if (
+        worker_settings.KEYSPACE_NOTIFICATIONS
+        and not redis_settings.REDIS_CLUSTER
+    ):
+        tasks.append(
+            asyncio.create_task(watch_stream_events(redis_conn=blocking_conn))
+        )
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def missing_keyspace_events(current: str) -> str:
+    """
+    Flags of KEYSPACE_EVENTS that the `current` setting does not enable.
+    """
+    enabled = current + ALL_EVENT_TYPES if "A" in current else current
+    return "".join(e for e in KEYSPACE_EVENTS if e not in enabled)
+
+
+async def enable_keyspace_events(redis_conn: aioredis.Redis) -> None:
+    try:
+        config = await redis_conn.config_get("notify-keyspace-events")
+        current = config.get("notify-keyspace-events", "")
+        if missing := missing_keyspace_events(current):
+            await redis_conn.config_set(
+                "notify-keyspace-events", current + missing
+            )
+    except RedisError as ex:
+        logger.warning(
+            "Cannot enable keyspace notifications, relying on sweep: %s", ex
+        )
+
+
+async def watch_stream_events(redis_conn: aioredis.Redis) -> None:
+    await enable_keyspace_events(redis_conn=redis_conn)
+    db = redis_conn.connection_pool.connection_kwargs.get("db", 0)
+    channel_prefix = f"__keyspace@{db}__:"
+    while True:
+        pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.psubscribe(
+                f"{channel_prefix}{redis_settings.TG_STREAM_PREFIX}*"
+            )
+            logger.info("Activation watcher subscribed to stream events")
+            while True:
+                event = await pubsub.get_message(timeout=EVENT_POLL_SECONDS)
+                if event is None or event.get("data") != "xadd":
+                    continue
+                bot_id = parse_bot_id(event["channel"][len(channel_prefix) :])
+                if bot_id is not None and bot_id not in background_tasks:
+                    await activate_bot(bot_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            logger.exception("Activation watcher error: %s", ex)
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
+
+
+async def sweep_inactive_bots(redis_conn: aioredis.Redis) -> None:
+    while True:
+        try:
+            inactive = [b for b in bot_records if b not in background_tasks]
+            batch_size = worker_settings.ACTIVATION_SWEEP_BATCH
+            for i in range(0, len(inactive), batch_size):
+                for bot_id in await find_bots_with_backlog(
+                    redis_conn=redis_conn,
+                    bot_ids=inactive[i : i + batch_size],
+                ):
+                    await activate_bot(bot_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            logger.exception("Activation sweep error: %s", ex)
+        await asyncio.sleep(worker_settings.ACTIVATION_SWEEP_INTERVAL_SECONDS)
+
+
+async def find_bots_with_backlog(
+    redis_conn: aioredis.Redis, bot_ids: list[int]
+) -> list[int]:
+    """
+    Returns bots having unread or pending entries in any of their streams.
+    """
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        for bot_id in bot_ids:
+            pipe.xinfo_groups(primary_stream(bot_id))
+            pipe.xinfo_groups(broadcast_stream(bot_id))
+        results = await pipe.execute(raise_on_error=False)
+    with_backlog = []
+    for idx, bot_id in enumerate(bot_ids):
+        for groups in results[idx * 2 : idx * 2 + 2]:
+            if _has_backlog(groups):
+                with_backlog.append(bot_id)
+                break
+    return with_backlog
+
+
+def _has_backlog(groups: list[dict] | Exception) -> bool:
+    if isinstance(groups, Exception):
+        # Stream does not exist yet
+        return False
+    for group in groups:
+        if group["name"] != redis_settings.GROUP_NAME:
+            continue
+        # `lag` is None when Redis cannot compute it, assume there is work
+        lag = group.get("lag")
+        return group["pending"] > 0 or lag is None or lag > 0
+    # Stream exists but the bot never consumed it
+    return True
@@ -1,28 +1,96 @@
 import asyncio
+import signal
 import time
+from typing import Coroutine
 
 from redis import asyncio as aioredis
 from pydantic import ValidationError
 
-from configs.config import redis_settings
+from configs.config import redis_settings, worker_settings
 from configs.logger import logger
-from schemas.message import Message, MessageType
-from workers.service import add_bot, remove_bot, restore_bot_consumers
-from utils.redis import setup_stream, redis_conn
+from schemas.message import (
+    HandoffMessage,
+    Message,
+    MessageType,
+    ProfileMessage,
+    ReplayMessage,
+)
+from services.callbacks import close_session
+from services.dlq import replay_dead_letters
+from services.fair_scheduler import fair_scheduler
+from services.metrics import (
+    collect_pool_metrics,
+    collect_stream_metrics,
+    observe_loop_lag,
+    observe_stage,
+    start_metrics_server,
+)
+from services.profiling import (
+    add_stage_hook,
+    monitor_loop_lag,
+    run_sampling_profiler,
+)
+from services.scheduler import run_scheduler
+from workers.activation import run_activation
+from workers.producers import send_to_queueu
+from workers.service import (
+    add_bot,
+    drain_bots,
+    remove_bot,
+    restore_bot_consumers,
+    sync_bot_registry,
+    take_over,
+)
+from utils.redis import (
+    background_tasks as bot_tasks,
+    blocking_redis_conn,
+    redis_conn,
+    redis_pools,
+    setup_stream,
+)
 
-MAX_MSG_TO_PROCESS = 2
 MAX_READ_BLOCK_TIME = 2000
 CONSUMER_NAME = "CONTROLLER"
 
 background_tasks = set()
 
+
+async def start_profiler(msg: Message) -> None:
+    if not isinstance(msg.data, ProfileMessage):
+        logger.error("Received profile message in wrong format: %s", msg)
+        return
+    # Runs in the background so the control stream keeps being consumed
+    _run_in_background(
+        run_sampling_profiler(
+            duration=msg.data.duration_seconds,
+            interval_ms=msg.data.interval_ms,
+        )
+    )
+
+
+async def replay_dlq(msg: Message) -> None:
+    if not isinstance(msg.data, ReplayMessage):
+        logger.error("Received replay message in wrong format: %s", msg)
+        return
+    _run_in_background(
+        replay_dead_letters(bot_id=msg.data.bot_id, count=msg.data.count)
+    )
+
+
 service_commands = {
     "add_bot": add_bot,
     "remove_bot": remove_bot,
+    "profile": start_profiler,
+    "replay_dlq": replay_dlq,
+    "handoff": take_over,
 }
 
 
 async def run_consumers() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
     await setup_stream(
         redis_conn=redis_conn,
         stream_name=redis_settings.CONTROL_STREAM_NAME,
@@ -34,17 +102,65 @@ async def run_consumers() -> None:
         group_name=redis_settings.GROUP_NAME,
         consumer_name=CONSUMER_NAME,
     )
-    await restore_bot_consumers(
+    last_change_id = await restore_bot_consumers(
         redis_conn=redis_conn,
     )
+    _run_in_background(sync_bot_registry(last_change_id=last_change_id))
+    if worker_settings.LAZY_BOT_ACTIVATION:
+        _run_in_background(run_activation(redis_conn=redis_conn))
+    if worker_settings.SCHEDULER_ENABLED:
+        _run_in_background(run_scheduler(redis_conn=redis_conn))
+    if worker_settings.METRICS_ENABLED:
+        start_metrics_server()
+        add_stage_hook(observe_stage)
+        _run_in_background(
+            collect_stream_metrics(redis_conn=redis_conn, bot_ids=bot_tasks)
+        )
+        _run_in_background(collect_pool_metrics(pools=redis_pools))
+    _run_in_background(monitor_loop_lag(on_lag=_on_loop_lag))
+    if worker_settings.FAIR_SCHEDULING:
+        _run_in_background(fair_scheduler.run())
     try:
-        await asyncio.Event().wait()
+        await stop.wait()
+        logger.info("Shutdown requested, draining...")
     except Exception as ex:
         logger.exception(ex)
     finally:
+        # Nothing may start new bot consumers while they drain
         for t in background_tasks:
             t.cancel()
         await asyncio.gather(*background_tasks, return_exceptions=True)
+        await shutdown()
+
+
+async def shutdown() -> None:
+    """
+    Lets bot consumers finish what they are sending, then tells a peer
+    to take over the entries they released.
+    """
+    bot_ids = await drain_bots()
+    await close_session()
+    if not bot_ids:
+        return
+    await send_to_queueu(
+        msg=Message(
+            type=MessageType.handoff,
+            data=HandoffMessage(bot_ids=sorted(bot_ids)),
+        ),
+        stream_name=redis_settings.CONTROL_STREAM_NAME,
+    )
+    logger.info("Handed off entries of %s bots", len(bot_ids))
+
+
+def _on_loop_lag(seconds: float) -> None:
+    observe_loop_lag(seconds)
+    fair_scheduler.on_lag(seconds)
+
+
+def _run_in_background(coro: Coroutine) -> None:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
 
 
 async def add_consumer(
@@ -52,6 +168,7 @@ async def add_consumer(
     stream_name: str,
     group_name: str,
     consumer_name: str,
+    read_conn: aioredis.Redis = blocking_redis_conn,
 ) -> None:
     task = asyncio.create_task(
         consume_service(
@@ -59,6 +176,7 @@ async def add_consumer(
             stream_name=stream_name,
             group_name=group_name,
             consumer_name=consumer_name,
+            read_conn=read_conn,
         )
     )
     background_tasks.add(task)
@@ -70,8 +188,11 @@ async def consume_service(
     stream_name: str,
     group_name: str,
     consumer_name: str,
+    read_conn: aioredis.Redis = blocking_redis_conn,
 ) -> None:
-    logger.info(f"Consumer: {consumer_name} for stream: {stream_name} started")
+    logger.info(
+        "Consumer: %s for stream: %s started", consumer_name, stream_name
+    )
     last_reclaim_check = time.monotonic()
     while True:
         try:
@@ -82,30 +203,33 @@ async def consume_service(
                 consumer_name=consumer_name,
                 last_reclaim_check=last_reclaim_check,
             )
-            messages = await redis_conn.xreadgroup(
+            messages = await read_conn.xreadgroup(
                 groupname=group_name,
                 consumername=consumer_name,
                 streams={stream_name: ">"},
-                count=MAX_MSG_TO_PROCESS,
+                count=worker_settings.CONTROL_READ_COUNT,
                 block=MAX_READ_BLOCK_TIME,
             )
             for stream, entries in messages:
                 for message_id, data in entries:
                     if isinstance(data, dict):
                         logger.info(
-                            f"[{stream}] {consumer_name} got: {str(data)[:90]}"
+                            "[%s] %s got: %s",
+                            stream,
+                            consumer_name,
+                            str(data)[:90],
                         )
                         await handle_incoming_service_message(data)
                     else:
                         logger.exception(
-                            f"[{stream}] {consumer_name} got: {data}"
+                            "[%s] %s got: %s", stream, consumer_name, data
                         )
                     await redis_conn.xack(stream_name, group_name, message_id)
         except asyncio.CancelledError:
-            logger.info(f"{consumer_name} shutting down...")
+            logger.info("%s shutting down...", consumer_name)
             break
         except Exception as e:
-            logger.exception(f"Error in {consumer_name}: {e}")
+            logger.exception("Error in %s: %s", consumer_name, e)
             await asyncio.sleep(1)
 
 
@@ -114,20 +238,22 @@ async def handle_incoming_service_message(msg: dict) -> None:
         msg: Message = Message.model_validate(msg)
     except ValidationError:
         logger.exception(
-            f"OUTCOME STREAM - CONSUMER: {CONSUMER_NAME}"
-            f" received unsupported message: {msg}"
+            "OUTCOME STREAM - CONSUMER: %s received unsupported message: %s",
+            CONSUMER_NAME,
+            msg,
         )
         return
 
     if msg.type == MessageType.pulse:
-        logger.info(f"Ping message received: {CONSUMER_NAME}")
+        logger.info("Ping message received: %s", CONSUMER_NAME)
         return
     if msg.type.value in service_commands:
         await service_commands[msg.type.value](msg)
     else:
         logger.exception(
-            f"OUTCOME STREAM - CONSUMER: {CONSUMER_NAME}"
-            f" received unsupported command: {msg}"
+            "OUTCOME STREAM - CONSUMER: %s received unsupported command: %s",
+            CONSUMER_NAME,
+            msg,
         )
 
 
@@ -140,7 +266,7 @@ async def handle_pending_messages(
 ) -> float:
     now = time.monotonic()
     if now - last_reclaim_check >= redis_settings.RECLAIM_INTERVAL_SECONDS:
-        logger.info(f"Consumer: {consumer_name} Running reclaim check")
+        logger.info("Consumer: %s Running reclaim check", consumer_name)
         last_reclaim_check = now
         pending_messages = await redis_conn.xpending_range(
             name=stream_name,
@@ -149,17 +275,20 @@ async def handle_pending_messages(
             max="+",
             count=redis_settings.MAX_PENDING_TO_SCAN,
         )
+        logger.debug(
+            "[%s] - pending messages: %s", consumer_name, pending_messages
+        )
         stuck_ids_to_claim = []
         for message in pending_messages:
-            logger.info(pending_messages)
             if (
                 message["time_since_delivered"]
                 > redis_settings.IDLE_THRESHOLD_MS
             ):
                 logger.info(
-                    f"[{consumer_name}] - found stuck message"
-                    f" {message['message_id']} "
-                    f"(Idle: {message['time_since_delivered']})"
+                    "[%s] - found stuck message %s (Idle: %s)",
+                    consumer_name,
+                    message["message_id"],
+                    message["time_since_delivered"],
                 )
                 stuck_ids_to_claim.append(message["message_id"])
         if stuck_ids_to_claim:
@@ -173,7 +302,9 @@ async def handle_pending_messages(
                 justid=True,
             )
             logger.info(
-                f"[{consumer_name}] - claimed stuck messages: {len(claimed)}"
+                "[%s] - claimed stuck messages: %s",
+                consumer_name,
+                len(claimed),
             )
             messages = await redis_conn.xreadgroup(
                 groupname=group_name,
@@ -185,12 +316,15 @@ async def handle_pending_messages(
                 for message_id, data in entries:
                     if isinstance(data, dict):
                         logger.info(
-                            f"[{stream}] {consumer_name} got: {str(data)[:90]}"
+                            "[%s] %s got: %s",
+                            stream,
+                            consumer_name,
+                            str(data)[:90],
                         )
                         await handle_incoming_service_message(data)
                     else:
                         logger.exception(
-                            f"[{stream}] {consumer_name} got: {data}"
+                            "[%s] %s got: %s", stream, consumer_name, data
                         )
                     await redis_conn.xack(stream_name, group_name, message_id)
 
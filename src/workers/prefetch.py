@@ -0,0 +1,189 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import suppress
+from typing import Optional
+
+from redis import Redis, RedisError
+
+from configs.config import redis_settings, worker_settings
+from configs.logger import logger
+from services.fair_scheduler import fair_scheduler
+from services.profiling import stage
+
+# Weight of the latest message in the service time average
+SERVICE_TIME_ALPHA = 0.2
+
+# (stream, entry id, fields)
+Entry = tuple[str, str, dict]
+
+
+class Prefetcher:
+    """
+    Read-ahead buffer over the lanes of one bot. A background task keeps
+    about PREFETCH_SECONDS of work buffered, sized from how long the bot
+    actually takes per message (limiter waits included), so reads are
+    off the send path and a slow bot does not pile entries up in the PEL.
+    Lanes are given in priority order and served that way.
+
+    Held entries get their idle time reset every half IDLE_THRESHOLD_MS,
+    so when sends slow down after the depth was sized, buffered entries
+    are not reclaimed (and sent twice) by a worker of the same bot.
+    """
+
+    def __init__(
+        self,
+        read_conn: Redis,
+        streams: list[str],
+        group_name: str,
+        consumer_name: str,
+        held_entries: dict[str, set[str]],
+        label: str,
+        block_ms: int,
+    ) -> None:
+        self.read_conn = read_conn
+        self.group_name = group_name
+        self.consumer_name = consumer_name
+        # Ids read and not acknowledged yet, shared with the consumer
+        self.held_entries = held_entries
+        self.label = label
+        self.block_ms = block_ms
+        self.buffers: dict[str, deque[Entry]] = {s: deque() for s in streams}
+        self.service_time: Optional[float] = None
+        self.has_entries = asyncio.Event()
+        self.has_room = asyncio.Event()
+        self.has_room.set()
+        self.stopping = False
+        self.task: Optional[asyncio.Task] = None
+        self.refresh_seconds = redis_settings.IDLE_THRESHOLD_MS / 2000
+        self.refreshed_at = time.monotonic()
+
+    def depth(self) -> int:
+        return sum(len(buffer) for buffer in self.buffers.values())
+
+    def target_depth(self) -> int:
+        if not self.service_time:
+            return worker_settings.PREFETCH_MIN_ENTRIES
+        depth = int(worker_settings.PREFETCH_SECONDS / self.service_time)
+        return max(
+            worker_settings.PREFETCH_MIN_ENTRIES,
+            min(depth, worker_settings.PREFETCH_MAX_ENTRIES),
+        )
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(
+            fair_scheduler.meter(self._fill(), self.label)
+        )
+
+    async def stop(self) -> None:
+        """
+        Lets the read in progress finish, so everything delivered to this
+        consumer is known to `held_entries`.
+        """
+        self.stopping = True
+        self.has_room.set()
+        if self.task is None:
+            return
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            self.task.cancel()
+            raise
+
+    async def get(self, wait_seconds: float) -> Optional[Entry]:
+        if not self.depth():
+            try:
+                await asyncio.wait_for(self.has_entries.wait(), wait_seconds)
+            except TimeoutError:
+                return None
+        for buffer in self.buffers.values():
+            if buffer:
+                entry = buffer.popleft()
+                break
+        else:
+            return None
+        if not self.depth():
+            self.has_entries.clear()
+        # Refilled at half the target, so each read brings a batch
+        if self.depth() <= self.target_depth() // 2:
+            self.has_room.set()
+        return entry
+
+    def done(self, seconds: float) -> None:
+        """
+        Records how long one message took to handle.
+        """
+        if self.service_time is None:
+            self.service_time = seconds
+        else:
+            self.service_time += SERVICE_TIME_ALPHA * (
+                seconds - self.service_time
+            )
+
+    async def _fill(self) -> None:
+        while not self.stopping:
+            with suppress(TimeoutError):
+                await asyncio.wait_for(
+                    self.has_room.wait(), self.refresh_seconds / 2
+                )
+            if self.stopping:
+                return
+            if time.monotonic() - self.refreshed_at >= self.refresh_seconds:
+                await self._refresh()
+            if not self.has_room.is_set():
+                continue
+            room = self.target_depth() - self.depth()
+            if room <= 0:
+                self.has_room.clear()
+                continue
+            try:
+                read = await self._read(room)
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                logger.exception("Prefetch error in %s: %s", self.label, ex)
+                await asyncio.sleep(1)
+                continue
+            if read:
+                self.has_entries.set()
+
+    async def _refresh(self) -> None:
+        # Entries being handled are held too, a slow send is covered
+        self.refreshed_at = time.monotonic()
+        for stream in self.buffers:
+            entry_ids = sorted(self.held_entries.get(stream, ()))
+            if not entry_ids:
+                continue
+            try:
+                await self.read_conn.xclaim(
+                    name=stream,
+                    groupname=self.group_name,
+                    consumername=self.consumer_name,
+                    min_idle_time=0,
+                    message_ids=entry_ids,
+                    justid=True,
+                )
+            except RedisError as ex:
+                logger.error(
+                    "Failed to refresh held entries of %s: %s", stream, ex
+                )
+
+    async def _read(self, count: int) -> int:
+        # Returns as soon as any lane has entries. The lanes share a hash
+        # tag, so one call waits on all of them on a cluster too.
+        with stage("read", self.label):
+            messages = await self.read_conn.xreadgroup(
+                groupname=self.group_name,
+                consumername=self.consumer_name,
+                streams=dict.fromkeys(self.buffers, ">"),
+                count=count,
+                block=self.block_ms,
+            )
+        read = 0
+        for stream, entries in messages:
+            held = self.held_entries.setdefault(stream, set())
+            for entry_id, data in entries:
+                held.add(entry_id)
+                self.buffers[stream].append((stream, entry_id, data))
+                read += 1
+        return read
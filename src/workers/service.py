@@ -1,27 +1,64 @@
 import asyncio
+import hashlib
+import json
 import time
 from typing import Optional
 
 from aiogram import Bot
-from aiogram.enums import ParseMode
-from aiogram.client.default import DefaultBotProperties
+from aiogram.exceptions import TelegramUnauthorizedError
+from pydantic import ValidationError
 from redis import Redis, RedisError
 
 from configs.logger import logger
-from configs.config import redis_settings
-from schemas.message import Message, ServiceMessage, MessageType, TaskMessage
+from configs.config import redis_settings, worker_settings
+from schemas.bot import BotRecord, RegistryChange
+from constants.message import DeliveryStatus
+from schemas.message import (
+    DeliveryRecord,
+    HandoffMessage,
+    Message,
+    MessageType,
+    ServiceMessage,
+    TaskMessage,
+)
 from services.bots import send_msg, edit_msg, del_msg
+from services.global_limiter import global_limiter
+from services.metrics import (
+    bot_label,
+    observe_enqueue_latency,
+    register_bot,
+)
+from services.profiling import stage
+from services.callbacks import close_sink, open_sink
+from services.circuit_breaker import (
+    is_open as breaker_is_open,
+    wait_until_closed,
+)
+from services.dlq import dead_letter
+from services.fair_scheduler import fair_scheduler
+from services.registry import REMOVE, bot_registry
+from services.scheduler import due_time, schedule_message
+from services.status_index import status_index
+from services.telegram import create_bot
+from utils.keys import (
+    broadcast_stream as broadcast_stream_key,
+    chat_meta_key,
+    file_id_key,
+    identity_key,
+    logs_stream as logs_stream_key,
+    primary_stream as primary_stream_key,
+)
 from utils.redis import (
+    blocking_redis_conn,
     redis_conn,
     setup_stream,
     background_tasks,
     add_to_redis,
-    get_from_redis,
+    get_many_from_redis,
     remove_from_redis,
-    get_keys_by_prefix,
 )
+from workers.prefetch import Prefetcher
 
-NUMBER_TO_READ_FROM_STREAM = 10
 BLOCK_TIME = 2000
 
 bot_commands = {
@@ -30,42 +67,167 @@ bot_commands = {
     MessageType.del_msg: del_msg,
 }
 
+# Metadata of every known bot, active or not. Consumers (and `Bot` objects)
+# exist only for bots present in `background_tasks`.
+bot_records: dict[int, BotRecord] = {}
+_activating: set[int] = set()
 
-async def restore_bot_consumers(
-    redis_conn: Redis, exclude_keys: Optional[set[str]] = None
-) -> None:
-    bot_keys_restored = set()
-    try:
-        keys = await get_keys_by_prefix(
-            redis_conn=redis_conn, prefix=redis_settings.TG_KEY_PREFIX
-        )
-        if not keys:
-            return None
-        for key in keys:
-            if exclude_keys and key in exclude_keys:
-                continue
-            raw_token = await get_from_redis(redis_conn=redis_conn, key=key)
-            if not raw_token:
-                logger.exception(f"Cannot get bot token for key: {key}")
-            token, is_sent_logs = raw_token.split(":LOGS:")
+# Set on shutdown: consumers stop reading and hand their entries off
+draining = asyncio.Event()
+# Entries read by this worker and not acknowledged yet, per stream
+held_entries: dict[str, set[str]] = {}
+# Bots whose entries were handed off while draining
+handed_off: set[int] = set()
+# Bots a draining peer handed off, reclaimed without waiting
+_reclaim_now: set[int] = set()
+
+
+async def restore_bot_consumers(redis_conn: Redis) -> str:
+    """
+    Loads bot records from the registry and starts consumers unless
+    activation is lazy. Returns the registry changes stream position
+    the records are consistent with.
+    """
+    while True:
+        try:
+            if worker_settings.MIGRATE_LEGACY_BOT_KEYS:
+                await bot_registry.migrate_legacy()
+            last_change_id = await bot_registry.last_change_id()
+            records = await bot_registry.load_all()
+            cached_ids = await _get_cached_identities(
+                redis_conn=redis_conn, records=records
+            )
+            break
+        except RedisError as ex:
+            logger.info("Redis Error connection: %s, retrying..", ex.args)
+            await asyncio.sleep(5)
+    for record in records:
+        bot_records[record.bot_id] = record
+    logger.info("Restored %s bot records", len(records))
+    if worker_settings.LAZY_BOT_ACTIVATION or not records:
+        return last_change_id
+
+    semaphore = asyncio.Semaphore(worker_settings.RESTORE_CONCURRENCY)
+    started = 0
+
+    async def start(record: BotRecord) -> None:
+        nonlocal started
+        async with semaphore:
             await _add_bot(
-                bot_id=key.split(redis_settings.TG_KEY_PREFIX)[1],
-                token=token,
-                bot_key=key,
-                is_sent_logs=is_sent_logs == "True"
+                record=record, validate=record.bot_id not in cached_ids
             )
-            bot_keys_restored.add(key)
-    except RedisError as ex:
-        logger.info(f"Redis Error connection: {ex.args}, retrying..")
-        if exclude_keys is None:
-            exclude_keys = set(bot_keys_restored)
-        else:
-            for key in bot_keys_restored:
-                exclude_keys.add(key)
-        await asyncio.sleep(5)
-        return await restore_bot_consumers(
-            redis_conn=redis_conn, exclude_keys=exclude_keys
+        started += 1
+        if (
+            started % worker_settings.RESTORE_PROGRESS_EVERY == 0
+            or started == len(records)
+        ):
+            logger.info("Restore progress: %s/%s bots", started, len(records))
+
+    await asyncio.gather(*(start(r) for r in records))
+    return last_change_id
+
+
+async def sync_bot_registry(last_change_id: str) -> None:
+    """
+    Applies registry changes made by other workers to local bot records.
+    """
+    while True:
+        try:
+            changes = await bot_registry.read_changes(
+                last_id=last_change_id,
+                block=worker_settings.REGISTRY_SYNC_BLOCK_MS,
+            )
+            for change_id, change in changes:
+                await _apply_registry_change(change)
+                last_change_id = change_id
+        except asyncio.CancelledError:
+            logger.info("Registry sync shutting down...")
+            return
+        except Exception as ex:
+            logger.exception("Registry sync error: %s", ex)
+            await asyncio.sleep(1)
+
+
+async def _apply_registry_change(change: RegistryChange) -> None:
+    current = bot_records.get(change.bot_id)
+    if change.op == REMOVE:
+        bot_records.pop(change.bot_id, None)
+        _stop_bot(change.bot_id)
+        return
+    if current and current.revision >= change.revision:
+        return
+    record = await bot_registry.get(change.bot_id)
+    if record is None:
+        return
+    bot_records[record.bot_id] = record
+    logger.info(
+        "Bot_id: %s updated to revision %s", record.bot_id, record.revision
+    )
+    # Restart the consumer so it picks up the new token and settings
+    if _stop_bot(record.bot_id) or not worker_settings.LAZY_BOT_ACTIVATION:
+        await activate_bot(record.bot_id)
+
+
+def _stop_bot(bot_id: int) -> bool:
+    task: asyncio.Task = background_tasks.pop(bot_id, None)
+    if task is None:
+        return False
+    task.cancel()
+    logger.info("Cancelled task for bot_id: %s", bot_id)
+    return True
+
+
+def _token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def _get_cached_identities(
+    redis_conn: Redis, records: list[BotRecord]
+) -> set[int]:
+    """
+    Returns ids of bots which passed `get_me` before with their current
+    token and can skip it.
+    """
+    if not worker_settings.SKIP_GET_ME_IF_CACHED:
+        return set()
+    cached = set()
+    batch_size = worker_settings.RESTORE_BATCH_SIZE
+    for i in range(0, len(records), batch_size):
+        batch = records[i : i + batch_size]
+        values = await get_many_from_redis(
+            redis_conn=redis_conn,
+            keys=[identity_key(r.bot_id) for r in batch],
         )
+        cached.update(
+            r.bot_id
+            for r, v in zip(batch, values, strict=True)
+            if v and json.loads(v).get("token") == _token_digest(r.token)
+        )
+    return cached
+
+
+async def activate_bot(bot_id: int) -> bool:
+    """
+    Starts a consumer for a known but inactive bot.
+    Returns True if a new consumer was started.
+    """
+    if bot_id in background_tasks or bot_id in _activating:
+        return False
+    if draining.is_set():
+        return False
+    record = bot_records.get(bot_id)
+    if record is None:
+        return False
+    logger.info("Activating bot_id: %s", bot_id)
+    _activating.add(bot_id)
+    try:
+        cached = await _get_cached_identities(
+            redis_conn=redis_conn, records=[record]
+        )
+        await _add_bot(record=record, validate=bot_id not in cached)
+    finally:
+        _activating.discard(bot_id)
+    return bot_id in background_tasks
 
 
 async def add_bot(msg: Message) -> None:
@@ -76,27 +238,26 @@ async def add_bot(msg: Message) -> None:
         )
         return
     msg: ServiceMessage = msg.data
-    bot_key = f"{redis_settings.TG_KEY_PREFIX}{msg.bot_id}"
     try:
-        if await get_from_redis(redis_conn=redis_conn, key=bot_key):
+        if await bot_registry.exists(msg.bot_id):
             logger.exception(
                 "Bot is already activated: %s", msg.model_dump_json()
             )
             return
-        await add_to_redis(
-            redis_conn=redis_conn,
-            key=bot_key,
-            value=f"{msg.token}:LOGS:{bool(msg.is_sent_logs)}",
+        record = await bot_registry.add(
+            BotRecord(
+                bot_id=msg.bot_id,
+                token=msg.token,
+                is_sent_logs=msg.is_sent_logs,
+                rps=msg.rps,
+                callback_url=msg.callback_url,
+            )
         )
     except RedisError as ex:
         logger.exception("Redis connection error, aborted operation %s", ex)
         return
-    await _add_bot(
-        bot_id=msg.bot_id,
-        token=msg.token,
-        bot_key=bot_key,
-        is_sent_logs=msg.is_sent_logs,
-    )
+    bot_records[msg.bot_id] = record
+    await _add_bot(record=record)
 
 
 async def remove_bot(msg: Message) -> None:
@@ -107,59 +268,139 @@ async def remove_bot(msg: Message) -> None:
         )
         return
     msg: ServiceMessage = msg.data
-    bot_key = f"{redis_settings.TG_KEY_PREFIX}{msg.bot_id}"
-    task: asyncio.Task = background_tasks.pop(msg.bot_id, None)
-    if task is None:
-        logger.exception(f"Cannot find task for bot_id: {msg.bot_id}")
-    else:
-        task.cancel()
-        logger.info(f"Cancelled task for bot_id: {msg.bot_id}")
+    bot_records.pop(msg.bot_id, None)
+    if not _stop_bot(msg.bot_id):
+        logger.exception("Cannot find task for bot_id: %s", msg.bot_id)
     try:
-        await remove_from_redis(redis_conn=redis_conn, key=bot_key)
+        await bot_registry.remove(msg.bot_id)
+        await remove_from_redis(
+            redis_conn=redis_conn,
+            key=identity_key(msg.bot_id),
+        )
+        await remove_from_redis(
+            redis_conn=redis_conn,
+            key=file_id_key(msg.bot_id),
+        )
+        await remove_from_redis(
+            redis_conn=redis_conn,
+            key=chat_meta_key(msg.bot_id),
+        )
     except RedisError as ex:
         logger.exception("Redis connection error, aborted operation %s", ex)
         return
 
 
-async def _add_bot(
-    bot_id: int, token: str, bot_key: str, is_sent_logs: Optional[bool] = None
-) -> None:
-    primary_stream = f"{redis_settings.TG_STREAM_PREFIX}{bot_id}"
-    broadcast_stream = f"{redis_settings.TG_BROADCAST_STREAM_PREFIX}{bot_id}"
-    logs_stream = None
-    if is_sent_logs:
-        logs_stream = f"{redis_settings.TG_BOT_LOG_STREAM_PREFIX}{bot_id}"
-    bot = Bot(
-        token=token,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
-    )
+async def take_over(msg: Message) -> None:
+    """
+    Reclaims entries a draining peer released, starting the consumers
+    of inactive bots.
+    """
+    if not isinstance(msg.data, HandoffMessage):
+        logger.error("Received handoff message in wrong format: %s", msg)
+        return
+    for bot_id in msg.data.bot_ids:
+        if bot_id not in bot_records:
+            continue
+        logger.info("Taking over entries of bot_id: %s", bot_id)
+        _reclaim_now.add(bot_id)
+        await activate_bot(bot_id)
+
+
+async def drain_bots() -> set[int]:
+    """
+    Stops bot consumers from reading and waits up to DRAIN_TIMEOUT_SECONDS
+    for the messages in flight. Consumers still busy after it are
+    cancelled.
+    Returns ids of bots whose unacknowledged entries were handed off.
+    """
+    draining.set()
+    tasks = list(background_tasks.values())
+    logger.info("Draining %s bot consumers", len(tasks))
+    if tasks:
+        _, pending = await asyncio.wait(
+            tasks, timeout=worker_settings.DRAIN_TIMEOUT_SECONDS
+        )
+        if pending:
+            logger.warning(
+                "%s consumers did not drain in time, cancelling", len(pending)
+            )
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    return handed_off
+
+
+async def _add_bot(record: BotRecord, validate: bool = True) -> None:
+    bot_id = record.bot_id
+    token = record.token
+    is_sent_logs = record.is_sent_logs
+    primary_stream = primary_stream_key(bot_id)
+    broadcast_stream = broadcast_stream_key(bot_id)
+    logs_stream = logs_stream_key(bot_id) if is_sent_logs else None
+    bot = create_bot(token)
+    global_limiter.set_rate(bot_id=bot_id, rps=record.rps)
+    register_bot(bot=bot, bot_id=bot_id)
     try:
-        await bot.get_me()
-        task = asyncio.create_task(
-            consume_bot(
+        if validate:
+            me = await bot.get_me()
+            # A rotated token is validated again, even before the TTL
+            await add_to_redis(
                 redis_conn=redis_conn,
-                primary_stream=primary_stream,
-                broadcast_stream=broadcast_stream,
-                group_name=redis_settings.GROUP_NAME,
-                consumer_name=str(bot_id),
-                bot=bot,
-                logs_stream=logs_stream,
+                key=identity_key(bot_id),
+                value=json.dumps(
+                    {
+                        "id": me.id,
+                        "username": me.username,
+                        "token": _token_digest(token),
+                    }
+                ),
+                ttl=worker_settings.IDENTITY_TTL_SECONDS,
+            )
+        if record.callback_url:
+            open_sink(bot_id=bot_id, url=record.callback_url)
+        task = asyncio.create_task(
+            fair_scheduler.meter(
+                consume_bot(
+                    redis_conn=redis_conn,
+                    primary_stream=primary_stream,
+                    broadcast_stream=broadcast_stream,
+                    group_name=redis_settings.GROUP_NAME,
+                    consumer_name=str(bot_id),
+                    bot=bot,
+                    logs_stream=logs_stream,
+                ),
+                bot_id=bot_id,
             )
         )
         background_tasks[bot_id] = task
+        task.add_done_callback(
+            lambda t: _forget_bot_task(bot_id=bot_id, task=t)
+        )
 
     except Exception as ex:
         logger.exception(
             "Cannot start bot with token %s: error: %s", token, ex
         )
+        await close_sink(bot_id)
+        await bot.session.close()
+        if not isinstance(ex, TelegramUnauthorizedError):
+            # Telegram or the network may be down, the record is kept so
+            # the bot is activated again by its next message or the sweep
+            return
+        bot_records.pop(bot_id, None)
         try:
-            await remove_from_redis(redis_conn=redis_conn, key=bot_key)
+            await bot_registry.remove(bot_id)
         except RedisError as ex:
             logger.exception(
                 "Redis connection error, aborted operation %s", ex
             )
 
 
+def _forget_bot_task(bot_id: int, task: asyncio.Task) -> None:
+    if background_tasks.get(bot_id) is task:
+        background_tasks.pop(bot_id, None)
+
+
 async def consume_bot(
     redis_conn: Redis,
     primary_stream: str,
@@ -168,6 +409,7 @@ async def consume_bot(
     consumer_name: str,
     bot: Bot,
     logs_stream: Optional[str] = None,
+    read_conn: Redis = blocking_redis_conn,
 ) -> None:
     await setup_stream(
         redis_conn=redis_conn,
@@ -175,14 +417,14 @@ async def consume_bot(
         group_name=group_name,
         consumer_id=consumer_name,
     )
-    logger.info(f"Consumer for Bot Stream: {primary_stream} started")
+    logger.info("Consumer for Bot Stream: %s started", primary_stream)
     await setup_stream(
         redis_conn=redis_conn,
         stream_name=broadcast_stream,
         group_name=group_name,
         consumer_id=consumer_name,
     )
-    logger.info(f"Consumer for Bot Stream: {broadcast_stream} started")
+    logger.info("Consumer for Bot Stream: %s started", broadcast_stream)
     if logs_stream:
         await setup_stream(
             redis_conn=redis_conn,
@@ -190,10 +432,29 @@ async def consume_bot(
             group_name=group_name,
             consumer_id=consumer_name,
         )
-        logger.info(f"Consumer for Bot Stream: {logs_stream} started")
+        logger.info("Consumer for Bot Stream: %s started", logs_stream)
+    prefetcher = Prefetcher(
+        read_conn=read_conn,
+        streams=[primary_stream, broadcast_stream],
+        group_name=group_name,
+        consumer_name=consumer_name,
+        held_entries=held_entries,
+        label=bot_label(bot),
+        block_ms=BLOCK_TIME,
+    )
+    prefetcher.start()
+    bot_id = int(consumer_name)
     last_reclaim_check = time.monotonic()
-    while True:
+    last_activity = time.monotonic()
+    while not draining.is_set():
         try:
+            if bot_id in _reclaim_now:
+                _reclaim_now.discard(bot_id)
+                last_reclaim_check = float("-inf")
+            if breaker_is_open(bot):
+                # Entries stay in the streams until Telegram is reachable
+                await wait_until_closed(bot)
+                last_activity = time.monotonic()
             last_reclaim_check = await handle_pending_messages(
                 redis_conn=redis_conn,
                 primary_stream=primary_stream,
@@ -204,29 +465,100 @@ async def consume_bot(
                 bot=bot,
                 last_reclaim_check=last_reclaim_check,
             )
-            await handle_new_messages(
+            entry = await prefetcher.get(wait_seconds=BLOCK_TIME / 1000)
+            if entry is None:
+                if _is_idle(last_activity):
+                    logger.info(
+                        "Consumer %s idle, releasing resources", consumer_name
+                    )
+                    break
+                continue
+            started = time.monotonic()
+            await fair_scheduler.wait_turn(bot_id)
+            stream_name, message_id, data = entry
+            await handle_entry(
                 redis_conn=redis_conn,
-                stream_name=primary_stream,
-                logs_stream=logs_stream,
+                stream_name=stream_name,
                 group_name=group_name,
                 consumer_name=consumer_name,
                 bot=bot,
-                is_blocked=True,
-            )
-            await handle_new_messages(
-                redis_conn=redis_conn,
-                stream_name=broadcast_stream,
+                message_id=message_id,
+                data=data,
                 logs_stream=logs_stream,
-                group_name=group_name,
-                consumer_name=consumer_name,
-                bot=bot,
             )
+            last_activity = time.monotonic()
+            prefetcher.done(last_activity - started)
         except asyncio.CancelledError:
-            logger.info(f"Consumer {consumer_name} shutting down...")
-            return
+            logger.info("Consumer %s shutting down...", consumer_name)
+            break
         except Exception as e:
-            logger.exception(f"Error in {consumer_name}: {e}")
+            logger.exception("Error in %s: %s", consumer_name, e)
             await asyncio.sleep(1)
+    # Entries still buffered are handed off below
+    await prefetcher.stop()
+    await _hand_off(
+        redis_conn=redis_conn,
+        streams=(primary_stream, broadcast_stream),
+        group_name=group_name,
+        consumer_name=consumer_name,
+    )
+    await close_sink(bot_id)
+    fair_scheduler.forget(bot_id)
+    await bot.session.close()
+
+
+async def _hand_off(
+    redis_conn: Redis,
+    streams: tuple[str, ...],
+    group_name: str,
+    consumer_name: str,
+) -> None:
+    for stream_name in streams:
+        released = await release_entries(
+            redis_conn=redis_conn,
+            stream_name=stream_name,
+            group_name=group_name,
+            consumer_name=consumer_name,
+        )
+        if released and draining.is_set():
+            handed_off.add(int(consumer_name))
+
+
+async def release_entries(
+    redis_conn: Redis, stream_name: str, group_name: str, consumer_name: str
+) -> int:
+    """
+    Marks entries this worker read but did not acknowledge as idle past
+    IDLE_THRESHOLD_MS, so the next reclaim check of any worker picks
+    them up instead of waiting for them to time out.
+    """
+    entry_ids = held_entries.pop(stream_name, set())
+    if not entry_ids:
+        return 0
+    try:
+        # JUSTID keeps the delivery counter as it is
+        await redis_conn.xclaim(
+            name=stream_name,
+            groupname=group_name,
+            consumername=consumer_name,
+            min_idle_time=0,
+            message_ids=sorted(entry_ids),
+            idle=redis_settings.IDLE_THRESHOLD_MS + 1,
+            justid=True,
+        )
+    except RedisError as ex:
+        logger.error("Failed to release entries of %s: %s", stream_name, ex)
+        return 0
+    logger.info("Released %s entries of %s", len(entry_ids), stream_name)
+    return len(entry_ids)
+
+
+def _is_idle(last_activity: float) -> bool:
+    return (
+        worker_settings.LAZY_BOT_ACTIVATION
+        and time.monotonic() - last_activity
+        >= worker_settings.BOT_IDLE_TIMEOUT_SECONDS
+    )
 
 
 async def handle_pending_messages(
@@ -241,7 +573,9 @@ async def handle_pending_messages(
 ) -> None:
     now = time.monotonic()
     if now - last_reclaim_check >= redis_settings.RECLAIM_INTERVAL_SECONDS:
-        logger.info(f"Consumer: {consumer_name} Running reclaim check")
+        logger.info("Consumer: %s Running reclaim check", consumer_name)
+        # Forced after a hand-off: everything released is taken over now
+        scan_all = last_reclaim_check == float("-inf")
         last_reclaim_check = now
         await handle_pending_messages_for_stream(
             redis_conn=redis_conn,
@@ -250,6 +584,7 @@ async def handle_pending_messages(
             consumer_name=consumer_name,
             bot=bot,
             logs_stream=logs_stream,
+            scan_all=scan_all,
         )
         await handle_pending_messages_for_stream(
             redis_conn=redis_conn,
@@ -258,6 +593,7 @@ async def handle_pending_messages(
             consumer_name=consumer_name,
             bot=bot,
             logs_stream=logs_stream,
+            scan_all=scan_all,
         )
 
     return last_reclaim_check
@@ -270,117 +606,287 @@ async def handle_pending_messages_for_stream(
     consumer_name: str,
     bot: Bot,
     logs_stream: Optional[str] = None,
+    scan_all: bool = False,
 ) -> None:
-    pending_messages = await redis_conn.xpending_range(
-        name=stream_name,
-        groupname=group_name,
-        min="-",
-        max="+",
-        count=redis_settings.MAX_PENDING_TO_SCAN,
-    )
-    stuck_ids_to_claim = []
-    for message in pending_messages:
-        logger.info(pending_messages)
-        if message["time_since_delivered"] > redis_settings.IDLE_THRESHOLD_MS:
-            logger.info(
-                f"[{consumer_name}] - found stuck message"
-                f" {message['message_id']} "
-                f"(Idle: {message['time_since_delivered']})"
-            )
-            stuck_ids_to_claim.append(message["message_id"])
-    if stuck_ids_to_claim:
-        claimed = await redis_conn.xclaim(
+    """
+    Reclaims entries idle past IDLE_THRESHOLD_MS among the first
+    MAX_PENDING_TO_SCAN of the PEL, or in all of it with `scan_all`.
+    """
+    start = "-"
+    while True:
+        pending_messages = await redis_conn.xpending_range(
             name=stream_name,
             groupname=group_name,
-            consumername=consumer_name,
-            min_idle_time=redis_settings.IDLE_THRESHOLD_MS,
-            message_ids=stuck_ids_to_claim,
-            idle=0,
-            justid=True,
+            min=start,
+            max="+",
+            count=redis_settings.MAX_PENDING_TO_SCAN,
         )
-        logger.info(
-            f"[{consumer_name}] - claimed stuck messages: {len(claimed)}"
+        logger.debug(
+            "[%s] - pending messages: %s", consumer_name, pending_messages
         )
-        messages = await redis_conn.xreadgroup(
-            groupname=group_name,
-            consumername=consumer_name,
-            streams={stream_name: "0"},
-            count=10,
-        )
-        for stream, entries in messages:
-            for message_id, data in entries:
-                if isinstance(data, dict):
-                    logger.info(
-                        f"[{stream}] {consumer_name} got: {str(data)[:90]}"
-                    )
-                    await handle_bot_message(
-                        msg=data, bot=bot, logs_stream=logs_stream
-                    )
-                else:
-                    logger.exception(f"[{stream}] {consumer_name} got: {data}")
-                await redis_conn.xack(stream_name, group_name, message_id)
+        if not await _reclaim_pending(
+            redis_conn=redis_conn,
+            stream_name=stream_name,
+            group_name=group_name,
+            consumer_name=consumer_name,
+            bot=bot,
+            pending_messages=pending_messages,
+            logs_stream=logs_stream,
+        ):
+            return
+        if (
+            not scan_all
+            or len(pending_messages) < redis_settings.MAX_PENDING_TO_SCAN
+        ):
+            return
+        start = f"({pending_messages[-1]['message_id']}"
 
 
-async def handle_new_messages(
+async def _reclaim_pending(
     redis_conn: Redis,
     stream_name: str,
     group_name: str,
     consumer_name: str,
     bot: Bot,
-    is_blocked: bool | None = False,
+    pending_messages: list[dict],
     logs_stream: Optional[str] = None,
-) -> None:
-    messages = await redis_conn.xreadgroup(
+) -> bool:
+    """
+    Returns False if reclaiming must stop (breaker opened or draining).
+    """
+    deliveries = {
+        message["message_id"]: message["times_delivered"]
+        for message in pending_messages
+    }
+    # Entries waiting in this worker's read-ahead buffer are not stuck
+    held = held_entries.setdefault(stream_name, set())
+    stuck_ids_to_claim = []
+    for message in pending_messages:
+        if message["time_since_delivered"] <= redis_settings.IDLE_THRESHOLD_MS:
+            continue
+        if message["message_id"] in held:
+            continue
+        if message["times_delivered"] >= worker_settings.MAX_DELIVERY_COUNT:
+            await _dead_letter_pending(
+                redis_conn=redis_conn,
+                stream_name=stream_name,
+                group_name=group_name,
+                bot=bot,
+                entry_id=message["message_id"],
+                attempts=message["times_delivered"],
+            )
+        else:
+            logger.info(
+                "[%s] - found stuck message %s (Idle: %s)",
+                consumer_name,
+                message["message_id"],
+                message["time_since_delivered"],
+            )
+            stuck_ids_to_claim.append(message["message_id"])
+    if not stuck_ids_to_claim:
+        return True
+    claimed = await redis_conn.xclaim(
+        name=stream_name,
         groupname=group_name,
         consumername=consumer_name,
-        streams={stream_name: ">"},
-        count=NUMBER_TO_READ_FROM_STREAM,
-        block=BLOCK_TIME if is_blocked else None,
+        min_idle_time=redis_settings.IDLE_THRESHOLD_MS,
+        message_ids=stuck_ids_to_claim,
+        idle=0,
     )
-    for stream, entries in messages:
-        for message_id, data in entries:
-            if isinstance(data, dict):
-                logger.info(f"[{stream}] {consumer_name} got: {data}")
-                await handle_bot_message(
-                    msg=data, bot=bot, logs_stream=logs_stream
-                )
-            else:
-                logger.exception(f"[{stream}] {consumer_name} got: {data}")
-            await redis_conn.xack(stream_name, group_name, message_id)
+    logger.info(
+        "[%s] - claimed stuck messages: %s", consumer_name, len(claimed)
+    )
+    claimed_ids = [message_id for message_id, _ in claimed]
+    held.update(claimed_ids)
+    try:
+        for message_id, data in claimed:
+            if draining.is_set():
+                # Still held, so the hand-off releases them
+                return False
+            if not await handle_entry(
+                redis_conn=redis_conn,
+                stream_name=stream_name,
+                group_name=group_name,
+                consumer_name=consumer_name,
+                bot=bot,
+                message_id=message_id,
+                data=data,
+                logs_stream=logs_stream,
+                attempts=deliveries.get(message_id, 1),
+            ):
+                return False
+    finally:
+        if not draining.is_set():
+            # Left for a later reclaim check
+            held.difference_update(claimed_ids)
+    return True
+
+
+async def _dead_letter_pending(
+    redis_conn: Redis,
+    stream_name: str,
+    group_name: str,
+    bot: Bot,
+    entry_id: str,
+    attempts: int,
+) -> None:
+    """
+    Quarantines an entry that keeps failing instead of reclaiming it.
+    """
+    entries = await redis_conn.xrange(stream_name, min=entry_id, count=1)
+    if entries and entries[0][0] == entry_id:
+        await dead_letter(
+            bot_id=bot_label(bot),
+            payload=entries[0][1],
+            stream_name=stream_name,
+            entry_id=entry_id,
+            error="Max delivery count exceeded",
+            attempts=attempts,
+        )
+    await redis_conn.xack(stream_name, group_name, entry_id)
+
+
+async def handle_entry(
+    redis_conn: Redis,
+    stream_name: str,
+    group_name: str,
+    consumer_name: str,
+    bot: Bot,
+    message_id: str,
+    data: Optional[dict],
+    logs_stream: Optional[str] = None,
+    attempts: int = 1,
+) -> bool:
+    """
+    Handles and acknowledges one entry. Returns False if it stays pending
+    because the circuit breaker opened.
+    """
+    held = held_entries.setdefault(stream_name, set())
+    try:
+        if isinstance(data, dict):
+            logger.debug("[%s] %s got: %s", stream_name, consumer_name, data)
+            if not await handle_bot_message(
+                msg=data,
+                bot=bot,
+                logs_stream=logs_stream,
+                entry_id=message_id,
+                stream_name=stream_name,
+                attempts=attempts,
+            ):
+                return False
+        else:
+            logger.error("[%s] %s got: %s", stream_name, consumer_name, data)
+        await redis_conn.xack(stream_name, group_name, message_id)
+        return True
+    finally:
+        # Not acknowledged (breaker open or an error) means it is left
+        # for a reclaim check, which skips held entries
+        held.discard(message_id)
 
 
 async def handle_bot_message(
     msg: dict,
     bot: Bot,
     logs_stream: Optional[str] = None,
-) -> None:
+    entry_id: Optional[str] = None,
+    stream_name: Optional[str] = None,
+    attempts: int = 1,
+) -> bool:
+    """
+    Returns False if the entry must stay pending (not acknowledged).
+    """
+    payload = msg
     try:
-        msg: Message = Message(**msg)
-    except TypeError as ex:
-        logger.exception(
-            f"Bot Stream received unsupported message: {msg} with {ex}"
+        with stage("decode", bot_label(bot)):
+            msg: Message = Message(**msg)
+    except (TypeError, ValidationError) as ex:
+        logger.error(
+            "Bot Stream received unsupported message: %s with %s", msg, ex
         )
-        return None
+        error = f"{ex.__class__.__name__}: {ex}"
+    else:
+        error = await _handle_task(
+            msg=msg,
+            bot=bot,
+            logs_stream=logs_stream,
+            entry_id=entry_id,
+            stream_name=stream_name,
+        )
+        if error and breaker_is_open(bot):
+            # Failed because of the bot or Telegram, not the message
+            return False
+    if error:
+        await dead_letter(
+            bot_id=bot_label(bot),
+            payload=payload,
+            stream_name=stream_name,
+            entry_id=entry_id,
+            error=error,
+            attempts=attempts,
+        )
+    return True
+
+
+async def _handle_task(
+    msg: Message,
+    bot: Bot,
+    logs_stream: Optional[str] = None,
+    entry_id: Optional[str] = None,
+    stream_name: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Returns why the message should be dead-lettered, None otherwise.
+    """
     if not isinstance(msg.data, TaskMessage):
-        logger.exception(
-            f"Bot Stream received unsupported message data: {msg}"
+        logger.error("Bot Stream received unsupported message data: %s", msg)
+        return "Unsupported message data"
+    if msg.type not in bot_commands:
+        logger.error("Bot Stream received unsupported message: %s", msg)
+        return f"Unsupported message type: {msg.type}"
+    if not await validate_task_message(msg):
+        logger.error("Bot received unsupported message: %s", msg)
+        return "Invalid task message"
+    if stream_name and (due := due_time(msg.data, entry_id)):
+        await schedule_message(
+            msg=msg, stream_name=stream_name, due=due, entry_id=entry_id
         )
+        if (
+            msg.type == MessageType.send_msg
+            and msg.data.external_id is not None
+        ):
+            await status_index.record(
+                bot_id=msg.data.bot_id,
+                external_id=msg.data.external_id,
+                record=DeliveryRecord(
+                    status=DeliveryStatus.scheduled,
+                    chat_id=msg.data.chat_id,
+                    send_at=due,
+                    updated_at=time.time(),
+                ),
+            )
         return None
-    if msg.type not in bot_commands:
-        logger.exception(f"Bot Stream received unsupported message: {msg}")
-    else:
-        if not await validate_task_message(msg):
-            logger.exception(f"Bot received unsupported message: {msg}")
-            return None
-        return await bot_commands[msg.type](
+    with stage("handle", msg.data.bot_id):
+        error = await bot_commands[msg.type](
             msg=msg, bot=bot, logs_stream=logs_stream
         )
+    if entry_id:
+        observe_enqueue_latency(
+            bot_id=msg.data.bot_id, operation=msg.type, entry_id=entry_id
+        )
+    return error if worker_settings.DLQ_FAILED_DELIVERIES else None
 
 
 async def validate_task_message(msg: Message) -> bool:
-    if (  # noqa: SIM103
+    if (
         msg.type in (MessageType.del_msg, MessageType.edit_msg)
         and msg.data.message_id is None
+        and msg.data.external_id is None
+    ):
+        return False
+    if msg.type == MessageType.send_msg and (  # noqa: SIM103
+        bool(msg.data.media_type) != bool(msg.data.media_url)
+        # Nothing to send would split into no parts and count as sent
+        or not (msg.data.text or msg.data.media_type)
     ):
         return False
     return True